@@ -0,0 +1,137 @@
+import time
+import typing
+
+from dataclasses import dataclass, field
+
+import numpy as np
+import numpy.typing as npt
+
+import ezmsg.core as ez
+from ezmsg.util.generator import consumer
+from ezmsg.util.messages.axisarray import AxisArray
+
+
+class EvidenceAccumulatorSettings(ez.Settings):
+    # Posterior odds of the leading class over the runner up required to emit a command
+    threshold: float = 0.95
+
+    # Time constant (sec) of the evidence leak; older decodes count for less.
+    # None: no leak, i.e. a sequential probability ratio test
+    leak_tau: typing.Optional[float] = 1.0
+
+    # Decodes are ignored for this long (sec) after a command, and evidence starts over
+    refractory: float = 0.5
+
+    # Class that never produces a command (e.g. 'rest'); still competes for evidence
+    null_class: typing.Optional[str] = None
+
+    # Class labels in posterior order; if empty, taken from the decode's `labels`
+    classes: typing.List[str] = field(default_factory = list)
+
+    class_axis: str = 'class'
+    time_axis: str = 'time'
+
+
+@dataclass
+class EvidenceState:
+    evidence: typing.Optional[npt.NDArray] = None # log evidence per class
+    last_t: typing.Optional[float] = None
+    refractory_until: float = -np.inf
+
+
+def _decodes(msg: AxisArray, settings: EvidenceAccumulatorSettings) -> typing.Iterator[typing.Tuple[float, npt.NDArray]]:
+    """ (timestamp, posteriors) for every decode in `msg` """
+    if settings.class_axis in msg.dims:
+        posteriors = np.moveaxis(msg.data, msg.get_axis_idx(settings.class_axis), -1)
+    else:
+        posteriors = msg.data
+    posteriors = posteriors.reshape(-1, posteriors.shape[-1])
+
+    if settings.time_axis in msg.axes:
+        axis = msg.get_axis(settings.time_axis)
+        times = axis.offset + axis.gain * np.arange(posteriors.shape[0])
+    else:
+        times = np.full(posteriors.shape[0], time.time())
+
+    return zip(times, posteriors)
+
+
+@consumer
+def accumulate_evidence(
+    settings: EvidenceAccumulatorSettings = EvidenceAccumulatorSettings(),
+    state: typing.Optional[EvidenceState] = None
+) -> typing.Generator[typing.Optional[str], AxisArray, None]:
+    """
+    # `accumulate_evidence`
+    Integrates decoder posteriors over time as (optionally leaky) log evidence and
+    emits a class once its posterior odds over the runner up cross `settings.threshold`.
+
+    ## Sends:
+    * `AxisArray`: Decoder posteriors; one row per decode along `settings.time_axis`
+    ## Yields:
+    * `str | None`: Command (class label) if one was decided on, otherwise None
+    """
+
+    state = EvidenceState() if state is None else state
+    log_odds = np.log(settings.threshold / (1.0 - settings.threshold))
+    output: typing.Optional[str] = None
+
+    while True:
+        msg = yield output
+        output = None
+
+        labels = settings.classes or list(getattr(msg, 'labels', []))
+
+        for t, posteriors in _decodes(msg, settings):
+            if t < state.refractory_until:
+                continue
+
+            log_p = np.log(np.clip(posteriors, 1e-6, 1.0))
+            if state.evidence is None or state.evidence.shape != log_p.shape:
+                state.evidence = np.zeros_like(log_p)
+            elif settings.leak_tau is not None and state.last_t is not None:
+                state.evidence *= np.exp(-max(0.0, t - state.last_t) / settings.leak_tau)
+            state.last_t = t
+
+            state.evidence += log_p
+            state.evidence -= state.evidence.max() # Only differences matter
+
+            if len(state.evidence) < 2:
+                continue
+
+            runner_up, leader = np.argsort(state.evidence)[-2:]
+            if state.evidence[leader] - state.evidence[runner_up] < log_odds:
+                continue
+
+            state.evidence = None
+            state.last_t = None
+            label = labels[leader] if leader < len(labels) else str(leader)
+            if label == settings.null_class:
+                continue
+
+            state.refractory_until = t + settings.refractory
+            output = label
+
+
+class EvidenceAccumulatorState(ez.State):
+    gen: typing.Generator[typing.Optional[str], AxisArray, None]
+
+
+class EvidenceAccumulator(ez.Unit):
+    """ Debounces decoder posteriors (BCPITopics.DECODE) into commands (BCPITopics.COMMAND) """
+
+    SETTINGS: EvidenceAccumulatorSettings
+    STATE: EvidenceAccumulatorState
+
+    INPUT_DECODE = ez.InputStream(AxisArray)
+    OUTPUT_COMMAND = ez.OutputStream(str)
+
+    def initialize(self) -> None:
+        self.STATE.gen = accumulate_evidence(self.SETTINGS)
+
+    @ez.subscriber(INPUT_DECODE, zero_copy = True)
+    @ez.publisher(OUTPUT_COMMAND)
+    async def on_decode(self, msg: AxisArray) -> typing.AsyncGenerator:
+        command = self.STATE.gen.send(msg)
+        if command is not None:
+            yield self.OUTPUT_COMMAND, command
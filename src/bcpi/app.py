@@ -2,6 +2,7 @@ import typing
 from pathlib import Path
 
 import ezmsg.core as ez
+from ezmsg.sigproc.sampler import SamplerSettings
 from ezmsg.panel.tabbedapp import TabbedApp, Tab
 from ezmsg.tasks.task import TaskSettings
 from ezmsg.tasks.cuedactiontask import CuedActionTask
@@ -14,6 +15,18 @@ from ezmsg.fbcsp.fbcsptrainprocess import FBCSPTrainProcess
 
 from .config import BCPIConfig
 from .core import BCPICore, BCPICoreSettings, BCPITopics
+from .trialbuffer import TrialBuffer, TrialBufferSettings, SamplerPort
+from .trialstore import TrialRecorder
+
+
+# The tasks' trials are cut from one shared TrialBuffer rather than by a Sampler
+# buffering signal in each task; unconfigured ports default to no fallback period
+class BufferedCuedActionTask(CuedActionTask):
+    SAMPLER = SamplerPort(SamplerSettings(buffer_dur = 0.0))
+
+
+class BufferedSSVEPTask(SSVEPTask):
+    SAMPLER = SamplerPort(SamplerSettings(buffer_dur = 0.0))
 
 
 class BCPISettings(ez.Settings):
@@ -23,8 +36,10 @@ class BCPI(ez.Collection, TabbedApp):
     SETTINGS: BCPISettings
 
     CORE = BCPICore()
-    CAT_TAB = CuedActionTask()
-    SSVEP_TAB = SSVEPTask()
+    CAT_TAB = BufferedCuedActionTask()
+    SSVEP_TAB = BufferedSSVEPTask()
+    TRIALS = TrialBuffer()
+    RECORDER = TrialRecorder()
 
     DATASET_TAB = DatasetTab()
     TRAINING_TAB = TrainingTab()
@@ -48,7 +63,7 @@ class BCPI(ez.Collection, TabbedApp):
         ]
 
     def configure(self) -> None:
-        config = BCPIConfig(self.SETTINGS.config_path)
+        config = BCPIConfig.load(self.SETTINGS.config_path)
 
         self.CORE.apply_settings(
             BCPICoreSettings(
@@ -56,14 +71,22 @@ class BCPI(ez.Collection, TabbedApp):
             )
         )
 
+        # Tasks don't buffer signal; their trials are cut from TRIALS
         task_settings = TaskSettings(
-            data_dir = config.data_dir,
-            buffer_dur = 10.0
+            data_dir = config.data_dir
         )
 
         self.CAT_TAB.apply_settings(task_settings)
         self.SSVEP_TAB.apply_settings(task_settings)
 
+        self.TRIALS.apply_settings(
+            TrialBufferSettings(
+                buffer_dur = config.buffer_dur
+            )
+        )
+
+        self.RECORDER.apply_settings(config.trial_recorder_settings)
+
         self.INFERENCE_TAB.apply_settings(
             InferenceTabSettings(
                 data_dir = config.data_dir
@@ -84,13 +107,23 @@ class BCPI(ez.Collection, TabbedApp):
 
     def network(self) -> ez.NetworkDefinition:
         return (
-            (BCPITopics.EPHYS_PREPROC, self.CAT_TAB.INPUT_SIGNAL),
+            # One shared buffer services the triggers of both tasks (with the tasks'
+            # sampler settings as defaults) and publishes trials through their SamplerPorts
+            (BCPITopics.EPHYS_PREPROC, self.TRIALS.INPUT_SIGNAL),
+
+            (self.CAT_TAB.SAMPLER.OUTPUT_TRIGGER, self.TRIALS.INPUT_CAT_TRIGGER),
+            (self.TRIALS.OUTPUT_CAT_TRIAL, self.CAT_TAB.SAMPLER.OUTPUT_SAMPLE),
             (self.CAT_TAB.OUTPUT_SAMPLE, BCPITopics.CAT_TRIAL),
             (self.CAT_TAB.OUTPUT_TARGET_CLASS, BCPITopics.CAT_TARGET),
 
-            (BCPITopics.EPHYS_PREPROC, self.SSVEP_TAB.INPUT_SIGNAL),
+            (self.SSVEP_TAB.SAMPLER.OUTPUT_TRIGGER, self.TRIALS.INPUT_SSVEP_TRIGGER),
+            (self.TRIALS.OUTPUT_SSVEP_TRIAL, self.SSVEP_TAB.SAMPLER.OUTPUT_SAMPLE),
             (self.SSVEP_TAB.OUTPUT_SAMPLE, BCPITopics.SSVEP_TRIAL),
 
+            # Trials are also appended to indexed, memory-mapped stores in data_dir
+            (BCPITopics.CAT_TRIAL, self.RECORDER.INPUT_CAT_TRIAL),
+            (BCPITopics.SSVEP_TRIAL, self.RECORDER.INPUT_SSVEP_TRIAL),
+
             (self.INFERENCE_TAB.OUTPUT_SETTINGS, self.CORE.INPUT_INFERENCE_SETTINGS),
             (BCPITopics.DECODE, self.INFERENCE_TAB.INPUT_DECODE),
             (BCPITopics.CLASS, self.INFERENCE_TAB.INPUT_CLASS),
@@ -99,3 +132,18 @@ class BCPI(ez.Collection, TabbedApp):
             (self.TRAINING_TAB.OUTPUT_TRAIN, self.TRAINING.INPUT_TRAIN),
             (self.TRAINING.OUTPUT_EPOCH, self.TRAINING_TAB.INPUT_EPOCH),
         )
+
+
+class HeadsetsApp(TabbedApp):
+    """ Shared dashboard with a tab for each additional headset """
+
+    def __init__(self, tabs: typing.List[Tab]):
+        self._tabs = tabs
+
+    @property
+    def title(self) -> str:
+        return 'BCPI - Headsets'
+
+    @property
+    def tabs(self) -> typing.List[Tab]:
+        return self._tabs
@@ -0,0 +1,36 @@
+import typing
+
+from dataclasses import replace
+
+import numpy as np
+
+import ezmsg.core as ez
+from ezmsg.util.messages.axisarray import AxisArray
+
+
+def cast(msg: AxisArray, dtype: typing.Optional[str]) -> AxisArray:
+    """ `msg` with data as `dtype`; returned as is if it already is (or `dtype` is None) """
+    if dtype is None or msg.data.dtype == np.dtype(dtype):
+        return msg
+    return replace(msg, data = msg.data.astype(dtype))
+
+
+class CastSettings(ez.Settings):
+    dtype: typing.Optional[str] = 'float32' # None: pass through
+
+
+class Cast(ez.Unit):
+    """
+    Converts signal to the pipeline dtype once, where it enters the graph,
+    so downstream units don't each pay for (or silently undo) the conversion.
+    """
+
+    SETTINGS: CastSettings
+
+    INPUT_SIGNAL = ez.InputStream(AxisArray)
+    OUTPUT_SIGNAL = ez.OutputStream(AxisArray)
+
+    @ez.subscriber(INPUT_SIGNAL, zero_copy = True)
+    @ez.publisher(OUTPUT_SIGNAL)
+    async def on_signal(self, msg: AxisArray) -> typing.AsyncGenerator:
+        yield self.OUTPUT_SIGNAL, cast(msg, self.SETTINGS.dtype)
@@ -0,0 +1,109 @@
+import time
+import typing
+
+from collections import deque
+from dataclasses import dataclass, field
+
+import numpy as np
+
+
+@dataclass
+class ClockSyncMessage:
+    offset: float # sec; remote clock - local clock at `timestamp`
+    drift: float # sec/sec; rate of change of offset
+    delay: float # sec; round-trip delay of the best recent exchange
+    jitter: float # sec; residual (RMS) of the offset fit
+    timestamp: float = field(default_factory = time.time) # local clock
+    ready: bool = True # enough exchanges for remote times to be mapped (see ClockSync.ready)
+
+
+class ClockSync:
+    """
+    NTP-style estimator of the offset and drift between a remote clock and the local clock.
+
+    Each exchange is a request sent at local time t1, received at remote time t2,
+    answered at remote time t3 and received back at local time t4.  The exchanges with
+    the lowest round-trip delay (least queueing in the radio stacks) are kept and a
+    line is fit through their offsets over local time, giving offset and drift; the
+    residual of that fit is reported as jitter.
+
+    ## Further reading:
+    * [RFC 5905 - Network Time Protocol Version 4](https://www.rfc-editor.org/rfc/rfc5905)
+    """
+
+    history: int
+    min_exchanges: int
+    best_fraction: float
+
+    _exchanges: typing.Deque[typing.Tuple[float, float, float]] # local time, offset, delay
+    _t_ref: float
+    _offset: float
+    _drift: float
+    _delay: float
+    _jitter: float
+
+    def __init__(self, history: int = 64, min_exchanges: int = 4, best_fraction: float = 0.5):
+        self.history = history
+        self.min_exchanges = min_exchanges
+        self.best_fraction = best_fraction
+        self._exchanges = deque(maxlen = history)
+        self._t_ref = 0.0
+        self._offset = 0.0
+        self._drift = 0.0
+        self._delay = float('inf')
+        self._jitter = float('inf')
+
+    @property
+    def ready(self) -> bool:
+        return len(self._exchanges) >= self.min_exchanges
+
+    def add(self, t1: float, t2: float, t3: float, t4: float) -> None:
+        """ Add one request/response exchange (all times in seconds) """
+        offset = ((t2 - t1) + (t3 - t4)) / 2.0
+        delay = (t4 - t1) - (t3 - t2)
+        self._exchanges.append(((t1 + t4) / 2.0, offset, delay))
+        self._fit()
+
+    def _fit(self) -> None:
+        local, offset, delay = (np.array(v) for v in zip(*self._exchanges))
+
+        # Keep the least-delayed exchanges; their offsets are the least biased
+        n_best = max(2, int(np.ceil(len(delay) * self.best_fraction)))
+        best = np.argsort(delay)[:n_best]
+        local, offset = local[best], offset[best]
+
+        self._t_ref = float(local.max())
+        self._delay = float(delay[best].min())
+        t = local - self._t_ref
+
+        if len(best) >= 3 and np.ptp(t) > 0:
+            drift, intercept = np.polyfit(t, offset, 1)
+        else:
+            drift, intercept = 0.0, offset.mean()
+
+        residual = offset - (intercept + drift * t)
+        self._offset = float(intercept)
+        self._drift = float(drift)
+        self._jitter = float(np.sqrt(np.mean(residual ** 2)))
+
+    def offset_at(self, local_t: float) -> float:
+        return self._offset + self._drift * (local_t - self._t_ref)
+
+    def to_local(self, remote_t: float) -> float:
+        """ Map a remote clock reading onto the local clock """
+        # remote = local + offset + drift * (local - t_ref)
+        return (remote_t - self._offset + self._drift * self._t_ref) / (1.0 + self._drift)
+
+    def to_remote(self, local_t: float) -> float:
+        return local_t + self.offset_at(local_t)
+
+    def message(self) -> ClockSyncMessage:
+        now = time.time()
+        return ClockSyncMessage(
+            offset = self.offset_at(now),
+            drift = self._drift,
+            delay = self._delay,
+            jitter = self._jitter,
+            timestamp = now,
+            ready = self.ready
+        )
@@ -1,4 +1,5 @@
 import argparse
+import functools
 import typing
 
 from pathlib import Path
@@ -19,6 +20,8 @@ class BCPIArgs:
     create_config: bool
     install: bool
     uninstall: bool
+    soak: bool
+    profile: bool
 
 
 def cmdline() -> None:
@@ -64,6 +67,18 @@ def cmdline() -> None:
         help = 'uninstall bcpi-related systemd services'
     )
 
+    parser.add_argument(
+        '--soak',
+        action = 'store_true',
+        help = 'soak test: ramp virtual headsets ([soak]) through the realtime chain instead of launching bcpi'
+    )
+
+    parser.add_argument(
+        '--profile',
+        action = 'store_true',
+        help = 'sample every process with a profiler ([profile]) and write where time went to data_dir/profile on exit'
+    )
+
     args = parser.parse_args(namespace=BCPIArgs)
 
     if args.create_config:
@@ -72,17 +87,44 @@ def cmdline() -> None:
         ...
     elif args.uninstall:
         ...
+    elif args.soak:
+        from .soak import soak
+        soak(config_path = args.config, single_process = args.single_process)
     else:
-        launch(config_path = args.config, only_core = args.only_core, single_process = args.single_process)
+        launch(
+            config_path = args.config,
+            only_core = args.only_core,
+            single_process = args.single_process,
+            profile = args.profile
+        )
 
 
-def launch(config_path: typing.Optional[Path] = None, only_core: bool = False, single_process: bool = False) -> None:
+def launch(
+    config_path: typing.Optional[Path] = None,
+    only_core: bool = False,
+    single_process: bool = False,
+    profile: bool = False
+) -> None:
     
     from .config import BCPIConfig
     from .core import BCPICore, BCPICoreSettings
-    from .app import BCPI, BCPISettings
+    from .app import BCPI, BCPISettings, HeadsetsApp
+    from .headset import BCPIHeadset, BCPIHeadsetSettings
+    from .topics import BCPITopics
+    from .placement import PlacementBackendProcess, split_process
+    from .encoding import Encode, Decode
+    from .memory import MemoryMonitor
+    from .streamserver import StreamServer
+    from .profiler import write_summary
+    from .trialstore import session_name
 
-    config = BCPIConfig(config_path = config_path)
+    config = BCPIConfig.load(config_path)
+
+    plan = config.memory_plan
+    for line in plan.report():
+        ez.logger.info(line)
+    for warning in plan.warnings:
+        ez.logger.warning(warning)
 
     if only_core:
         system = BCPICore(
@@ -107,6 +149,39 @@ def launch(config_path: typing.Optional[Path] = None, only_core: bool = False, s
         **hid_units
     )
 
+    # Each additional headset gets its own process for acquisition -> inference
+    headsets: typing.Dict[str, BCPIHeadset] = {}
+    for device in config.devices:
+        headsets[device] = BCPIHeadset(
+            BCPIHeadsetSettings(
+                device = device,
+                config_path = config_path
+            )
+        )
+        components[f'HEADSET_{device}'] = headsets[device]
+
+    ez.logger.info(f'Additional headsets: {list(headsets)}')
+
+    connections: typing.List[typing.Tuple[typing.Any, typing.Any]] = []
+
+    # Compact encodings of topics for (or from) a remote GraphServer over a constrained link
+    for topic in config.wire_encode:
+        encoder = Encode(config.encode_settings)
+        components[f'ENCODE_{topic.replace("/", "_")}'] = encoder
+        connections.append((topic, encoder.INPUT_SIGNAL))
+        connections.append((encoder.OUTPUT_ENCODED, BCPITopics.encoded(topic)))
+
+    for topic in config.wire_decode:
+        decoder = Decode()
+        components[f'DECODE_{topic.replace("/", "_")}'] = decoder
+        connections.append((BCPITopics.encoded(topic), decoder.INPUT_ENCODED))
+        connections.append((decoder.OUTPUT_SIGNAL, BCPITopics.decoded(topic)))
+
+    # External (non-ezmsg) consumers attach over WebSocket
+    stream_settings = config.stream_settings
+    if stream_settings.topics:
+        components['STREAM'] = StreamServer(stream_settings)
+
     if isinstance(system, BCPI):
         from ezmsg.panel.application import Application, ApplicationSettings
 
@@ -120,13 +195,71 @@ def launch(config_path: typing.Optional[Path] = None, only_core: bool = False, s
             'bcpi': system.app,
         }
 
+        if len(headsets):
+            from ezmsg.panel.timeseriesplot import TimeSeriesPlot, TimeSeriesPlotSettings
+
+            plots = []
+            for device in headsets:
+                plot = TimeSeriesPlot(
+                    TimeSeriesPlotSettings(
+                        name = device,
+                        time_axis = 'time'
+                    )
+                )
+                components[f'PLOT_{device}'] = plot
+                connections.append((BCPITopics.headset(BCPITopics.EPHYS, device), plot.INPUT_SIGNAL))
+                plots.append(plot)
+
+            app.panels['headsets'] = HeadsetsApp(plots).app
+
         components['APP'] = app
 
-    ez.run(
-        components = components,
-        force_single_process = single_process,
-        graph_address = config.graph_address,
-    )
+    # Placed components run in their own processes so they can be pinned/prioritized
+    process_components: typing.List[ez.Component] = list(headsets.values())
+    placements = config.placements
+    for placement in placements:
+        for address in placement.components:
+            try:
+                component = split_process(components, address)
+            except KeyError:
+                ez.logger.warning(f'Placement {placement.name}: no component at {address}')
+                continue
+            if component is not None and component not in process_components:
+                process_components.append(component)
+
+    # Total RSS of bcpi (all processes) against [memory] budget
+    if config.memory_report_interval > 0:
+        MemoryMonitor(
+            'bcpi',
+            config.memory_report_interval,
+            budget = config.memory_budget,
+            children = True
+        ).start()
+
+    # Every process writes its samples on exit; they're summarized once all have
+    profile_dir = config.data_dir / 'profile' / session_name() if profile else None
+    if profile_dir is not None:
+        ez.logger.info(f'Profiling every {config.profile_interval} sec to {profile_dir}')
+
+    try:
+        ez.run(
+            components = components,
+            connections = connections,
+            process_components = process_components,
+            backend_process = functools.partial( # type: ignore
+                PlacementBackendProcess,
+                placements,
+                rss_interval = config.memory_report_interval,
+                profile_dir = profile_dir,
+                profile_interval = config.profile_interval
+            ),
+            force_single_process = single_process,
+            graph_address = config.graph_address,
+        )
+    finally:
+        if profile_dir is not None and profile_dir.exists():
+            path = write_summary(profile_dir)
+            ez.logger.info(f'Profile summary: {path}')
 
 if __name__ == '__main__':
     cmdline()
\ No newline at end of file
@@ -1,52 +1,212 @@
 import os
 import typing
+import functools
 
 from configparser import ConfigParser
+from dataclasses import replace
 from pathlib import Path
 from importlib.resources import files
 
+import numpy as np
+
 from ezmsg.unicorn.device import UnicornSettings
 
+# Settings types are imported where they're built, so loading the config
+# doesn't import (nearly) every unit module of the package
+if typing.TYPE_CHECKING:
+    from .temporalpreproc import TemporalPreprocSettings
+    from .placement import Placement
+    from .encoding import EncodeSettings
+    from .accumulator import EvidenceAccumulatorSettings
+    from .motiongate import MotionGateSettings
+    from .quality import QualityMonitorSettings
+    from .scheduler import DecodeSchedulerSettings
+    from .memory import MemoryPlan
+    from .streamserver import StreamServerSettings
+    from .virtualheadset import VirtualHeadsetSettings
+    from .trialstore import TrialRecorderSettings
+
 CONFIG_ENV = 'BCPI_CONFIG'
 CONFIG_PATH = Path.home() / '.config' / 'bcpi'
 CONFIG_FILE = 'bcpi.conf'
 
+# Sections that running units pick up without a restart (see ConfigWatcher)
+LIVE_SECTIONS = ('unicorn', 'preproc')
+
+# Additional headsets are declared in [device:NAME] sections
+DEVICE_SECTION = 'device:'
+
+# Process placement is declared in [placement:NAME] sections
+PLACEMENT_SECTION = 'placement:'
+
 def _get_config_path(config_path: typing.Optional[Path] = None) -> Path:
     if config_path is None:
         config_path = Path(os.environ.get(CONFIG_ENV, CONFIG_PATH))
     return config_path.expanduser()
 
+def _config_files(config_path: Path) -> typing.List[Path]:
+    config_files = []
+    if config_path.exists():
+        if config_path.is_file():
+            config_files.append(config_path)
+        elif config_path.is_dir():
+            for fname in sorted(config_path.glob('*')):
+                config_files.append(fname)
+                
+    # Drop-ins are read last so they override the main config
+    config_dir = config_path.with_suffix('.d')
+    if config_dir.exists() and config_dir.is_dir():
+        for fname in sorted(config_dir.glob('*')):
+            config_files.append(fname)
+
+    return config_files
+
+def config_mtimes(config_path: typing.Optional[Path] = None) -> typing.Tuple[typing.Tuple[Path, int], ...]:
+    """ Cheap fingerprint of the config files; changes whenever one is added, removed or modified """
+    mtimes = []
+    for fname in _config_files(_get_config_path(config_path)):
+        try:
+            mtimes.append((fname, fname.stat().st_mtime_ns))
+        except FileNotFoundError:
+            pass
+    return tuple(mtimes)
+
 class BCPIConfig:
 
     parser: ConfigParser
+    config_path: Path
+    mtimes: typing.Tuple[typing.Tuple[Path, int], ...]
+
+    _cache: typing.ClassVar[typing.Dict[Path, "BCPIConfig"]] = {}
 
     def __init__(self, config_path: typing.Optional[Path] = None):
+        self.config_path = _get_config_path(config_path)
+        self.mtimes = config_mtimes(self.config_path)
+        self.parser = ConfigParser()
+        self.parser.read([fname for fname, _ in self.mtimes])
+
+    @classmethod
+    def load(cls, config_path: typing.Optional[Path] = None) -> "BCPIConfig":
+        """ Parse-once access to the config; re-parsed only when the files change """
         config_path = _get_config_path(config_path)
+        config = cls._cache.get(config_path)
+        if config is None or config.mtimes != config_mtimes(config_path):
+            config = cls(config_path)
+            cls._cache[config_path] = config
+        return config
 
-        config_files = []
-        if config_path.exists():
-            if config_path.is_file():
-                config_files.append(config_path)
-            elif config_path.is_dir():
-                for fname in config_path.glob('*'):
-                    config_files.append(fname)
-                    
-        config_dir = config_path.with_suffix('.d')
-        if config_dir.exists() and config_dir.is_dir():
-            for fname in config_dir.glob('*'):
-                config_files.append(fname)
+    def section(self, name: str) -> typing.Dict[str, str]:
+        if not self.parser.has_section(name):
+            return {}
+        return dict(self.parser.items(name, raw = True))
 
-        self.parser = ConfigParser()
-        self.parser.read(config_files)
+    def diff(self, other: "BCPIConfig") -> typing.Set[str]:
+        """ Names of the sections that differ between this config and `other` """
+        sections = set(self.parser.sections()) | set(other.parser.sections())
+        return {name for name in sections if self.section(name) != other.section(name)}
 
-    @property
-    def unicorn_settings(self) -> UnicornSettings:
-        address = self.parser.get('unicorn', 'address', fallback = 'simulator')
-        n_samp = int(self.parser.get('unicorn', 'n_samp', fallback = '50'))
+    def _unicorn_settings(self, section: str) -> UnicornSettings:
+        address = self.parser.get(section, 'address', fallback = 'simulator')
+        n_samp = int(self.parser.get(section, 'n_samp', fallback = '50'))
         return UnicornSettings(
             address = address,
             n_samp = n_samp
         )
+
+    @property
+    def unicorn_settings(self) -> UnicornSettings:
+        return self._unicorn_settings('unicorn')
+
+    @property
+    def devices(self) -> typing.Dict[str, UnicornSettings]:
+        """ Settings for each additional headset, by name """
+        return {
+            section[len(DEVICE_SECTION):]: self._unicorn_settings(section)
+            for section in self.parser.sections()
+            if section.startswith(DEVICE_SECTION)
+        }
+
+    @property
+    def placements(self) -> typing.List['Placement']:
+        from .placement import Placement, parse_cpus
+        placements = []
+        for section in self.parser.sections():
+            if not section.startswith(PLACEMENT_SECTION):
+                continue
+            cpus = self.parser.get(section, 'cpus', fallback = '')
+            nice = self.parser.get(section, 'nice', fallback = '')
+            placements.append(
+                Placement(
+                    name = section[len(PLACEMENT_SECTION):],
+                    components = self.parser.get(section, 'components', fallback = '').split(),
+                    cpus = parse_cpus(cpus) if cpus else None,
+                    policy = self.parser.get(section, 'policy', fallback = None),
+                    priority = int(self.parser.get(section, 'priority', fallback = '0')),
+                    nice = int(nice) if nice else None
+                )
+            )
+        return placements
+
+    @property
+    def wire_encode(self) -> typing.List[str]:
+        """ Topics to publish encoded (BCPITopics.encoded) for remote subscribers """
+        return self.parser.get('wire', 'encode', fallback = '').split()
+
+    @property
+    def wire_decode(self) -> typing.List[str]:
+        """ Encoded topics from a remote bcpi to decode (BCPITopics.decoded) """
+        return self.parser.get('wire', 'decode', fallback = '').split()
+
+    @property
+    def encode_settings(self) -> 'EncodeSettings':
+        from .encoding import EncodeSettings, CODEC_NONE
+        return EncodeSettings(
+            bits = int(self.parser.get('wire', 'bits', fallback = '16')),
+            delta = self.parser.getboolean('wire', 'delta', fallback = True),
+            codec = self.parser.get('wire', 'codec', fallback = CODEC_NONE)
+        )
+
+    @property
+    def stream_settings(self) -> 'StreamServerSettings':
+        """ WebSocket server for external consumers; serves nothing (is not started) without topics """
+        from .streamserver import StreamServerSettings
+        return StreamServerSettings(
+            topics = self.parser.get('stream', 'topics', fallback = '').split(),
+            host = self.parser.get('stream', 'host', fallback = '127.0.0.1'),
+            port = int(self.parser.get('stream', 'port', fallback = '8765')),
+            graph_address = self.graph_address,
+            queue_size = int(self.parser.get('stream', 'queue_size', fallback = '32')),
+            max_drops = int(self.parser.get('stream', 'max_drops', fallback = '256'))
+        )
+
+    @property
+    def virtual_headset_settings(self) -> 'VirtualHeadsetSettings':
+        """ Load offered by a soak test (bcpi --soak) """
+        from .virtualheadset import VirtualHeadsetSettings
+        return VirtualHeadsetSettings(
+            n_headsets = int(self.parser.get('soak', 'headsets', fallback = '4')),
+            channels = int(self.parser.get('soak', 'channels', fallback = '8')),
+            fs = float(self.parser.get('soak', 'fs', fallback = '250.0')),
+            n_samp = int(self.parser.get('soak', 'n_samp', fallback = '50')),
+            ssvep_freqs = [float(f) for f in self.parser.get('soak', 'ssvep_freqs', fallback = '12 15 17 20').split()],
+            artifact_rate = float(self.parser.get('soak', 'artifact_rate', fallback = '0.1')),
+            seed = int(self.parser.get('soak', 'seed', fallback = '0')),
+            ramp_step = int(self.parser.get('soak', 'ramp_step', fallback = '1')),
+            ramp_interval = float(self.parser.get('soak', 'ramp_interval', fallback = '600.0')),
+            report_interval = float(self.parser.get('soak', 'report_interval', fallback = '10.0'))
+        )
+
+    @property
+    def soak_duration(self) -> float:
+        """ sec; 0 soaks until interrupted """
+        return float(self.parser.get('soak', 'duration', fallback = '0'))
+
+    def model_path(self, device: typing.Optional[str] = None) -> Path:
+        """ Decoder model for `device` (or the [unicorn] headset) """
+        default = self.data_dir / 'models' / 'boot.model'
+        if device is None:
+            return default
+        return Path(self.parser.get(DEVICE_SECTION + device, 'model', fallback = str(default))).expanduser()
     
     @property
     def graph_address(self) -> typing.Optional[typing.Tuple[str, int]]:
@@ -66,6 +226,169 @@ class BCPIConfig:
     @property
     def port(self) -> int:
         return int(self.parser.get('bcpi', 'port', fallback = '8888'))
+
+    @property
+    def buffer_dur(self) -> float:
+        """ [bcpi] buffer_dur, reduced if needed to fit [memory] budget """
+        return self.memory_plan.buffer_dur
+
+    @property
+    def snapshot_dir(self) -> typing.Optional[Path]:
+        """ Where pipeline state is saved for warm restarts; None if disabled """
+        if not self.parser.getboolean('snapshot', 'enabled', fallback = True):
+            return None
+        return self.data_dir / 'snapshots'
+
+    @property
+    def trial_recorder_settings(self) -> 'TrialRecorderSettings':
+        """ Recorded trials go to data_dir/trials (see TrialStore) if enabled """
+        from .trialstore import TrialRecorderSettings, session_name
+        from .snapshot import fingerprint
+        store = self.parser.getboolean('trials', 'store', fallback = False)
+        preproc = self.preproc_settings
+        return TrialRecorderSettings(
+            store_dir = self.data_dir / 'trials' if store else None,
+            session = session_name(),
+            # Snapshot options don't change the trials
+            settings = fingerprint(replace(preproc, snapshot_dir = None, snapshot_interval = 0.0, snapshot_max_age = 0.0)),
+            chunk_dur = float(self.parser.get('trials', 'chunk_dur', fallback = '600.0'))
+        )
+
+    @property
+    def profile_interval(self) -> float:
+        """ sec between stack samples of each thread with `bcpi --profile` """
+        return float(self.parser.get('profile', 'interval', fallback = '0.01'))
+
+    @property
+    def memory_budget(self) -> typing.Optional[int]:
+        """ bytes; None if unconstrained """
+        budget = float(self.parser.get('memory', 'budget', fallback = '0'))
+        return int(budget * 1024 * 1024) if budget > 0 else None
+
+    @property
+    def memory_report_interval(self) -> float:
+        return float(self.parser.get('memory', 'report_interval', fallback = '60.0'))
+
+    @functools.cached_property
+    def memory_plan(self) -> 'MemoryPlan':
+        """ Planned once per load (the config is re-parsed, so re-planned, when its files change) """
+        from .memory import plan_memory
+        prefixes = {'SYSTEM/CORE': None, **{f'HEADSET_{device}': device for device in self.devices}}
+        model_bytes = {}
+        for prefix, device in prefixes.items():
+            path = self.model_path(device)
+            model_bytes[prefix] = path.stat().st_size if path.exists() else 0
+
+        preproc = self.preproc_settings
+        decode = self.decode_settings
+        return plan_memory(
+            budget = self.memory_budget,
+            buffer_dur = float(self.parser.get('bcpi', 'buffer_dur', fallback = '10.0')),
+            headsets = list(prefixes),
+            itemsize = np.dtype(self.dtype).itemsize,
+            decimate = preproc.decimate_settings.factor,
+            warmup_dur = preproc.warmup_dur,
+            decode_dur = decode.window_dur + (decode.max_batch + 1) * decode.stride + 1.0,
+            log_capacity = int(self.parser.get('memory', 'log_capacity', fallback = '1000')),
+            model_bytes = model_bytes,
+            buffer_fraction = float(self.parser.get('memory', 'buffer_fraction', fallback = '0.25'))
+        )
+
+    @property
+    def strategy_isolation(self) -> str:
+        from .strategy import ISOLATIONS, ISOLATION_INPROCESS
+        isolation = self.parser.get('strategy', 'isolation', fallback = ISOLATION_INPROCESS)
+        if isolation not in ISOLATIONS:
+            raise ValueError(f'[strategy] isolation = {isolation}; expected one of {ISOLATIONS}')
+        return isolation
+
+    @property
+    def accumulator_settings(self) -> 'EvidenceAccumulatorSettings':
+        from .accumulator import EvidenceAccumulatorSettings
+        leak_tau = self.parser.get('accumulator', 'leak_tau', fallback = '1.0')
+        return EvidenceAccumulatorSettings(
+            threshold = float(self.parser.get('accumulator', 'threshold', fallback = '0.95')),
+            leak_tau = None if leak_tau.lower() == 'none' else float(leak_tau),
+            refractory = float(self.parser.get('accumulator', 'refractory', fallback = '0.5')),
+            null_class = self.parser.get('accumulator', 'null_class', fallback = None),
+            classes = self.parser.get('accumulator', 'classes', fallback = '').split()
+        )
+
+    @property
+    def filterbank_settings(self) -> 'FilterBankSettings':
+        from .filterbank import FilterBankSettings
+        bands = []
+        for band in self.parser.get('filterbank', 'bands', fallback = '').split():
+            cuton, cutoff = band.split('-')
+            bands.append((float(cuton), float(cutoff)))
+        return FilterBankSettings(
+            bands = bands,
+            order = int(self.parser.get('filterbank', 'order', fallback = '4'))
+        )
+
+    @property
+    def decode_settings(self) -> 'DecodeSchedulerSettings':
+        from .scheduler import DecodeSchedulerSettings
+        batch_axis = self.parser.get('decode', 'batch_axis', fallback = 'none')
+        return DecodeSchedulerSettings(
+            window_dur = float(self.parser.get('decode', 'window_dur', fallback = '1.0')),
+            stride = float(self.parser.get('decode', 'stride', fallback = '0.1')),
+            max_batch = int(self.parser.get('decode', 'max_batch', fallback = '8')),
+            batch_axis = None if batch_axis.lower() == 'none' else batch_axis
+        )
+
+    @property
+    def quality_settings(self) -> 'QualityMonitorSettings':
+        from .quality import QualityMonitorSettings
+        return QualityMonitorSettings(
+            window_dur = float(self.parser.get('quality', 'window_dur', fallback = '1.0')),
+            line_freqs = [float(f) for f in self.parser.get('quality', 'line_freqs', fallback = '50 60').split()],
+            flat_threshold = float(self.parser.get('quality', 'flat_threshold', fallback = '0.01')),
+            var_threshold = float(self.parser.get('quality', 'var_threshold', fallback = '1e4')),
+            line_threshold = float(self.parser.get('quality', 'line_threshold', fallback = '0.5')),
+            exclude = self.parser.getboolean('quality', 'exclude', fallback = False)
+        )
+
+    @property
+    def motion_settings(self) -> 'MotionGateSettings':
+        from .motiongate import MotionGateSettings
+        return MotionGateSettings(
+            accel_threshold = float(self.parser.get('motion', 'accel_threshold', fallback = '0.1')),
+            gyro_threshold = float(self.parser.get('motion', 'gyro_threshold', fallback = '20.0')),
+            baseline_dur = float(self.parser.get('motion', 'baseline_dur', fallback = '2.0')),
+            hold = float(self.parser.get('motion', 'hold', fallback = '0.5')),
+            skip = self.parser.getboolean('motion', 'skip', fallback = False)
+        )
+
+    @property
+    def dtype(self) -> str:
+        """ Working dtype of the realtime path; signal is converted once on ingestion """
+        return np.dtype(self.parser.get('bcpi', 'dtype', fallback = 'float32')).name
+
+    @property
+    def preproc_settings(self) -> 'TemporalPreprocSettings':
+        from ezmsg.sigproc.butterworthfilter import ButterworthFilterSettings
+        from ezmsg.sigproc.decimate import DownsampleSettings
+        from .temporalpreproc import TemporalPreprocSettings
+        return TemporalPreprocSettings(
+            filt_settings = ButterworthFilterSettings(
+                axis = 'time',
+                order = int(self.parser.get('preproc', 'order', fallback = '3')),
+                cuton = float(self.parser.get('preproc', 'cuton', fallback = '5.0')),
+                cutoff = float(self.parser.get('preproc', 'cutoff', fallback = '50.0')),
+            ),
+            decimate_settings = DownsampleSettings(
+                axis = 'time',
+                factor = int(self.parser.get('preproc', 'decimate', fallback = '2'))
+            ),
+            notch_freqs = [float(f) for f in self.parser.get('preproc', 'notch', fallback = '').split()],
+            notch_q = float(self.parser.get('preproc', 'notch_q', fallback = '30.0')),
+            ewm_history_dur = float(self.parser.get('preproc', 'ewm_history_dur', fallback = '2.0')),
+            dtype = self.dtype,
+            snapshot_dir = self.snapshot_dir,
+            snapshot_interval = float(self.parser.get('snapshot', 'interval', fallback = '10.0')),
+            snapshot_max_age = float(self.parser.get('snapshot', 'max_age', fallback = '3600.0'))
+        )
     
 
 def create_config(config_path: typing.Optional[Path] = None) -> None:
@@ -0,0 +1,75 @@
+import asyncio
+import typing
+
+from configparser import Error as ConfigError
+from pathlib import Path
+
+import ezmsg.core as ez
+
+from ezmsg.unicorn.device import UnicornSettings
+
+from .config import BCPIConfig, LIVE_SECTIONS, config_mtimes
+from .temporalpreproc import TemporalPreprocSettings
+
+
+class ConfigWatcherSettings(ez.Settings):
+    config_path: typing.Optional[Path] = None
+    poll_interval: float = 2.0 # sec
+
+
+class ConfigWatcherState(ez.State):
+    config: BCPIConfig
+    invalid: typing.Optional[typing.Tuple[typing.Tuple[Path, int], ...]] = None # mtimes of a config that didn't parse
+
+
+class ConfigWatcher(ez.Unit):
+    """
+    Polls the config files and pushes changed sections to running units as settings
+    messages, so edits to [unicorn] or [preproc] don't require restarting the graph
+    (and reconnecting to the headset).  Changes to other sections are only logged.
+    """
+
+    SETTINGS: ConfigWatcherSettings
+    STATE: ConfigWatcherState
+
+    OUTPUT_UNICORN_SETTINGS = ez.OutputStream(UnicornSettings)
+    OUTPUT_PREPROC_SETTINGS = ez.OutputStream(TemporalPreprocSettings)
+
+    async def initialize(self) -> None:
+        self.STATE.config = BCPIConfig.load(self.SETTINGS.config_path)
+
+    @ez.publisher(OUTPUT_UNICORN_SETTINGS)
+    @ez.publisher(OUTPUT_PREPROC_SETTINGS)
+    async def watch(self) -> typing.AsyncGenerator:
+        while True:
+            await asyncio.sleep(self.SETTINGS.poll_interval)
+
+            # Only stat the files each poll; parse when something changed
+            mtimes = config_mtimes(self.SETTINGS.config_path)
+            if mtimes == self.STATE.config.mtimes or mtimes == self.STATE.invalid:
+                continue
+
+            try:
+                config = BCPIConfig.load(self.SETTINGS.config_path)
+                changed = self.STATE.config.diff(config)
+                unicorn_settings = config.unicorn_settings
+                preproc_settings = config.preproc_settings
+            except (ConfigError, ValueError) as e:
+                # Warned once; the files are re-parsed when they change again
+                ez.logger.warning(f'Ignoring config change; could not parse config: {e}')
+                self.STATE.invalid = mtimes
+                continue
+
+            self.STATE.config = config
+
+            restart = sorted(changed - set(LIVE_SECTIONS))
+            if restart:
+                ez.logger.warning(f'Config sections {restart} changed; restart bcpi to apply')
+
+            if 'unicorn' in changed:
+                ez.logger.info(f'Applying {unicorn_settings=}')
+                yield self.OUTPUT_UNICORN_SETTINGS, unicorn_settings
+
+            if 'preproc' in changed:
+                ez.logger.info(f'Applying {preproc_settings=}')
+                yield self.OUTPUT_PREPROC_SETTINGS, preproc_settings
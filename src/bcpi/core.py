@@ -1,44 +1,71 @@
 import typing
+from dataclasses import replace
 from pathlib import Path
 
 import ezmsg.core as ez
 
 from ezmsg.unicorn.dashboard import UnicornDashboard, UnicornDashboardSettings
 
-from ezmsg.sigproc.butterworthfilter import ButterworthFilterSettings
-from ezmsg.sigproc.decimate import DownsampleSettings
 from ezmsg.sigproc.signalinjector import SignalInjector, SignalInjectorSettings
 from ezmsg.tasks.frequencymapper import FrequencyMapper, FrequencyMapperSettings
 
-from ezmsg.fbcsp.inference import Inference, InferenceSettings
+from ezmsg.fbcsp.inference import InferenceSettings
 
-from .temporalpreproc import TemporalPreproc, TemporalPreprocSettings
 from .config import BCPIConfig
+from .configwatcher import ConfigWatcher, ConfigWatcherSettings
+from .headset import HeadsetChain
 from .system import SystemTab, SystemTabSettings
+from .strategy import StrategyHost, StrategyHostSettings, ISOLATION_INPROCESS, entrypoint
 from .topics import BCPITopics
 
 class BCPICoreSettings(ez.Settings):
     config_path: typing.Optional[Path] = None
 
-class BCPICore(ez.Collection):
+class BCPICore(HeadsetChain):
+    """
+    The primary headset's chain (see HeadsetChain), with the dashboard as its source and
+    the signal injector spliced in after CAST, plus the system tab, config watcher and strategy
+    """
+
     SETTINGS: BCPICoreSettings
 
     INPUT_INFERENCE_SETTINGS = ez.InputStream(InferenceSettings)
 
     SYSTEM_TAB = SystemTab()
+    WATCHER = ConfigWatcher()
     UNICORN = UnicornDashboard()
     MAPPER = FrequencyMapper()
     INJECTOR = SignalInjector()
-    PREPROC = TemporalPreproc()
-
-    INFERENCE = Inference()
+    STRATEGY = StrategyHost()
 
     def configure(self) -> None:
-        config = BCPIConfig(self.SETTINGS.config_path)
+        config = BCPIConfig.load(self.SETTINGS.config_path)
 
         self.SYSTEM_TAB.apply_settings(
             SystemTabSettings(
                 data_dir = config.data_dir,
+                strategy_isolation = config.strategy_isolation,
+                graph_address = config.graph_address,
+                log_capacity = config.memory_plan.log_capacity
+            )
+        )
+
+        self.configure_chain(
+            config,
+            replace(config.preproc_settings, device = config.unicorn_settings.address),
+            config.model_path()
+        )
+
+        self.STRATEGY.apply_settings(
+            StrategyHostSettings(
+                entrypoint = entrypoint(config.data_dir),
+                autostart = config.strategy_isolation == ISOLATION_INPROCESS
+            )
+        )
+
+        self.WATCHER.apply_settings(
+            ConfigWatcherSettings(
+                config_path = self.SETTINGS.config_path
             )
         )
 
@@ -68,42 +95,37 @@ class BCPICore(ez.Collection):
             )
         )
 
-        self.PREPROC.apply_settings(
-            TemporalPreprocSettings(
-                filt_settings = ButterworthFilterSettings(
-                    axis = 'time',
-                    order = 3, # Butterworth filter order
-                    cuton = 5, # Cuton (Hz)
-                    cutoff = 50, # Cutoff (Hz)
-                ),
-                decimate_settings = DownsampleSettings(
-                    axis = 'time',
-                    factor = 2
-                ),
-                ewm_history_dur = 2.0
-            )
-        )
-
-        self.INFERENCE.apply_settings(
-            InferenceSettings(
-                model_path = config.data_dir / 'models' / 'boot.model'
-            )
-        )
-
     def network(self) -> ez.NetworkDefinition:
         return (
             (self.UNICORN.OUTPUT_ACCELEROMETER, BCPITopics.ACCELEROMETER),
             (self.UNICORN.OUTPUT_GYROSCOPE, BCPITopics.GYROSCOPE),
-            (self.UNICORN.OUTPUT_SIGNAL, self.INJECTOR.INPUT_SIGNAL),
+            (self.UNICORN.OUTPUT_SIGNAL, self.INPUT_SIGNAL),
+            (self.CAST.OUTPUT_SIGNAL, self.INJECTOR.INPUT_SIGNAL),
             (self.INJECTOR.OUTPUT_SIGNAL, BCPITopics.EPHYS),
-            (self.INJECTOR.OUTPUT_SIGNAL, self.PREPROC.INPUT_SIGNAL),
             (self.PREPROC.OUTPUT_SIGNAL, BCPITopics.EPHYS_PREPROC),
+            (self.FILTERBANK.OUTPUT_BANDS, BCPITopics.EPHYS_BANDS),
+
+            # Config changes applied without restarting the graph
+            (self.WATCHER.OUTPUT_UNICORN_SETTINGS, self.UNICORN.DEVICE.INPUT_SETTINGS),
+            (self.WATCHER.OUTPUT_PREPROC_SETTINGS, BCPITopics.PREPROC_SETTINGS),
+            (BCPITopics.PREPROC_SETTINGS, self.PREPROC.INPUT_SETTINGS),
 
             (BCPITopics.CAT_TARGET, self.MAPPER.INPUT_CLASS),
             (self.MAPPER.OUTPUT_FREQUENCY, self.INJECTOR.INPUT_FREQUENCY),
-            (self.PREPROC.OUTPUT_SIGNAL, self.INFERENCE.INPUT_SIGNAL),
-            
+
+            (self.UNICORN.OUTPUT_ACCELEROMETER, self.MOTION.INPUT_ACCELEROMETER),
+            (self.UNICORN.OUTPUT_GYROSCOPE, self.MOTION.INPUT_GYROSCOPE),
+            (self.QUALITY.OUTPUT_QUALITY, BCPITopics.QUALITY),
+            (self.MOTION.OUTPUT_MOTION, BCPITopics.MOTION),
+
             (self.INPUT_INFERENCE_SETTINGS, self.INFERENCE.INPUT_SETTINGS),
             (self.INFERENCE.OUTPUT_DECODE, BCPITopics.DECODE),
             (self.INFERENCE.OUTPUT_CLASS, BCPITopics.CLASS),
-        )
+            (self.ACCUMULATOR.OUTPUT_COMMAND, BCPITopics.COMMAND),
+
+            # In-process strategy gets decodes without a hop through the graphserver
+            (self.SYSTEM_TAB.OUTPUT_STRATEGY, self.STRATEGY.INPUT_CONTROL),
+            (self.INFERENCE.OUTPUT_CLASS, self.STRATEGY.INPUT_CLASS),
+            (self.INFERENCE.OUTPUT_DECODE, self.STRATEGY.INPUT_DECODE),
+            (self.ACCUMULATOR.OUTPUT_COMMAND, self.STRATEGY.INPUT_COMMAND),
+        ) + tuple(self.chain_network(raw = self.INJECTOR.OUTPUT_SIGNAL))
@@ -0,0 +1,207 @@
+import zlib
+import typing
+
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+
+import ezmsg.core as ez
+from ezmsg.util.messages.axisarray import AxisArray
+
+CODEC_NONE = 'none'
+CODEC_ZLIB = 'zlib'
+CODEC_LZ4 = 'lz4' # optional dependency: lz4
+CODEC_ZSTD = 'zstd' # optional dependency: zstandard
+CODECS = (CODEC_NONE, CODEC_ZLIB, CODEC_LZ4, CODEC_ZSTD)
+
+
+@dataclass
+class EncodedAxisArray:
+    """
+    Compact, lossy representation of an AxisArray for constrained links.
+
+    Samples are quantized per channel to `bits` (16 or 24) bit integers with
+    `scale` (one float per channel), optionally delta coded along time
+    (modulo 2 ** bits, so deltas are lossless at the same width) and compressed.
+    """
+    payload: bytes
+    shape: typing.Tuple[int, ...] # time-major shape of the data
+    dims: typing.List[str] # original dims; time is moved back to `time_idx`
+    axes: typing.Dict[str, AxisArray.Axis]
+    time_idx: int
+    scale: npt.NDArray # float32; one per channel (flattened non-time dims)
+    bits: int = 16
+    delta: bool = True
+    codec: str = CODEC_NONE
+    dtype: str = 'float64' # dtype restored on decode
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.payload) + self.scale.nbytes
+
+
+def _compressor(codec: str) -> typing.Tuple[typing.Callable[[bytes], bytes], typing.Callable[[bytes], bytes]]:
+    if codec == CODEC_NONE:
+        return bytes, bytes
+    elif codec == CODEC_ZLIB:
+        return (lambda data: zlib.compress(data, 1)), zlib.decompress
+    elif codec == CODEC_LZ4:
+        import lz4.frame # type: ignore
+        return lz4.frame.compress, lz4.frame.decompress
+    elif codec == CODEC_ZSTD:
+        import zstandard # type: ignore
+        return zstandard.ZstdCompressor(level = 1).compress, zstandard.ZstdDecompressor().decompress
+    raise ValueError(f'Unknown codec {codec}; expected one of {CODECS}')
+
+
+def _wrap(q: npt.NDArray, bits: int) -> npt.NDArray:
+    """ Wrap integers into signed `bits`-bit range """
+    half = 1 << (bits - 1)
+    return ((q + half) % (1 << bits)) - half
+
+
+def _pack(q: npt.NDArray, bits: int) -> bytes:
+    if bits == 16:
+        return q.astype('<i2').tobytes()
+    # 24 bit: drop the top byte of each little-endian int32
+    return q.astype('<i4').view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+
+
+def _unpack(data: bytes, bits: int, n: int) -> npt.NDArray:
+    if bits == 16:
+        return np.frombuffer(data, dtype = '<i2', count = n).astype(np.int64)
+    raw = np.zeros((n, 4), dtype = np.uint8)
+    raw[:, :3] = np.frombuffer(data, dtype = np.uint8, count = n * 3).reshape(n, 3)
+    # Shift the sign bit into place and back to sign extend
+    return ((raw.view('<i4')[:, 0] << 8) >> 8).astype(np.int64)
+
+
+def encode(
+    msg: AxisArray,
+    axis: typing.Optional[str] = None,
+    bits: int = 16,
+    delta: bool = True,
+    codec: str = CODEC_NONE,
+) -> EncodedAxisArray:
+    if bits not in (16, 24):
+        raise ValueError(f'{bits=} not supported; use 16 or 24')
+    compress, _ = _compressor(codec)
+
+    axis = msg.dims[0] if axis is None else axis
+    time_idx = msg.get_axis_idx(axis)
+    data = np.moveaxis(msg.data, time_idx, 0)
+    x = np.nan_to_num(data.reshape(data.shape[0], int(np.prod(data.shape[1:]))))
+
+    # Per-channel scale maps the largest magnitude in this chunk to full scale
+    full_scale = (1 << (bits - 1)) - 1
+    peak = np.abs(x).max(axis = 0) if x.shape[0] else np.zeros(x.shape[1])
+    scale = np.where(peak > 0, peak / full_scale, 1.0).astype(np.float32)
+    q = np.rint(x / scale).astype(np.int64)
+
+    if delta and q.shape[0]:
+        q[1:] = _wrap(np.diff(q, axis = 0), bits)
+
+    return EncodedAxisArray(
+        payload = compress(_pack(q, bits)),
+        shape = data.shape,
+        dims = list(msg.dims),
+        axes = dict(msg.axes),
+        time_idx = time_idx,
+        scale = scale,
+        bits = bits,
+        delta = delta,
+        codec = codec,
+        dtype = str(msg.data.dtype)
+    )
+
+
+def decode(enc: EncodedAxisArray) -> AxisArray:
+    _, decompress = _compressor(enc.codec)
+
+    n_time = enc.shape[0]
+    n_ch = int(np.prod(enc.shape[1:]))
+    q = _unpack(decompress(enc.payload), enc.bits, n_time * n_ch).reshape(n_time, n_ch)
+
+    if enc.delta and n_time:
+        q = _wrap(np.cumsum(q, axis = 0), enc.bits)
+
+    x = (q * enc.scale).astype(enc.dtype).reshape(enc.shape)
+    return AxisArray(
+        np.moveaxis(x, 0, enc.time_idx),
+        dims = enc.dims,
+        axes = enc.axes
+    )
+
+
+class EncodeSettings(ez.Settings):
+    axis: typing.Optional[str] = 'time'
+    bits: int = 16 # 16 or 24
+    delta: bool = True
+    codec: str = CODEC_NONE
+
+
+class Encode(ez.Unit):
+    SETTINGS: EncodeSettings
+
+    INPUT_SIGNAL = ez.InputStream(AxisArray)
+    OUTPUT_ENCODED = ez.OutputStream(EncodedAxisArray)
+
+    def initialize(self) -> None:
+        # Fail at startup rather than on the first message if a codec isn't installed
+        _compressor(self.SETTINGS.codec)
+
+    @ez.subscriber(INPUT_SIGNAL, zero_copy = True)
+    @ez.publisher(OUTPUT_ENCODED)
+    async def on_signal(self, msg: AxisArray) -> typing.AsyncGenerator:
+        yield self.OUTPUT_ENCODED, encode(
+            msg,
+            axis = self.SETTINGS.axis,
+            bits = self.SETTINGS.bits,
+            delta = self.SETTINGS.delta,
+            codec = self.SETTINGS.codec
+        )
+
+
+class Decode(ez.Unit):
+
+    INPUT_ENCODED = ez.InputStream(EncodedAxisArray)
+    OUTPUT_SIGNAL = ez.OutputStream(AxisArray)
+
+    @ez.subscriber(INPUT_ENCODED, zero_copy = True)
+    @ez.publisher(OUTPUT_SIGNAL)
+    async def on_encoded(self, msg: EncodedAxisArray) -> typing.AsyncGenerator:
+        yield self.OUTPUT_SIGNAL, decode(msg)
+
+
+if __name__ == '__main__':
+
+    ## Standalone receiver; decodes topics encoded by a remote bcpi ([wire] encode)
+
+    import argparse
+
+    from .topics import BCPITopics
+
+    parser = argparse.ArgumentParser(
+        description = 'Decode bcpi topics encoded for the wire'
+    )
+
+    parser.add_argument('topics', nargs = '+', help = 'topics to decode (e.g. EPHYS EPHYS_PREPROC)')
+    parser.add_argument('--graphserver', default = 'localhost:25978', help = 'address of the shared GraphServer')
+
+    args = parser.parse_args()
+    host, port = args.graphserver.split(':')
+
+    components: typing.Dict[str, ez.Component] = {}
+    connections: typing.List[typing.Tuple[typing.Any, typing.Any]] = []
+    for topic in args.topics:
+        decoder = Decode()
+        components[f'DECODE_{topic.replace("/", "_")}'] = decoder
+        connections.append((BCPITopics.encoded(topic), decoder.INPUT_ENCODED))
+        connections.append((decoder.OUTPUT_SIGNAL, BCPITopics.decoded(topic)))
+
+    ez.run(
+        components = components,
+        connections = connections,
+        graph_address = (host, int(port))
+    )
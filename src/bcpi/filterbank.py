@@ -0,0 +1,139 @@
+import typing
+
+from dataclasses import dataclass, field
+
+import numpy as np
+import numpy.typing as npt
+import scipy.signal
+
+import ezmsg.core as ez
+from ezmsg.util.generator import consumer
+from ezmsg.util.messages.axisarray import AxisArray
+
+
+class FilterBankSettings(ez.Settings):
+    # (cuton, cutoff) of every sub-band in Hz; empty: nothing is produced
+    bands: typing.List[typing.Tuple[float, float]] = field(default_factory = list)
+    order: int = 4 # Butterworth order of each band
+    band_axis: str = 'band' # appended after the input's dims
+    time_axis: str = 'time'
+
+
+@dataclass
+class FilterBankMessage(AxisArray):
+    bands: typing.List[typing.Tuple[float, float]] = field(default_factory = list)
+
+
+@dataclass
+class FilterState:
+    fs: typing.Optional[float] = None
+    sos: typing.Optional[npt.NDArray] = None # (band, section, 6)
+    zi: typing.Optional[typing.List[npt.NDArray]] = None # per band
+    sample_shape: typing.Optional[typing.Tuple[int, ...]] = None
+    dtype: typing.Optional[np.dtype] = None
+
+
+def design_filter_bank(settings: FilterBankSettings, fs: float) -> npt.NDArray:
+    """ Bandpass SOS of every band, stacked: (band, section, 6) """
+    return np.stack([
+        scipy.signal.butter(settings.order, band, btype = 'bandpass', fs = fs, output = 'sos')
+        for band in settings.bands
+    ])
+
+
+@consumer
+def filter_bank(
+    settings: FilterBankSettings = FilterBankSettings(),
+    state: typing.Optional[FilterState] = None
+) -> typing.Generator[typing.Optional[AxisArray], AxisArray, None]:
+    """
+    # `filter_bank`
+    Splits the signal into `settings.bands` once, for every consumer of sub-band
+    signal (e.g. spectral decoders), rather than each filtering it again.
+    Filter state persists across messages; the math runs in the input's dtype.
+
+    ## Sends:
+    * `AxisArray`: Signal (usually preprocessed)
+    ## Yields:
+    * `FilterBankMessage | None`: Signal with a trailing `settings.band_axis`;
+        None if no bands are configured
+    """
+
+    for cuton, cutoff in settings.bands:
+        if not 0.0 < cuton < cutoff:
+            raise ValueError(f'Invalid filter bank band {(cuton, cutoff)}')
+
+    state = FilterState() if state is None else state
+    output: typing.Optional[AxisArray] = None
+
+    while True:
+        msg = yield output
+
+        if not settings.bands:
+            output = None
+            continue
+
+        axis = msg.get_axis(settings.time_axis)
+        x = np.moveaxis(msg.data, msg.get_axis_idx(settings.time_axis), 0)
+        if not np.issubdtype(x.dtype, np.floating):
+            x = x.astype(float)
+
+        fs = 1.0 / axis.gain
+        if state.fs != fs or state.sample_shape != x.shape[1:] or state.dtype != x.dtype:
+            state.fs = fs
+            state.sample_shape = x.shape[1:]
+            state.dtype = x.dtype
+            state.sos = design_filter_bank(settings, fs).astype(x.dtype)
+            state.zi = None
+
+        assert state.sos is not None
+        y = np.empty(x.shape + (len(settings.bands),), dtype = x.dtype)
+        if x.shape[0]:
+            if state.zi is None:
+                # Start in steady state for the first sample rather than from rest
+                state.zi = []
+                for sos in state.sos:
+                    zi = scipy.signal.sosfilt_zi(sos)
+                    state.zi.append((zi.reshape(zi.shape + (1,) * (x.ndim - 1)) * x[0]).astype(x.dtype))
+
+            for band_idx, sos in enumerate(state.sos):
+                y[..., band_idx], state.zi[band_idx] = scipy.signal.sosfilt(
+                    sos, x, axis = 0, zi = state.zi[band_idx]
+                )
+
+        output = FilterBankMessage(
+            np.moveaxis(y, 0, msg.get_axis_idx(settings.time_axis)),
+            dims = list(msg.dims) + [settings.band_axis],
+            axes = msg.axes,
+            bands = list(settings.bands)
+        )
+
+
+class FilterBankState(ez.State):
+    gen: typing.Generator[typing.Optional[AxisArray], AxisArray, None]
+
+
+class FilterBank(ez.Unit):
+    """
+    Shared filter bank beside the decode path: sub-bands of the preprocessed signal are
+    published on OUTPUT_BANDS (BCPITopics.EPHYS_BANDS) for spectral consumers, e.g.
+    `FrequencyDecode`, which pools over the band axis like any other non-time axis.
+    Inference does its own sub-band filtering, so its input is left alone.
+    Nothing is published if no bands are configured.
+    """
+
+    SETTINGS: FilterBankSettings
+    STATE: FilterBankState
+
+    INPUT_SIGNAL = ez.InputStream(AxisArray)
+    OUTPUT_BANDS = ez.OutputStream(FilterBankMessage)
+
+    def initialize(self) -> None:
+        self.STATE.gen = filter_bank(self.SETTINGS)
+
+    @ez.subscriber(INPUT_SIGNAL, zero_copy = True)
+    @ez.publisher(OUTPUT_BANDS)
+    async def on_signal(self, msg: AxisArray) -> typing.AsyncGenerator:
+        out = self.STATE.gen.send(msg)
+        if out is not None:
+            yield self.OUTPUT_BANDS, out
@@ -1,4 +1,5 @@
 import typing
+import functools
 from dataclasses import dataclass, field
 
 import numpy as np
@@ -10,24 +11,62 @@ from ezmsg.util.messages.axisarray import AxisArray
 from ezmsg.sigproc.sampler import SampleMessage
 
 
+METHOD_CCA = 'cca'
+METHOD_PSDA = 'psda'
+
+
 @dataclass
 class FrequencyDecodeMessage(AxisArray):
     freqs: typing.List[float] = field(default_factory = list)
 
 
+@functools.lru_cache(maxsize = 16)
+def psda_projection(
+    n_samp: int,
+    fs: float,
+    freqs: typing.Tuple[float, ...],
+    harmonics: int,
+    neighbors: int,
+    dtype: np.dtype = np.dtype(np.float64)
+) -> np.ndarray:
+    """
+    Hann-windowed DFT rows (cos, sin) evaluated only at each frequency/harmonic and at
+    `neighbors` bins either side of it; shape (freq, harmonic, offset, 2, n_samp) flattened
+    to (-1, n_samp).  Offset 0 is the target; neighbors skip the window's main lobe (±1 bin).
+    Cached, so a decode is one matrix product.
+    """
+    df = fs / n_samp
+    offsets = [0.0]
+    for k in range(2, neighbors + 2):
+        offsets.extend([k * df, -k * df])
+
+    f = (
+        np.array(freqs)[:, None, None] * np.arange(1, harmonics + 2)[None, :, None]
+        + np.array(offsets)[None, None, :]
+    )
+    w = 2.0 * np.pi * f[..., None] * (np.arange(n_samp) / fs)
+    window = np.hanning(n_samp)
+    proj = np.stack([np.cos(w), np.sin(w)], axis = -2) * window
+    return proj.reshape(-1, n_samp).astype(dtype)
+
+
 @consumer
 def frequency_decode(
     time_axis: typing.Union[str, int] = 0,
     harmonics: int = 0,
     freqs: typing.List[float] = [],
-    max_int_time: float = 0
+    max_int_time: float = 0,
+    method: str = METHOD_CCA,
+    psda_neighbors: int = 2
 ) -> typing.Generator[typing.Optional[FrequencyDecodeMessage], typing.Union[SampleMessage, AxisArray], None]:
     """
     # `frequency_decode`
     Evaluates the presence of periodic content at various frequencies in the input signal using CCA  
+    or (much cheaper) power spectral density analysis (PSDA)
     
     ## Further reading:  
     * [Nakanishi et. al. 2015](https://doi.org/10.1371%2Fjournal.pone.0140703)
+    * [Lin et. al. 2006](https://doi.org/10.1109/TBME.2006.886577) (CCA vs. PSDA)
     
     ## Parameters:
     * `time_axis (str|int)`: The time axis in the data array to look for periodic content within.
@@ -50,6 +89,13 @@ def frequency_decode(
         0 (default): Use all time provided for the calculation.
         Useful for artificially limiting the amount of data used for the CCA method to evaluate
         the necessary integration time for good decoding performance
+
+    * `method (str)`: 'cca' (default) or 'psda'.  PSDA scores each frequency by the SNR of its
+        power (and its harmonics') against neighboring bins, pooled over channels, using a cached
+        windowed DFT projection of only those bins (see `psda_projection`).  About an order of
+        magnitude cheaper than CCA, at some cost in accuracy for short windows.
+
+    * `psda_neighbors (int)`: Number of neighboring bins on either side used for the PSDA noise estimate
  
     ## Sends:
     * `AxisArray` or `SampleMessage` containing buffers of data to evaluate
@@ -58,7 +104,11 @@ def frequency_decode(
         This is calculated as the softmax of the highest canonical correlations between each design matrix and the data
     """
     
+    if method not in (METHOD_CCA, METHOD_PSDA):
+        raise ValueError(f'Unknown frequency decode {method=}')
+
     harmonics = max(0, harmonics)
+    psda_neighbors = max(1, psda_neighbors)
     max_int_time = max(0, max_int_time)
     output: typing.Optional[FrequencyDecodeMessage] = None
 
@@ -74,40 +124,52 @@ def frequency_decode(
 
         t_ax = input.ax(time_axis)
         fs = 1.0 / t_ax.axis.gain
-        t = t_ax.values - t_ax.axis.offset
-        max_samp = int(max_int_time * fs) if max_int_time else len(t)
-        t = t[:max_samp]
+        max_samp = int(max_int_time * fs) if max_int_time else None
 
         if len(test_freqs) == 0:
             ez.logger.warning('no frequencies to test')
             output = None
             continue
 
+        # time-axis moved to dim 0, all other axes flattened to dim 1
+        # The math runs in the input's dtype (e.g. float32 end-to-end)
+        X = input.as2d(time_axis)[:max_samp, ...]
+        dtype = X.dtype if np.issubdtype(X.dtype, np.floating) else np.dtype(np.float64)
+
         cv = []
-        for test_freq in test_freqs:
-
-            # Create the design matrix of base frequency and requested harmonics
-            design = []
-            for harm_idx in range(harmonics + 1):
-                f = test_freq * (harm_idx + 1)
-                w = 2.0 * np.pi * f * t
-                design.append(np.sin(w))
-                design.append(np.cos(w))
-            design = np.array(design) # time is now dim 1
-
-            # We only care about highest canonical correlation
-            # which can be calculated using singular value decomposition
-            # https://numerical.recipes/whp/notes/CanonCorrBySVD.pdf
-            X = input.as2d(time_axis) # time-axis moved to dim 0, all other axes flattened to dim 1
-            X = X - X.mean(0) # Method works best with zero-mean on time dimension.
-            _, S, _ = svd(np.dot(design, input.as2d(time_axis)[:max_samp, ...]))
-
-            # S is porportional to canonical correlations; SVD guarantees max corr is element 0
-            cv.append(S[0]) 
+        if method == METHOD_PSDA:
+            proj = psda_projection(X.shape[0], fs, tuple(test_freqs), harmonics, psda_neighbors, dtype)
+            Y = np.dot(proj, X.astype(dtype, copy = False)) # Hann window rejects DC; no need to center
+
+            # Power per bin, pooled over cos/sin and channels: (freq, harmonic, offset)
+            power = (Y * Y).reshape(len(test_freqs), harmonics + 1, 1 + 2 * psda_neighbors, -1).sum(axis = -1)
+            noise = power[:, :, 1:].sum(axis = -1) / (2 * psda_neighbors)
+            snr = power[:, :, 0] / np.maximum(noise, np.finfo(dtype).tiny)
+            cv = snr.sum(axis = -1) / (harmonics + 1)
+        else:
+            t = t_ax.values[:max_samp] - t_ax.axis.offset
+            for test_freq in test_freqs:
+
+                # Create the design matrix of base frequency and requested harmonics
+                design = []
+                for harm_idx in range(harmonics + 1):
+                    f = test_freq * (harm_idx + 1)
+                    w = 2.0 * np.pi * f * t
+                    design.append(np.sin(w))
+                    design.append(np.cos(w))
+                design = np.array(design, dtype = dtype) # time is now dim 1
+
+                # We only care about highest canonical correlation
+                # which can be calculated using singular value decomposition
+                # https://numerical.recipes/whp/notes/CanonCorrBySVD.pdf
+                _, S, _ = svd(np.dot(design, X.astype(dtype, copy = False)))
+
+                # S is porportional to canonical correlations; SVD guarantees max corr is element 0
+                cv.append(S[0]) 
 
         # Calculate softmax with shifting to avoid overflow
         # (https://doi.org/10.1093/imanum/draa038)
-        cv = np.array(cv)
+        cv = np.array(cv, dtype = dtype)
         cv = cv - cv.max()
         cv = np.exp(cv)
         softmax = cv / np.sum(cv)
@@ -123,6 +185,8 @@ class FrequencyDecodeSettings(ez.Settings):
     harmonics: int = 0
     time_axis: typing.Union[str, int] = 0
     freqs: typing.List[float] = field(default_factory = list)
+    method: str = METHOD_CCA # or METHOD_PSDA
+    psda_neighbors: int = 2
 
 
 class FrequencyDecodeState(ez.State):
@@ -141,7 +205,9 @@ class FrequencyDecode(ez.Unit):
         self.STATE.gen = frequency_decode(
             harmonics = settings.harmonics,
             time_axis = settings.time_axis,
-            freqs = settings.freqs
+            freqs = settings.freqs,
+            method = settings.method,
+            psda_neighbors = settings.psda_neighbors
         )
 
     async def initialize(self) -> None:
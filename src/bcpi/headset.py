@@ -0,0 +1,121 @@
+import typing
+from dataclasses import replace
+from pathlib import Path
+
+import ezmsg.core as ez
+from ezmsg.util.messages.axisarray import AxisArray
+
+from ezmsg.unicorn.device import UnicornDevice
+
+from ezmsg.fbcsp.inference import Inference, InferenceSettings
+
+from .temporalpreproc import TemporalPreproc, TemporalPreprocSettings
+from .cast import Cast, CastSettings
+from .accumulator import EvidenceAccumulator
+from .motiongate import MotionGate
+from .scheduler import DecodeScheduler
+from .filterbank import FilterBank
+from .quality import QualityMonitor
+from .config import BCPIConfig
+from .topics import BCPITopics
+
+
+class HeadsetChain(ez.Collection):
+    """
+    The realtime chain of a headset (cast -> preproc -> quality -> motion -> scheduler
+    -> inference -> accumulator, and preproc -> filterbank beside it) for one headset's
+    signal on INPUT_SIGNAL.
+    Subclasses add the source and route the outputs (see BCPIHeadset).
+    """
+
+    INPUT_SIGNAL = ez.InputStream(AxisArray)
+
+    CAST = Cast()
+    PREPROC = TemporalPreproc()
+    QUALITY = QualityMonitor()
+    MOTION = MotionGate()
+    FILTERBANK = FilterBank()
+    SCHEDULER = DecodeScheduler()
+    INFERENCE = Inference()
+    ACCUMULATOR = EvidenceAccumulator()
+
+    def configure_chain(self, config: BCPIConfig, preproc_settings: TemporalPreprocSettings, model_path: Path) -> None:
+        self.CAST.apply_settings(CastSettings(dtype = config.dtype))
+        self.PREPROC.apply_settings(preproc_settings)
+        self.QUALITY.apply_settings(config.quality_settings)
+        self.MOTION.apply_settings(config.motion_settings)
+        self.FILTERBANK.apply_settings(config.filterbank_settings)
+        self.SCHEDULER.apply_settings(config.decode_settings)
+        self.INFERENCE.apply_settings(InferenceSettings(model_path = model_path))
+        self.ACCUMULATOR.apply_settings(config.accumulator_settings)
+
+    def chain_network(self, raw: typing.Optional[ez.OutputStream] = None) -> ez.NetworkDefinition:
+        """
+        `raw` feeds preproc and the quality monitor; CAST's output unless a subclass
+        splices units in after CAST (see BCPICore)
+        """
+        raw = self.CAST.OUTPUT_SIGNAL if raw is None else raw
+        return (
+            (self.INPUT_SIGNAL, self.CAST.INPUT_SIGNAL),
+            (raw, self.PREPROC.INPUT_SIGNAL),
+            (raw, self.QUALITY.INPUT_RAW),
+            (self.PREPROC.OUTPUT_SIGNAL, self.QUALITY.INPUT_SIGNAL),
+            (self.PREPROC.OUTPUT_SIGNAL, self.FILTERBANK.INPUT_SIGNAL),
+            (self.QUALITY.OUTPUT_SIGNAL, self.MOTION.INPUT_SIGNAL),
+            (self.MOTION.OUTPUT_SIGNAL, self.SCHEDULER.INPUT_SIGNAL),
+            (self.SCHEDULER.OUTPUT_WINDOW, self.INFERENCE.INPUT_SIGNAL),
+            (self.INFERENCE.OUTPUT_DECODE, self.ACCUMULATOR.INPUT_DECODE),
+        )
+
+
+class BCPIHeadsetSettings(ez.Settings):
+    device: str # Name of the [device:NAME] section in the config
+    config_path: typing.Optional[Path] = None
+
+
+class BCPIHeadset(HeadsetChain):
+    """
+    Headless acquisition -> preproc -> inference chain for an additional headset.
+    Publishes the same topics as BCPICore, namespaced with `BCPITopics.headset`.
+
+    NOTE: The topic names depend on SETTINGS, so settings must be passed
+    at construction rather than applied in a parent's `configure`.
+    """
+
+    SETTINGS: BCPIHeadsetSettings
+
+    DEVICE = UnicornDevice()
+
+    def configure(self) -> None:
+        config = BCPIConfig.load(self.SETTINGS.config_path)
+
+        device = config.devices[self.SETTINGS.device]
+        self.DEVICE.apply_settings(device)
+        self.configure_chain(
+            config,
+            replace(config.preproc_settings, device = device.address),
+            config.model_path(self.SETTINGS.device)
+        )
+
+    def network(self) -> ez.NetworkDefinition:
+        def topic(name: str) -> str:
+            return BCPITopics.headset(name, self.SETTINGS.device)
+
+        return (
+            (self.DEVICE.OUTPUT_ACCELEROMETER, topic(BCPITopics.ACCELEROMETER)),
+            (self.DEVICE.OUTPUT_GYROSCOPE, topic(BCPITopics.GYROSCOPE)),
+            (self.DEVICE.OUTPUT_SIGNAL, self.INPUT_SIGNAL),
+            (self.CAST.OUTPUT_SIGNAL, topic(BCPITopics.EPHYS)),
+            (self.PREPROC.OUTPUT_SIGNAL, topic(BCPITopics.EPHYS_PREPROC)),
+            (self.FILTERBANK.OUTPUT_BANDS, topic(BCPITopics.EPHYS_BANDS)),
+            (self.DEVICE.OUTPUT_ACCELEROMETER, self.MOTION.INPUT_ACCELEROMETER),
+            (self.DEVICE.OUTPUT_GYROSCOPE, self.MOTION.INPUT_GYROSCOPE),
+            (self.QUALITY.OUTPUT_QUALITY, topic(BCPITopics.QUALITY)),
+            (self.MOTION.OUTPUT_MOTION, topic(BCPITopics.MOTION)),
+            (self.INFERENCE.OUTPUT_DECODE, topic(BCPITopics.DECODE)),
+            (self.INFERENCE.OUTPUT_CLASS, topic(BCPITopics.CLASS)),
+            (self.ACCUMULATOR.OUTPUT_COMMAND, topic(BCPITopics.COMMAND)),
+
+            # Preproc config is shared by all headsets
+            (BCPITopics.PREPROC_SETTINGS, self.PREPROC.INPUT_SETTINGS),
+        ) + tuple(self.chain_network())
@@ -0,0 +1,122 @@
+import time
+import typing
+import logging
+import threading
+
+from collections import deque
+from dataclasses import dataclass
+
+
+class LogStream(typing.Protocol):
+    def write(self, text: str) -> typing.Any: ...
+
+
+@dataclass
+class _RateWindow:
+    start: float
+    count: int = 0
+    suppressed: int = 0
+    msg: str = '' # unformatted message of the first record, for the summary
+
+
+class BatchedLogHandler(logging.Handler):
+    """
+    Logging handler that never blocks the caller on its destination.
+
+    `emit` only appends the record to a bounded ring (dropping the oldest records
+    if the writer falls behind); a background thread formats whatever accumulated
+    every `frame_interval` and writes it to `stream` in a single call.
+
+    Floods are rate-limited per call site: at most `rate_limit` records from the
+    same logger, level and line are kept per `rate_interval`; the rest are counted
+    and summarized once the interval is over.
+    """
+
+    def __init__(
+        self,
+        stream: LogStream,
+        capacity: int = 1000,
+        frame_interval: float = 0.1, # sec
+        rate_limit: int = 10,
+        rate_interval: float = 1.0, # sec
+        terminator: str = '\n',
+        level: int = logging.NOTSET
+    ):
+        super().__init__(level)
+        self.stream = stream
+        self.terminator = terminator
+        self.frame_interval = frame_interval
+        self.rate_limit = rate_limit
+        self.rate_interval = rate_interval
+
+        self._ring: typing.Deque[logging.LogRecord] = deque(maxlen = capacity)
+        self._dropped = 0
+        self._windows: typing.Dict[typing.Tuple[str, int, str, int], _RateWindow] = {}
+        self._rate_lock = threading.Lock()
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target = self._run, name = 'BatchedLogHandler', daemon = True)
+        self._thread.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # Runs on the logging thread (often an event loop); no formatting or I/O here
+        key = (record.name, record.levelno, record.pathname, record.lineno)
+        with self._rate_lock:
+            window = self._windows.get(key)
+            if window is None or record.created - window.start >= self.rate_interval:
+                window = _RateWindow(start = record.created, msg = str(record.msg))
+                self._windows[key] = window
+            window.count += 1
+            if window.count > self.rate_limit:
+                window.suppressed += 1
+                return
+
+            if len(self._ring) == self._ring.maxlen:
+                self._dropped += 1
+        self._ring.append(record)
+
+    def _summaries(self, now: float, flush_all: bool = False) -> typing.List[str]:
+        """ Lines for suppressed records of rate windows that are over """
+        lines = []
+        with self._rate_lock:
+            for key, window in list(self._windows.items()):
+                if not flush_all and now - window.start < self.rate_interval:
+                    continue
+                del self._windows[key]
+                if window.suppressed:
+                    lines.append(
+                        f'({window.suppressed} more {logging.getLevelName(key[1])} records '
+                        f'from {key[0]} like "{window.msg}" suppressed)'
+                    )
+
+            dropped, self._dropped = self._dropped, 0
+            if dropped:
+                lines.append(f'({dropped} log records dropped; writer fell behind)')
+        return lines
+
+    def flush(self, flush_all: bool = False) -> None:
+        lines = []
+        while self._ring:
+            record = self._ring.popleft()
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        lines.extend(self._summaries(time.time(), flush_all))
+
+        if lines:
+            try:
+                self.stream.write(self.terminator.join(lines) + self.terminator)
+            except Exception:
+                pass # Nowhere left to report this
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.frame_interval):
+            self.flush()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout = 1.0)
+        self.flush(flush_all = True)
+        super().close()
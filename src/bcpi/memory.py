@@ -0,0 +1,178 @@
+import os
+import typing
+import threading
+
+from dataclasses import dataclass, field
+
+import ezmsg.core as ez
+
+# Signal entering the graph is assumed to look like a Unicorn's
+UNICORN_FS = 250.0 # Hz
+UNICORN_CHANNELS = 8
+
+LOG_RECORD_BYTES = 1024 # rough size of a buffered log record
+MIN_BUFFER_DUR = 2.0 # sec; trial buffers aren't shrunk below this
+
+
+def format_bytes(n: float) -> str:
+    for unit in ('B', 'kB', 'MB'):
+        if abs(n) < 1024.0:
+            return f'{n:.1f} {unit}'
+        n /= 1024.0
+    return f'{n:.1f} GB'
+
+
+@dataclass
+class MemoryPlan:
+    """ Sizes of bcpi's preallocated buffers, and the bytes each component preallocates """
+    budget: typing.Optional[int] # bytes; None: unconstrained
+    buffer_dur: float # sec; trial buffer
+    log_capacity: int # records; System tab log ring
+    allocations: typing.Dict[str, int] = field(default_factory = dict) # component address: bytes
+    warnings: typing.List[str] = field(default_factory = list)
+
+    @property
+    def total(self) -> int:
+        return sum(self.allocations.values())
+
+    def report(self) -> typing.List[str]:
+        budget = 'none' if self.budget is None else format_bytes(self.budget)
+        lines = [f'Preallocated memory (budget {budget}; {self.buffer_dur:.1f} sec trial buffer):']
+        for address, nbytes in sorted(self.allocations.items(), key = lambda item: -item[1]):
+            lines.append(f'  {address}: {format_bytes(nbytes)}')
+        lines.append(f'  total: {format_bytes(self.total)}')
+        return lines
+
+
+def plan_memory(
+    budget: typing.Optional[int],
+    buffer_dur: float,
+    headsets: typing.List[str],
+    itemsize: int,
+    decimate: int,
+    warmup_dur: float,
+    decode_dur: float,
+    log_capacity: int,
+    model_bytes: typing.Mapping[str, int],
+    buffer_fraction: float = 0.25
+) -> MemoryPlan:
+    """
+    Size bcpi's buffers so that what they preallocate stays within `buffer_fraction`
+    of `budget` (the rest is left for the interpreter, libraries and models).
+    `headsets` are the address prefixes of each headset's pipeline (e.g. SYSTEM/CORE);
+    `model_bytes` is keyed by the same prefixes.
+    """
+    raw_rate = UNICORN_FS * UNICORN_CHANNELS * itemsize # bytes/sec
+    preproc_rate = raw_rate / max(1, decimate)
+
+    allocations: typing.Dict[str, int] = {}
+    warnings: typing.List[str] = []
+    for prefix in headsets:
+        allocations[f'{prefix}/PREPROC'] = int(warmup_dur * raw_rate)
+        allocations[f'{prefix}/SCHEDULER'] = int(decode_dur * preproc_rate)
+        allocations[f'{prefix}/INFERENCE'] = model_bytes.get(prefix, 0)
+
+    if budget is not None:
+        allowance = budget * buffer_fraction - sum(allocations.values())
+        log_capacity = max(100, min(log_capacity, int(0.1 * allowance / LOG_RECORD_BYTES)))
+        allowance -= log_capacity * LOG_RECORD_BYTES
+        fit_dur = max(MIN_BUFFER_DUR, allowance / preproc_rate)
+        if fit_dur < buffer_dur:
+            warnings.append(f'Memory budget: trial buffer reduced from {buffer_dur} to {fit_dur:.1f} sec')
+            buffer_dur = fit_dur
+
+    allocations['SYSTEM/CORE/SYSTEM_TAB'] = log_capacity * LOG_RECORD_BYTES
+    allocations['SYSTEM/TRIALS'] = int(buffer_dur * preproc_rate)
+
+    plan = MemoryPlan(budget, buffer_dur, log_capacity, allocations, warnings)
+    if budget is not None and plan.total > budget * buffer_fraction:
+        plan.warnings.append(
+            f'Memory budget: buffers need {format_bytes(plan.total)} '
+            f'of {format_bytes(budget * buffer_fraction)} allowed'
+        )
+    return plan
+
+
+def rss(pid: typing.Optional[int] = None) -> typing.Optional[int]:
+    """ Resident set size of process `pid` (default: this one) in bytes; None without /proc """
+    try:
+        with open(f'/proc/{"self" if pid is None else pid}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def descendants(pid: int) -> typing.List[int]:
+    """ Every process descended from `pid` (Linux); [] elsewhere """
+    parents: typing.Dict[int, int] = {}
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return []
+
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as stat:
+                # comm (field 2) may contain spaces; ppid follows the closing paren
+                parents[int(entry)] = int(stat.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+
+    result: typing.List[int] = []
+    frontier = [pid]
+    while frontier:
+        parent = frontier.pop()
+        children = [child for child, ppid in parents.items() if ppid == parent]
+        result.extend(children)
+        frontier.extend(children)
+    return result
+
+
+class MemoryMonitor(threading.Thread):
+    """
+    Logs the RSS of this process (with `children`, the whole process tree) every
+    `interval` seconds, and warns whenever it exceeds `budget` bytes.
+    """
+
+    def __init__(
+        self,
+        label: str,
+        interval: float,
+        budget: typing.Optional[int] = None,
+        children: bool = False
+    ):
+        super().__init__(name = 'MemoryMonitor', daemon = True)
+        self.label = label
+        self.interval = interval
+        self.budget = budget
+        self.children = children
+        self.peak = 0
+        self._stop_ev = threading.Event()
+
+    def measure(self) -> typing.Optional[int]:
+        total = rss()
+        if total is None or not self.children:
+            return total
+        return total + sum(rss(pid) or 0 for pid in descendants(os.getpid()))
+
+    def run(self) -> None:
+        while not self._stop_ev.wait(self.interval):
+            nbytes = self.measure()
+            if nbytes is None:
+                ez.logger.info('RSS is not available on this platform; memory monitor stopped')
+                return
+
+            self.peak = max(self.peak, nbytes)
+            msg = f'{self.label} RSS: {format_bytes(nbytes)} (peak {format_bytes(self.peak)})'
+            if self.budget is not None and nbytes > self.budget:
+                ez.logger.warning(f'{msg} exceeds memory budget of {format_bytes(self.budget)}')
+            else:
+                ez.logger.info(msg)
+
+    def stop(self) -> None:
+        self._stop_ev.set()
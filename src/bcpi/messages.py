@@ -1,13 +1,122 @@
-from dataclasses import dataclass
+import time
+import struct
+import typing
+
+from dataclasses import dataclass, field
+
+# Wire format for the BLE stim link (all little-endian)
+#   frame header: kind (u8), event count or clock sync exchange id (u8)
+#   stim event:   sequence number (u32), event code (u16), timestamp (i64 nanoseconds)
+#   clock sync:   requests are a bare header; responses add t2, t3 (i64 nanoseconds).
+#                 The client keeps t1 by exchange id so every frame fits BLE_MIN_MTU.
+FRAME_HEADER = struct.Struct('<BB')
+STIM_EVENT = struct.Struct('<IHq')
+SYNC_TIMES = struct.Struct('<qq')
+
+FRAME_EVENTS = 0x01
+FRAME_SYNC_REQUEST = 0x02 # client -> server on the trig characteristic
+FRAME_SYNC_RESPONSE = 0x03 # server -> client on the stim characteristic
+
+# Bytes of every ATT notification taken by the opcode and attribute handle
+ATT_HEADER_SIZE = 3
+
+# Smallest ATT MTU every BLE device must support
+BLE_MIN_MTU = 23
+
+SEQ_MODULUS = 2 ** 32
+
 
 @dataclass
 class StimMessage:
-    value: int = 0
+    value: int = 0 # event code
+    timestamp: float = field(default_factory = time.time) # sec, sender clock
+    seq: int = 0
 
     @classmethod
     def deserialize(cls, data: bytes) -> "StimMessage":
-        val = int.from_bytes(data, byteorder = 'big')
-        return cls(val)
-    
+        seq, value, timestamp_ns = STIM_EVENT.unpack(data)
+        return cls(value = value, timestamp = timestamp_ns * 1e-9, seq = seq)
+
     def serialize(self) -> bytes:
-        return int.to_bytes(self.value, 2, byteorder = 'big')
\ No newline at end of file
+        return STIM_EVENT.pack(
+            self.seq % SEQ_MODULUS,
+            self.value,
+            int(round(self.timestamp * 1e9))
+        )
+
+
+def max_events(mtu: int) -> int:
+    """ Number of stim events that fit in a single notification at `mtu` """
+    n_events = (mtu - ATT_HEADER_SIZE - FRAME_HEADER.size) // STIM_EVENT.size
+    if n_events < 1:
+        raise ValueError(f'{mtu=} too small to carry a stim event')
+    return min(n_events, 0xFF)
+
+
+def pack_frames(msgs: typing.Sequence[StimMessage], mtu: int = BLE_MIN_MTU) -> typing.List[bytes]:
+    """ Coalesce `msgs` into as few frames (one per notification) as `mtu` allows """
+    per_frame = max_events(mtu)
+    frames: typing.List[bytes] = []
+    for idx in range(0, len(msgs), per_frame):
+        batch = msgs[idx:idx + per_frame]
+        frames.append(
+            FRAME_HEADER.pack(FRAME_EVENTS, len(batch))
+            + b''.join(msg.serialize() for msg in batch)
+        )
+    return frames
+
+
+def frame_kind(data: bytes) -> int:
+    if len(data) < FRAME_HEADER.size:
+        raise ValueError(f'Frame too short ({len(data)} bytes)')
+    return data[0]
+
+
+def unpack_frame(data: bytes) -> typing.List[StimMessage]:
+    """ Decode a frame of stim events; raises ValueError on malformed frames """
+    kind = frame_kind(data)
+    _, count = FRAME_HEADER.unpack_from(data)
+    if kind != FRAME_EVENTS:
+        raise ValueError(f'Unknown frame kind: {kind:#04x}')
+
+    expected = FRAME_HEADER.size + count * STIM_EVENT.size
+    if len(data) != expected:
+        raise ValueError(f'Frame length {len(data)} != {expected} for {count} events')
+
+    return [
+        StimMessage(value = value, timestamp = timestamp_ns * 1e-9, seq = seq)
+        for seq, value, timestamp_ns in STIM_EVENT.iter_unpack(data[FRAME_HEADER.size:])
+    ]
+
+
+def pack_sync_request(exchange: int) -> bytes:
+    return FRAME_HEADER.pack(FRAME_SYNC_REQUEST, exchange % 0x100)
+
+
+def unpack_sync_request(data: bytes) -> int:
+    """ Exchange id of a clock sync request; raises ValueError on malformed frames """
+    if frame_kind(data) != FRAME_SYNC_REQUEST or len(data) != FRAME_HEADER.size:
+        raise ValueError('Not a clock sync request')
+    return data[1]
+
+
+def pack_sync_response(exchange: int, t2: int, t3: int) -> bytes:
+    """ Server receive (t2) and transmit (t3) times; integer nanoseconds """
+    return FRAME_HEADER.pack(FRAME_SYNC_RESPONSE, exchange % 0x100) + SYNC_TIMES.pack(t2, t3)
+
+
+def unpack_sync_response(data: bytes) -> typing.Tuple[int, int, int]:
+    """ Decode a clock sync response to (exchange, t2, t3); raises ValueError on malformed frames """
+    if frame_kind(data) != FRAME_SYNC_RESPONSE or len(data) != FRAME_HEADER.size + SYNC_TIMES.size:
+        raise ValueError('Not a clock sync response')
+    t2, t3 = SYNC_TIMES.unpack_from(data, FRAME_HEADER.size)
+    return data[1], t2, t3
+
+
+def seq_gap(last_seq: typing.Optional[int], seq: int) -> int:
+    """ Number of events lost between `last_seq` and `seq` (handles wraparound) """
+    if last_seq is None:
+        return 0
+    gap = (seq - last_seq - 1) % SEQ_MODULUS
+    # Huge "gaps" are duplicated or reordered events, not losses
+    return gap if gap < SEQ_MODULUS // 2 else 0
@@ -0,0 +1,142 @@
+import typing
+
+from collections import deque
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+import scipy.signal
+
+import ezmsg.core as ez
+from ezmsg.util.messages.axisarray import AxisArray
+
+
+class MotionGateSettings(ez.Settings):
+    accel_threshold: float = 0.1 # g; deviation from the (slowly tracked) gravity vector
+    gyro_threshold: float = 20.0 # deg/s; deviation from the (slowly tracked) gyro bias
+    baseline_dur: float = 2.0 # sec; time constant for gravity/bias tracking
+    hold: float = 0.5 # sec; signal is considered affected this long after motion
+    skip: bool = False # drop affected signal; if False, only publish motion state
+    time_axis: str = 'time'
+
+
+@dataclass
+class IMUState:
+    """ Slowly tracked baseline (gravity or gyro bias) of one IMU stream """
+    baseline: typing.Optional[npt.NDArray] = None
+
+
+def imu_motion(
+    msg: AxisArray,
+    state: IMUState,
+    threshold: float,
+    baseline_dur: float,
+    time_axis: str = 'time'
+) -> npt.NDArray:
+    """ Timestamps of the samples in `msg` whose deviation from baseline exceeds `threshold` """
+    axis = msg.get_axis(time_axis)
+    x = np.moveaxis(msg.data, msg.get_axis_idx(time_axis), 0)
+    x = x.reshape(x.shape[0], -1)
+    if x.shape[0] == 0:
+        return np.zeros(0)
+
+    if state.baseline is None or state.baseline.shape != x.shape[1:]:
+        state.baseline = x[0].astype(float)
+
+    # Exponentially weighted baseline, then the magnitude of the deviation from it
+    alpha = min(1.0, axis.gain / baseline_dur)
+    zi = ((1.0 - alpha) * state.baseline)[None]
+    baseline, _ = scipy.signal.lfilter([alpha], [1.0, alpha - 1.0], x, axis = 0, zi = zi)
+    state.baseline = baseline[-1]
+
+    energy = np.linalg.norm(x - baseline, axis = 1)
+    times = axis.offset + axis.gain * np.arange(x.shape[0])
+    return times[energy > threshold]
+
+
+def add_motion(
+    intervals: typing.Deque[typing.Tuple[float, float]],
+    times: npt.NDArray,
+    hold: float
+) -> None:
+    """ Merge motion at `times` into sorted (start, end) `intervals`; each extends `hold` past its sample """
+    for t in times:
+        if intervals and t <= intervals[-1][1]:
+            start, end = intervals[-1]
+            intervals[-1] = (min(start, t), max(end, t + hold))
+        else:
+            intervals.append((t, t + hold))
+
+
+def affected(intervals: typing.Deque[typing.Tuple[float, float]], start: float, stop: float) -> bool:
+    """ Whether signal spanning `start`-`stop` overlaps motion; forgets motion that ended before it """
+    while intervals and intervals[0][1] < start:
+        intervals.popleft()
+    return any(i_start <= stop and start <= i_end for i_start, i_end in intervals)
+
+
+class MotionGateState(ez.State):
+    accel: IMUState
+    gyro: IMUState
+    intervals: typing.Deque[typing.Tuple[float, float]] # (start, end) of motion, in sample time
+    moving: bool = False
+
+
+class MotionGate(ez.Unit):
+    """
+    Flags head movement from the IMU streams and publishes onsets/offsets as bool.
+    With `skip`, affected signal is kept from reaching downstream units (e.g. Inference),
+    so artifacts cost no decode time and produce no outputs.
+    """
+
+    SETTINGS: MotionGateSettings
+    STATE: MotionGateState
+
+    INPUT_ACCELEROMETER = ez.InputStream(AxisArray)
+    INPUT_GYROSCOPE = ez.InputStream(AxisArray)
+    INPUT_SIGNAL = ez.InputStream(AxisArray)
+    OUTPUT_SIGNAL = ez.OutputStream(AxisArray)
+    OUTPUT_MOTION = ez.OutputStream(bool)
+
+    def initialize(self) -> None:
+        self.STATE.accel = IMUState()
+        self.STATE.gyro = IMUState()
+        self.STATE.intervals = deque()
+
+    @ez.subscriber(INPUT_ACCELEROMETER, zero_copy = True)
+    async def on_accel(self, msg: AxisArray) -> None:
+        add_motion(self.STATE.intervals, imu_motion(
+            msg,
+            self.STATE.accel,
+            self.SETTINGS.accel_threshold,
+            self.SETTINGS.baseline_dur,
+            self.SETTINGS.time_axis
+        ), self.SETTINGS.hold)
+
+    @ez.subscriber(INPUT_GYROSCOPE, zero_copy = True)
+    async def on_gyro(self, msg: AxisArray) -> None:
+        add_motion(self.STATE.intervals, imu_motion(
+            msg,
+            self.STATE.gyro,
+            self.SETTINGS.gyro_threshold,
+            self.SETTINGS.baseline_dur,
+            self.SETTINGS.time_axis
+        ), self.SETTINGS.hold)
+
+    @ez.subscriber(INPUT_SIGNAL, zero_copy = True)
+    @ez.publisher(OUTPUT_SIGNAL)
+    @ez.publisher(OUTPUT_MOTION)
+    async def on_signal(self, msg: AxisArray) -> typing.AsyncGenerator:
+        axis = msg.get_axis(self.SETTINGS.time_axis)
+        n_time = msg.data.shape[msg.get_axis_idx(self.SETTINGS.time_axis)]
+        start = axis.offset
+        stop = axis.offset + axis.gain * max(0, n_time - 1)
+
+        moving = affected(self.STATE.intervals, start, stop)
+        if moving != self.STATE.moving:
+            self.STATE.moving = moving
+            ez.logger.info(f'Motion {"detected" if moving else "ended"} at {start:.2f}')
+            yield self.OUTPUT_MOTION, moving
+
+        if not (moving and self.SETTINGS.skip):
+            yield self.OUTPUT_SIGNAL, msg
@@ -0,0 +1,205 @@
+import os
+import asyncio
+import typing
+
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import ezmsg.core as ez
+from ezmsg.core.backendprocess import DefaultBackendProcess
+
+from .memory import MemoryMonitor
+from .profiler import SamplingProfiler
+
+SCHED_POLICIES = {
+    'other': getattr(os, 'SCHED_OTHER', None),
+    'fifo': getattr(os, 'SCHED_FIFO', None),
+    'rr': getattr(os, 'SCHED_RR', None),
+}
+
+
+@dataclass
+class Placement:
+    """ Where and how the processes running `components` are scheduled """
+    name: str
+    components: typing.List[str] = field(default_factory = list) # addresses, e.g. SYSTEM/CORE/PREPROC
+    cpus: typing.Optional[typing.Set[int]] = None # None: any cpu
+    policy: typing.Optional[str] = None # one of SCHED_POLICIES; None: leave as is
+    priority: int = 0 # static priority for 'fifo'/'rr' (1-99)
+    nice: typing.Optional[int] = None
+
+    def matches(self, address: str) -> bool:
+        return any(
+            address == path or address.startswith(path + '/')
+            for path in self.components
+        )
+
+
+def parse_cpus(cpus: str) -> typing.Set[int]:
+    """ Parse a cpu list like '2,3' or '0-1,4' """
+    result: typing.Set[int] = set()
+    for part in cpus.replace(' ', '').split(','):
+        if not part:
+            continue
+        if '-' in part:
+            lo, hi = part.split('-')
+            result.update(range(int(lo), int(hi) + 1))
+        else:
+            result.add(int(part))
+    return result
+
+
+def find_component(components: typing.Mapping[str, ez.Component], address: str) -> ez.Component:
+    """ Look up a component by address (e.g. SYSTEM/CORE/PREPROC) among top-level `components` """
+    name, *path = address.strip('/').split('/')
+    component = components[name]
+    for name in path:
+        component = component.components[name]
+    return component
+
+
+def split_process(components: typing.Mapping[str, ez.Component], address: str) -> typing.Optional[ez.Component]:
+    """
+    Arrange for the component at `address` to run in its own process.  Returns it if
+    it is top-level (pass it in `ez.run`'s `process_components`); nested components
+    are split off through their parent collection's `process_components()`, which is
+    what ezmsg consults below the top level.
+    """
+    name, *path = address.strip('/').split('/')
+    component = find_component(components, address)
+    if not path:
+        return component
+
+    parent = find_component(components, '/'.join([name] + path[:-1]))
+    assert isinstance(parent, ez.Collection)
+    split = tuple(parent.process_components())
+    if component not in split:
+        split = split + (component,)
+        # Per instance: other instances of the parent's class are unaffected
+        parent.process_components = lambda: split # type: ignore
+    return None
+
+
+def _thread_ids() -> typing.List[int]:
+    """ Kernel ids of every thread in this process (Linux); [0] (the calling thread) elsewhere """
+    try:
+        return [int(tid) for tid in os.listdir('/proc/self/task')]
+    except OSError:
+        return [0]
+
+
+def apply_placement(placement: Placement) -> None:
+    """ Apply `placement` to the calling process; failures are logged, not raised """
+
+    # On Linux these are per-thread attributes and ezmsg has already started
+    # its event loop thread, so apply them to every thread; new threads inherit them
+    for tid in _thread_ids():
+        if placement.cpus:
+            try:
+                os.sched_setaffinity(tid, placement.cpus)
+            except (AttributeError, OSError) as e:
+                ez.logger.warning(f'{placement.name}: could not set cpu affinity {placement.cpus}: {e}')
+
+        if placement.nice is not None:
+            try:
+                os.setpriority(os.PRIO_PROCESS, tid, placement.nice)
+            except (AttributeError, OSError) as e:
+                ez.logger.warning(f'{placement.name}: could not set nice {placement.nice}: {e}')
+
+        if placement.policy is not None:
+            policy = SCHED_POLICIES.get(placement.policy)
+            try:
+                if policy is None:
+                    raise ValueError('unsupported scheduling policy')
+                priority = placement.priority if placement.policy in ('fifo', 'rr') else 0
+                os.sched_setscheduler(tid, policy, os.sched_param(priority))
+            except (AttributeError, OSError, ValueError) as e:
+                # Realtime policies need root or CAP_SYS_NICE
+                ez.logger.warning(f'{placement.name}: could not set scheduling policy {placement.policy}: {e}')
+
+    ez.logger.info(f'Process {os.getpid()} placed as {placement}')
+
+
+class PlacementBackendProcess(DefaultBackendProcess):
+    """
+    Applies the first `Placement` matching any of this process's units before running it.
+    A placement applies only to processes running nothing but its components (see `split_process`);
+    a placement without components applies to every process no other placement matches.
+    With `rss_interval`, the process also logs its RSS (labeled with its components) that often.
+    With `profile_dir`, the process is sampled (see SamplingProfiler) and its collapsed
+    stacks are written to profile_dir/process-PID.folded when it exits.
+
+    Pass to `ez.run` as `backend_process = functools.partial(PlacementBackendProcess, placements)`
+    """
+
+    placements: typing.List[Placement]
+    rss_interval: float
+    profile_dir: typing.Optional[Path]
+    profile_interval: float
+
+    def __init__(
+        self,
+        placements: typing.List[Placement],
+        *args,
+        rss_interval: float = 0.0,
+        profile_dir: typing.Optional[Path] = None,
+        profile_interval: float = 0.01,
+        **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self.placements = placements
+        self.rss_interval = rss_interval
+        self.profile_dir = profile_dir
+        self.profile_interval = profile_interval
+
+    def components(self) -> typing.List[str]:
+        """ Addresses of the collections (or units) run by this process, two levels deep """
+        return sorted({'/'.join(unit.address.split('/')[:2]) for unit in self.units})
+
+    def placement(self) -> typing.Optional[Placement]:
+        for placement in self.placements:
+            matched = [unit.address for unit in self.units if placement.matches(unit.address)]
+            if not matched:
+                continue
+            if len(matched) < len(self.units):
+                # e.g. with --single-process; pinning the whole process would pin everything
+                ez.logger.warning(
+                    f'Placement {placement.name}: {matched} share a process with other units; not applied'
+                )
+                return None
+            return placement
+
+        for placement in self.placements:
+            if not placement.components:
+                return placement
+
+        return None
+
+    def process(self, loop: asyncio.AbstractEventLoop) -> None:
+        placement = self.placement()
+        if placement is not None:
+            apply_placement(placement)
+
+        monitor = None
+        if self.rss_interval > 0:
+            label = f'Process {os.getpid()} ({", ".join(self.components())})'
+            monitor = MemoryMonitor(label, self.rss_interval)
+            monitor.start()
+
+        profiler = None
+        if self.profile_dir is not None:
+            profiler = SamplingProfiler(self.units, self.profile_interval)
+            profiler.start()
+
+        try:
+            super().process(loop)
+        finally:
+            if monitor is not None:
+                monitor.stop()
+            if profiler is not None:
+                profiler.stop()
+                profiler.join()
+                assert self.profile_dir is not None
+                path = self.profile_dir / f'process-{os.getpid()}.folded'
+                profiler.write(path)
+                ez.logger.info(f'Profile of {", ".join(self.components())} written to {path}')
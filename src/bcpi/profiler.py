@@ -0,0 +1,157 @@
+import os
+import sys
+import inspect
+import threading
+import typing
+
+from collections import Counter
+from pathlib import Path
+from types import CodeType, FrameType
+
+import ezmsg.core as ez
+
+MAX_DEPTH = 64 # frames kept per sample (innermost)
+IDLE = '<idle>'
+SUMMARY_FILE = 'summary.txt'
+
+# Innermost Python frames of a thread that is waiting rather than working
+IDLE_FRAMES = {
+    ('selectors.py', 'select'),
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('connection.py', 'wait'),
+}
+
+
+def frame_name(code: CodeType) -> str:
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f'{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'.replace(';', ':')
+
+
+def unit_code(units: typing.Iterable[ez.Unit]) -> typing.Dict[CodeType, typing.List[typing.Tuple[ez.Unit, str]]]:
+    """ Code objects of every task/subscriber of `units`, with the (unit, attribution) running them """
+    code: typing.Dict[CodeType, typing.List[typing.Tuple[ez.Unit, str]]] = {}
+    for unit in units:
+        for name, task in unit.tasks.items():
+            func = inspect.unwrap(task)
+            if hasattr(func, '__code__'):
+                code.setdefault(func.__code__, []).append((unit, f'{unit.address}:{name}'))
+    return code
+
+
+class SamplingProfiler(threading.Thread):
+    """
+    Samples the Python stack of every other thread in this process every `interval`
+    seconds.  Each sample is attributed to the innermost unit task/subscriber on the
+    stack (e.g. SYSTEM/CORE/PREPROC:on_signal), or to the thread (e.g. <thread:MemoryMonitor>)
+    when none is: ezmsg's own work (pickling, IPC) between units, logging handlers, Panel.
+    Threads that are waiting (`IDLE_FRAMES`) are counted as idle.
+    """
+
+    def __init__(self, units: typing.Iterable[ez.Unit], interval: float = 0.01):
+        super().__init__(name = 'SamplingProfiler', daemon = True)
+        self.interval = interval
+        self.code = unit_code(units)
+        self.stacks: typing.Counter[typing.Tuple[str, ...]] = Counter() # (attribution, outer, ..., inner)
+        self.idle = 0
+        self.samples = 0
+        self._stop_ev = threading.Event()
+
+    def attribute(self, frame: typing.Optional[FrameType]) -> typing.Optional[str]:
+        while frame is not None:
+            owners = self.code.get(frame.f_code)
+            if owners is not None:
+                if len(owners) == 1:
+                    return owners[0][1]
+                # Units of the same class share code; tell them apart by `self`
+                this = frame.f_locals.get('self')
+                for unit, attribution in owners:
+                    if unit is this:
+                        return attribution
+                return owners[0][1]
+            frame = frame.f_back
+        return None
+
+    def sample(self) -> None:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == self.ident:
+                continue
+            self.samples += 1
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                self.idle += 1
+                continue
+
+            attribution = self.attribute(frame) or f'<thread:{names.get(ident, ident)}>'
+            stack: typing.List[str] = []
+            inner: typing.Optional[FrameType] = frame
+            while inner is not None and len(stack) < MAX_DEPTH:
+                stack.append(frame_name(inner.f_code))
+                inner = inner.f_back
+            self.stacks[(attribution, *reversed(stack))] += 1
+
+    def run(self) -> None:
+        while not self._stop_ev.wait(self.interval):
+            self.sample()
+
+    def stop(self) -> None:
+        self._stop_ev.set()
+
+    def by_attribution(self) -> typing.Counter[str]:
+        counts: typing.Counter[str] = Counter()
+        for stack, count in self.stacks.items():
+            counts[stack[0]] += count
+        return counts
+
+    def write(self, path: Path) -> None:
+        """ Collapsed stacks (flamegraph.pl/speedscope input), attribution first, to `path` """
+        path.parent.mkdir(parents = True, exist_ok = True)
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{";".join(stack)} {count}\n')
+            if self.idle:
+                f.write(f'{IDLE} {self.idle}\n')
+
+
+def read_folded(path: Path) -> typing.Counter[typing.Tuple[str, ...]]:
+    stacks: typing.Counter[typing.Tuple[str, ...]] = Counter()
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack:
+                stacks[tuple(stack.split(';'))] += int(count)
+    return stacks
+
+
+def summarize(profile_dir: Path, top: int = 20) -> typing.List[str]:
+    """ Table of where sampled time went, by unit/thread and by function, over every *.folded in `profile_dir` """
+    stacks: typing.Counter[typing.Tuple[str, ...]] = Counter()
+    for path in sorted(profile_dir.glob('*.folded')):
+        stacks.update(read_folded(path))
+
+    total = sum(stacks.values())
+    busy = total - stacks.get((IDLE,), 0)
+    if not busy:
+        return [f'No busy samples in {profile_dir}']
+
+    owners: typing.Counter[str] = Counter()
+    leaves: typing.Counter[str] = Counter()
+    for stack, count in stacks.items():
+        if stack == (IDLE,):
+            continue
+        owners[stack[0]] += count
+        leaves[stack[-1]] += count
+
+    lines = [f'{busy} busy samples ({100.0 * busy / total:.1f}% of {total}); share of busy samples:', '', 'By unit/thread:']
+    lines += [f'  {100.0 * count / busy:6.2f}%  {count:8d}  {owner}' for owner, count in owners.most_common()]
+    lines += ['', f'By function (self, top {top}):']
+    lines += [f'  {100.0 * count / busy:6.2f}%  {count:8d}  {leaf}' for leaf, count in leaves.most_common(top)]
+    return lines
+
+
+def write_summary(profile_dir: Path) -> Path:
+    path = profile_dir / SUMMARY_FILE
+    path.write_text('\n'.join(summarize(profile_dir)) + '\n')
+    return path
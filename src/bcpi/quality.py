@@ -0,0 +1,205 @@
+import typing
+
+from dataclasses import dataclass, field, replace
+
+import numpy as np
+import numpy.typing as npt
+import scipy.signal
+
+import ezmsg.core as ez
+from ezmsg.util.generator import consumer
+from ezmsg.util.messages.axisarray import AxisArray
+
+
+class QualityMonitorSettings(ez.Settings):
+    window_dur: float = 1.0 # sec; statistics are reported once per window
+    line_freqs: typing.List[float] = field(default_factory = lambda: [50.0, 60.0]) # Hz
+    flat_threshold: float = 0.01 # variance below this is a flatline (disconnected/shorted)
+    var_threshold: float = 1e4 # variance above this is a loose or railing electrode
+    line_threshold: float = 0.5 # fraction of variance at line frequencies above this is bad contact
+    exclude: bool = False # zero bad channels in the signal passed through
+    time_axis: str = 'time'
+
+
+@dataclass
+class ChannelQualityMessage:
+    """ Per-channel signal quality over one window (channels are the flattened non-time dims) """
+    timestamp: float # end of the window
+    variance: npt.NDArray
+    line_freqs: typing.List[float]
+    line_power: npt.NDArray # (freq, ch); power of the sinusoid at each line frequency
+    flat: npt.NDArray # bool
+    bad: npt.NDArray # bool
+
+    @property
+    def line_ratio(self) -> npt.NDArray:
+        """ Fraction of each channel's variance at line frequencies """
+        return self.line_power.sum(axis = 0) / np.maximum(self.variance, 1e-12)
+
+
+@dataclass
+class QualityState:
+    n_window: int = 0 # samples per window
+    coeffs: typing.Optional[npt.NDArray] = None # Goertzel coefficient per line frequency
+    goertzel_zi: typing.Optional[npt.NDArray] = None # (freq, 2, ch)
+    n: int = 0 # samples in the current window
+    sum: typing.Optional[npt.NDArray] = None
+    sum_sq: typing.Optional[npt.NDArray] = None
+    first: typing.Optional[npt.NDArray] = None # first sample of the window; centers the sums
+
+
+def _reset_window(state: QualityState, n_freqs: int, n_ch: int) -> None:
+    state.n = 0
+    state.goertzel_zi = np.zeros((n_freqs, 2, n_ch))
+    state.sum = np.zeros(n_ch)
+    state.sum_sq = np.zeros(n_ch)
+    state.first = None
+
+
+@consumer
+def quality_monitor(
+    settings: QualityMonitorSettings = QualityMonitorSettings(),
+    state: typing.Optional[QualityState] = None
+) -> typing.Generator[typing.List[ChannelQualityMessage], AxisArray, None]:
+    """
+    # `quality_monitor`
+    Streaming per-channel variance, flatline detection and line-noise power.
+    Line-noise power comes from Goertzel filters (one IIR filter per line frequency,
+    evaluated once per window), so the cost is O(1) per sample and channel.
+
+    ## Sends:
+    * `AxisArray`: Raw signal
+    ## Yields:
+    * `List[ChannelQualityMessage]`: Quality of every window completed by the input (usually 0 or 1)
+    """
+
+    state = QualityState() if state is None else state
+    output: typing.List[ChannelQualityMessage] = []
+
+    while True:
+        msg = yield output
+        output = []
+
+        axis = msg.get_axis(settings.time_axis)
+        x = np.moveaxis(msg.data, msg.get_axis_idx(settings.time_axis), 0)
+        x = x.reshape(x.shape[0], -1).astype(float, copy = False)
+        n_ch = x.shape[1]
+
+        fs = 1.0 / axis.gain
+        n_window = max(1, int(settings.window_dur * fs))
+        if state.n_window != n_window or state.sum is None or len(state.sum) != n_ch:
+            state.n_window = n_window
+            # Goertzel bins at the nearest DFT bin to each line frequency (below Nyquist)
+            freqs = [f for f in settings.line_freqs if f < fs / 2.0]
+            bins = np.round(np.array(freqs) * n_window / fs)
+            state.coeffs = 2.0 * np.cos(2.0 * np.pi * bins / n_window)
+            _reset_window(state, len(freqs), n_ch)
+
+        assert state.coeffs is not None and state.goertzel_zi is not None
+        assert state.sum is not None and state.sum_sq is not None
+
+        idx = 0
+        while idx < x.shape[0]:
+            block = x[idx:idx + state.n_window - state.n]
+            if state.first is None:
+                state.first = block[0].copy()
+
+            # Centered on the window's first sample to keep the sums well conditioned
+            # and keep the (large) electrode offset from leaking into the Goertzel bins
+            centered = block - state.first
+            state.sum += centered.sum(axis = 0)
+            state.sum_sq += (centered ** 2).sum(axis = 0)
+            for f_idx, coeff in enumerate(state.coeffs):
+                _, state.goertzel_zi[f_idx] = scipy.signal.lfilter(
+                    [1.0], [1.0, -coeff, 1.0], centered, axis = 0, zi = state.goertzel_zi[f_idx]
+                )
+
+            state.n += block.shape[0]
+            idx += block.shape[0]
+
+            if state.n < state.n_window:
+                continue
+
+            n = state.n
+            variance = state.sum_sq / n - (state.sum / n) ** 2
+
+            # lfilter's (transposed direct form II) state after the last sample is
+            # z0 = coeff * s[n-1] - s[n-2] and z1 = -s[n-1]; recover the Goertzel outputs
+            line_power = np.zeros((len(state.coeffs), n_ch))
+            for f_idx, coeff in enumerate(state.coeffs):
+                z0, z1 = state.goertzel_zi[f_idx]
+                s1 = -z1 # s[n-1]
+                s2 = coeff * s1 - z0 # s[n-2]
+                power = s1 ** 2 + s2 ** 2 - coeff * s1 * s2 # |X[k]| ** 2
+                line_power[f_idx] = 2.0 * power / (n ** 2) # Power of a sinusoid at the bin
+
+            flat = variance < settings.flat_threshold
+            ratio = line_power.sum(axis = 0) / np.maximum(variance, 1e-12)
+            bad = flat | (variance > settings.var_threshold) | (ratio > settings.line_threshold)
+
+            output.append(ChannelQualityMessage(
+                timestamp = axis.offset + axis.gain * idx,
+                variance = variance,
+                line_freqs = [f for f in settings.line_freqs if f < fs / 2.0],
+                line_power = line_power,
+                flat = flat,
+                bad = bad
+            ))
+
+            _reset_window(state, len(state.coeffs), n_ch)
+
+
+def exclude_channels(msg: AxisArray, bad: npt.NDArray, time_axis: str = 'time') -> AxisArray:
+    """ `msg` with `bad` channels (flattened non-time dims) zeroed; `msg` itself if none are bad """
+    if not bad.any():
+        return msg
+    time_idx = msg.get_axis_idx(time_axis)
+    data = np.moveaxis(msg.data, time_idx, 0).copy()
+    shape = data.shape
+    data = data.reshape(shape[0], -1)
+    data[:, bad] = 0.0
+    return replace(msg, data = np.moveaxis(data.reshape(shape), 0, time_idx))
+
+
+class QualityMonitorState(ez.State):
+    gen: typing.Generator[typing.List[ChannelQualityMessage], AxisArray, None]
+    bad: typing.Optional[npt.NDArray] = None
+
+
+class QualityMonitor(ez.Unit):
+    """
+    Monitors raw signal quality per channel (INPUT_RAW) and, with `exclude`, zeroes
+    channels currently judged bad in the signal passed from INPUT_SIGNAL to OUTPUT_SIGNAL
+    (e.g. preprocessed signal on its way to the decoder).
+    """
+
+    SETTINGS: QualityMonitorSettings
+    STATE: QualityMonitorState
+
+    INPUT_RAW = ez.InputStream(AxisArray)
+    INPUT_SIGNAL = ez.InputStream(AxisArray)
+    OUTPUT_SIGNAL = ez.OutputStream(AxisArray)
+    OUTPUT_QUALITY = ez.OutputStream(ChannelQualityMessage)
+
+    def initialize(self) -> None:
+        self.STATE.gen = quality_monitor(self.SETTINGS)
+
+    @ez.subscriber(INPUT_RAW, zero_copy = True)
+    @ez.publisher(OUTPUT_QUALITY)
+    async def on_raw(self, msg: AxisArray) -> typing.AsyncGenerator:
+        for quality in self.STATE.gen.send(msg):
+            prev = self.STATE.bad
+            if prev is None or not np.array_equal(prev, quality.bad):
+                ez.logger.info(f'Bad channels: {np.flatnonzero(quality.bad).tolist()}')
+            self.STATE.bad = quality.bad
+            yield self.OUTPUT_QUALITY, quality
+
+    @ez.subscriber(INPUT_SIGNAL, zero_copy = True)
+    @ez.publisher(OUTPUT_SIGNAL)
+    async def on_signal(self, msg: AxisArray) -> typing.AsyncGenerator:
+        bad = self.STATE.bad
+        if self.SETTINGS.exclude and bad is not None:
+            n_time = msg.data.shape[msg.get_axis_idx(self.SETTINGS.time_axis)]
+            if n_time and bad.size * n_time == msg.data.size:
+                msg = exclude_channels(msg, bad, self.SETTINGS.time_axis)
+        yield self.OUTPUT_SIGNAL, msg
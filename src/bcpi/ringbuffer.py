@@ -0,0 +1,181 @@
+import typing
+from dataclasses import replace
+
+import numpy as np
+import numpy.typing as npt
+
+import ezmsg.core as ez
+from ezmsg.util.messages.axisarray import AxisArray
+
+
+class RingBuffer:
+    """
+    Preallocated circular buffer along the leading (time) dimension.
+
+    Samples are addressed by their absolute index (the number of samples
+    written before them), so readers can hold on to an index while the
+    buffer keeps wrapping underneath them.  Reads that do not straddle the
+    wrap point are returned as views into the buffer (no copy); the rare
+    read across the wrap point is returned as a copy.
+
+    NOTE: Views remain valid only until the buffer wraps over them, i.e. for
+    roughly `capacity` more samples.
+    """
+
+    data: npt.NDArray
+    n_written: int
+
+    def __init__(self, capacity: int, sample_shape: typing.Tuple[int, ...], dtype: npt.DTypeLike = float):
+        if capacity < 1:
+            raise ValueError('RingBuffer capacity must be at least one sample')
+        self.data = np.zeros((capacity,) + tuple(sample_shape), dtype = dtype)
+        self.n_written = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.data.shape[0]
+
+    @property
+    def sample_shape(self) -> typing.Tuple[int, ...]:
+        return self.data.shape[1:]
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    @property
+    def oldest(self) -> int:
+        """ Absolute index of the oldest sample still held in the buffer """
+        return max(0, self.n_written - self.capacity)
+
+    def write(self, data: npt.NDArray) -> None:
+        """ Append time-major `data` (time on dim 0) to the buffer """
+        n = data.shape[0]
+        if n == 0:
+            return
+
+        if n > self.capacity:
+            # Only the most recent samples would survive anyway
+            self.n_written += n - self.capacity
+            data = data[-self.capacity:]
+            n = self.capacity
+
+        start = self.n_written % self.capacity
+        first = min(n, self.capacity - start)
+        self.data[start:start + first] = data[:first]
+        self.data[:n - first] = data[first:]
+        self.n_written += n
+
+    def read(self, start: int, stop: int) -> npt.NDArray:
+        """ Read absolute sample indices [start, stop) (time on dim 0) """
+        if start < self.oldest or stop > self.n_written or start > stop:
+            raise IndexError(f'[{start}, {stop}) not within buffer [{self.oldest}, {self.n_written})')
+
+        i0 = start % self.capacity
+        n = stop - start
+        if i0 + n <= self.capacity:
+            return self.data[i0:i0 + n]
+
+        return np.concatenate((self.data[i0:], self.data[:n - (self.capacity - i0)]))
+
+
+class AxisArrayBuffer:
+    """
+    Time-indexed `RingBuffer` for a stream of `AxisArray` messages.
+
+    The buffer is allocated once from the first message (and reallocated only
+    if the sampling rate, sample shape or dtype of the stream changes) and is
+    queried by time in the units of the buffered axis.
+    """
+
+    duration: float
+    axis: typing.Optional[str]
+    buffer: typing.Optional[RingBuffer]
+
+    _template: typing.Optional[AxisArray]
+    _axis_idx: int
+    _gain: float
+    _t_ref: float # axis value of sample _i_ref
+    _i_ref: int
+
+    def __init__(self, duration: float, axis: typing.Optional[str] = None):
+        self.duration = duration
+        self.axis = axis
+        self.buffer = None
+        self._template = None
+        self._axis_idx = 0
+        self._gain = 1.0
+        self._t_ref = 0.0
+        self._i_ref = 0
+
+    @property
+    def fs(self) -> typing.Optional[float]:
+        return None if self.buffer is None else 1.0 / self._gain
+
+    @property
+    def nbytes(self) -> int:
+        return 0 if self.buffer is None else self.buffer.nbytes
+
+    def write(self, msg: AxisArray) -> bool:
+        """
+        Buffer the data in `msg`; returns True if the buffer was (re)allocated,
+        which invalidates any pending indices held by readers.
+        """
+        axis = self.axis if self.axis is not None else msg.dims[0]
+        axis_idx = msg.get_axis_idx(axis)
+        gain = msg.get_axis(axis).gain
+        data = np.moveaxis(msg.data, axis_idx, 0)
+
+        reset = (
+            self.buffer is None
+            or gain != self._gain
+            or data.shape[1:] != self.buffer.sample_shape
+            or data.dtype != self.buffer.data.dtype
+        )
+
+        if reset:
+            capacity = max(1, int(round(self.duration / gain)))
+            self.buffer = RingBuffer(capacity, data.shape[1:], data.dtype)
+            self._gain = gain
+            self._axis_idx = axis_idx
+            ez.logger.info(f'Allocated {self.buffer.nbytes} bytes for {self.duration} sec of {axis}')
+
+        assert self.buffer is not None
+        self._template = msg
+        self._t_ref = msg.get_axis(axis).offset
+        self._i_ref = self.buffer.n_written
+        self.buffer.write(data)
+        return reset
+
+    def index(self, t: float) -> int:
+        """ Absolute index of the first sample at or after time `t` """
+        return self._i_ref + int(np.ceil((t - self._t_ref) / self._gain - 1e-9))
+
+    def time(self, idx: int) -> float:
+        return self._t_ref + (idx - self._i_ref) * self._gain
+
+    @property
+    def oldest(self) -> int:
+        return 0 if self.buffer is None else self.buffer.oldest
+
+    @property
+    def newest(self) -> int:
+        """ One past the absolute index of the most recent sample """
+        return 0 if self.buffer is None else self.buffer.n_written
+
+    def view(self, start: int, stop: int) -> AxisArray:
+        """ AxisArray of absolute sample indices [start, stop); zero-copy when possible """
+        if self.buffer is None or self._template is None:
+            raise IndexError('Buffer has not seen any data')
+
+        data = np.moveaxis(self.buffer.read(start, stop), 0, self._axis_idx)
+        axis = self._template.dims[self._axis_idx]
+        axis_info = self._template.get_axis(axis)
+        return replace(
+            self._template,
+            data = data,
+            axes = {
+                **self._template.axes,
+                axis: replace(axis_info, offset = self.time(start))
+            }
+        )
@@ -0,0 +1,158 @@
+import asyncio
+import typing
+
+from collections import deque
+from dataclasses import replace
+
+import numpy as np
+
+import ezmsg.core as ez
+from ezmsg.util.messages.axisarray import AxisArray
+
+from .ringbuffer import AxisArrayBuffer
+
+
+class DecodeSchedulerSettings(ez.Settings):
+    window_dur: float = 1.0 # sec of signal per decode
+    stride: float = 0.1 # sec between decodes
+
+    # Windows that came due while the decoder was busy are stacked into one message
+    # of up to this many windows (the oldest are dropped beyond that)
+    max_batch: int = 8
+
+    # Leading axis the windows are stacked along; None: publish windows one at a time.
+    # Only set this for decoders known to accept a leading batch axis.
+    batch_axis: typing.Optional[str] = None
+
+    time_axis: str = 'time'
+
+
+class DecodeWindows:
+    """
+    Sliding decode windows over a stream of `AxisArray` messages.
+
+    Signal is written into a preallocated `AxisArrayBuffer`; a window is due
+    every `stride` samples once `window` samples are buffered, regardless of
+    how the signal was chunked; a gap in the signal's timestamps restarts this.  Due windows are only tracked by their start
+    index until they are read, so they cost nothing while pending.
+    """
+
+    def __init__(self, settings: DecodeSchedulerSettings):
+        self.settings = settings
+        # Room for the window plus every pending start, with a second to spare
+        duration = settings.window_dur + (max(1, settings.max_batch) + 1) * settings.stride + 1.0
+        self.buffer = AxisArrayBuffer(duration, settings.time_axis)
+        self.pending: typing.Deque[int] = deque(maxlen = max(1, settings.max_batch))
+        self.window = 0 # samples
+        self.stride = 0 # samples
+        self.next_stop = 0 # absolute index at which the next window is complete
+        self.dropped = 0
+
+    def write(self, msg: AxisArray) -> int:
+        """ Buffer `msg`; returns the number of windows that became due """
+        expected = self.buffer.time(self.buffer.newest) if self.buffer.fs is not None else None
+        start = self.buffer.newest
+
+        if self.buffer.write(msg):
+            assert self.buffer.fs is not None
+            self.window = max(1, int(round(self.settings.window_dur * self.buffer.fs)))
+            self.stride = max(1, int(round(self.settings.stride * self.buffer.fs)))
+            self.next_stop = self.buffer.oldest + self.window
+            self.pending.clear()
+
+        elif expected is not None:
+            # Signal was dropped upstream (e.g. by MotionGate); don't decode across the gap
+            gain = msg.get_axis(self.settings.time_axis).gain
+            if abs(msg.get_axis(self.settings.time_axis).offset - expected) > gain / 2.0:
+                self.next_stop = max(self.next_stop, start + self.window)
+
+        n_due = 0
+        while self.next_stop <= self.buffer.newest:
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append(self.next_stop - self.window)
+            self.next_stop += self.stride
+            n_due += 1
+        return n_due
+
+    def take(self) -> typing.List[AxisArray]:
+        """ Every pending window, oldest first (zero-copy views into the buffer) """
+        windows = []
+        while self.pending:
+            start = self.pending.popleft()
+            if start < self.buffer.oldest:
+                self.dropped += 1
+                continue
+            windows.append(self.buffer.view(start, start + self.window))
+        return windows
+
+
+def stack_windows(windows: typing.List[AxisArray], batch_axis: str, time_axis: str = 'time') -> AxisArray:
+    """
+    Stack equally spaced `windows` along a new leading `batch_axis`, whose values are
+    the windows' start times; the other axes are those of the first window.
+    """
+    first = windows[0]
+    start = first.get_axis(time_axis).offset
+    stride = windows[1].get_axis(time_axis).offset - start if len(windows) > 1 else 0.0
+    return replace(
+        first,
+        data = np.stack([w.data for w in windows]),
+        dims = [batch_axis] + list(first.dims),
+        axes = {
+            **first.axes,
+            batch_axis: AxisArray.Axis(unit = 's', gain = stride, offset = start)
+        }
+    )
+
+
+class DecodeSchedulerState(ez.State):
+    windows: DecodeWindows
+    due: asyncio.Event
+
+
+class DecodeScheduler(ez.Unit):
+    """
+    Decouples the decode rate from chunk arrival: every `stride` seconds, the last
+    `window_dur` seconds of signal are passed to the decoder (e.g. Inference).
+
+    Windows are published from a separate task, so while the decoder (sharing the
+    event loop) is busy, windows pile up; they go out one at a time or, if `batch_axis`
+    is set, together in one message along it -- one model call for the whole backlog.
+    """
+
+    SETTINGS: DecodeSchedulerSettings
+    STATE: DecodeSchedulerState
+
+    INPUT_SIGNAL = ez.InputStream(AxisArray)
+    OUTPUT_WINDOW = ez.OutputStream(AxisArray)
+
+    def initialize(self) -> None:
+        self.STATE.windows = DecodeWindows(self.SETTINGS)
+        self.STATE.due = asyncio.Event()
+
+    @ez.subscriber(INPUT_SIGNAL, zero_copy = True)
+    async def on_signal(self, msg: AxisArray) -> None:
+        if self.STATE.windows.write(msg):
+            self.STATE.due.set()
+
+    @ez.publisher(OUTPUT_WINDOW)
+    async def publish(self) -> typing.AsyncGenerator:
+        windows = self.STATE.windows
+        while True:
+            await self.STATE.due.wait()
+            self.STATE.due.clear()
+
+            if windows.dropped:
+                ez.logger.warning(f'Decoder fell behind; dropped {windows.dropped} stale windows')
+                windows.dropped = 0
+
+            pending = windows.take()
+            if not pending:
+                continue
+
+            if self.SETTINGS.batch_axis is None:
+                for window in pending:
+                    yield self.OUTPUT_WINDOW, window
+            else:
+                yield self.OUTPUT_WINDOW, stack_windows(pending, self.SETTINGS.batch_axis, self.SETTINGS.time_axis)
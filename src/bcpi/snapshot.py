@@ -0,0 +1,79 @@
+import os
+import json
+import time
+import typing
+import hashlib
+import tempfile
+
+from contextlib import suppress
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+import ezmsg.core as ez
+
+SNAPSHOT_VERSION = 1
+META_KEY = '__meta__'
+
+
+def snapshot_path(snapshot_dir: Path, address: str) -> Path:
+    """ Snapshot file of the unit at `address` (e.g. SYSTEM/CORE/PREPROC) """
+    return snapshot_dir / f'{address.strip("/").replace("/", "_")}.npz'
+
+
+def fingerprint(settings: typing.Any) -> str:
+    """ Short digest of `settings` (a dataclass); state saved under other settings isn't restored """
+    return hashlib.sha1(repr(settings).encode('utf-8')).hexdigest()[:16]
+
+
+def save_snapshot(path: Path, arrays: typing.Mapping[str, npt.NDArray], meta: typing.Mapping[str, typing.Any]) -> None:
+    """
+    Write `arrays` and (JSON serializable) `meta` to `path` (.npz) atomically:
+    readers find either the previous snapshot or this one, never a partial file.
+    """
+    path.parent.mkdir(parents = True, exist_ok = True)
+    stored = {**meta, 'version': SNAPSHOT_VERSION, 'time': time.time()}
+    fd, tmp = tempfile.mkstemp(dir = path.parent, prefix = path.name, suffix = '.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **{META_KEY: np.array(json.dumps(stored))}, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        with suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+
+def load_snapshot(
+    path: Path,
+    meta: typing.Mapping[str, typing.Any],
+    max_age: typing.Optional[float] = None
+) -> typing.Optional[typing.Dict[str, npt.NDArray]]:
+    """
+    Arrays saved at `path` if it exists, was saved with the same `meta`
+    and is no older than `max_age` (sec); None otherwise.
+    """
+    if not path.exists():
+        return None
+
+    try:
+        with np.load(path, allow_pickle = False) as npz:
+            stored = json.loads(str(npz[META_KEY]))
+            arrays = {name: npz[name] for name in npz.files if name != META_KEY}
+    except (OSError, ValueError, KeyError) as e:
+        ez.logger.warning(f'Unreadable snapshot {path}: {e!r}')
+        return None
+
+    age = time.time() - stored.pop('time', 0.0)
+    if stored.pop('version', None) != SNAPSHOT_VERSION:
+        ez.logger.info(f'Snapshot {path} is from another version of bcpi; not restored')
+    elif stored != json.loads(json.dumps(meta)):
+        ez.logger.info(f'Snapshot {path} was saved with other settings; not restored')
+    elif max_age is not None and age > max_age:
+        ez.logger.info(f'Snapshot {path} is {age:.0f} sec old; not restored')
+    else:
+        return arrays
+    return None
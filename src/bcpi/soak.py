@@ -0,0 +1,214 @@
+import os
+import csv
+import time
+import asyncio
+import typing
+import dataclasses
+
+from pathlib import Path
+
+import numpy as np
+
+import ezmsg.core as ez
+
+from .config import BCPIConfig
+from .headset import HeadsetChain
+from .soakprobe import ProbeReport, SoakProbe, SoakProbeSettings
+from .memory import rss, descendants, format_bytes
+from .virtualheadset import VirtualHeadset, SelectHeadset, SelectHeadsetSettings, SourceReport
+
+CSV_FIELDS = (
+    'time', 'elapsed', 'active', 'chunks', 'source_lag_ms',
+    'windows', 'decodes', 'expected', 'p50_ms', 'p99_ms', 'max_ms', 'rss'
+)
+
+
+class SoakPipelineSettings(ez.Settings):
+    headset: int
+    config_path: typing.Optional[Path] = None
+
+
+class SoakPipeline(HeadsetChain):
+    """
+    The realtime chain of a BCPIHeadset fed by one headset of a VirtualHeadset
+    (see `SelectHeadset`), with a SoakProbe on the decoder.  Nothing is published on bcpi's topics.
+    """
+
+    SETTINGS: SoakPipelineSettings
+
+    OUTPUT_REPORT = ez.OutputStream(ProbeReport)
+
+    PROBE = SoakProbe()
+
+    def configure(self) -> None:
+        config = BCPIConfig.load(self.SETTINGS.config_path)
+        decode_settings = config.decode_settings
+
+        # Soak pipelines mustn't restore (or overwrite) the state of real headsets
+        preproc_settings = dataclasses.replace(config.preproc_settings, snapshot_dir = None)
+        self.configure_chain(config, preproc_settings, config.model_path())
+        self.PROBE.apply_settings(
+            SoakProbeSettings(
+                headset = self.SETTINGS.headset,
+                report_interval = config.virtual_headset_settings.report_interval,
+                batch_axis = decode_settings.batch_axis,
+                time_axis = decode_settings.time_axis
+            )
+        )
+
+    def network(self) -> ez.NetworkDefinition:
+        return (
+            (self.SCHEDULER.OUTPUT_WINDOW, self.PROBE.INPUT_WINDOW),
+            (self.INFERENCE.OUTPUT_DECODE, self.PROBE.INPUT_DECODE),
+            (self.PROBE.OUTPUT_REPORT, self.OUTPUT_REPORT),
+        ) + tuple(self.chain_network())
+
+
+class SoakMonitorSettings(ez.Settings):
+    output: Path # CSV, one row per report interval
+    stride: float # sec between decode windows (per headset)
+    report_interval: float = 10.0
+    duration: float = 0.0 # sec; 0 runs until interrupted
+    root_pid: typing.Optional[int] = None # RSS is that of this process and its descendants
+
+
+class SoakMonitorState(ez.State):
+    start: float
+    probes: typing.Dict[int, ProbeReport]
+    source: typing.Optional[SourceReport] = None
+
+
+class SoakMonitor(ez.Unit):
+    """ Aggregates load (SourceReport), decodes and latency (ProbeReport) and RSS into a CSV """
+
+    SETTINGS: SoakMonitorSettings
+    STATE: SoakMonitorState
+
+    INPUT_SOURCE = ez.InputStream(SourceReport)
+    INPUT_PROBE = ez.InputStream(ProbeReport)
+
+    def initialize(self) -> None:
+        self.STATE.start = time.time()
+        self.STATE.probes = {}
+        self.SETTINGS.output.parent.mkdir(parents = True, exist_ok = True)
+        with open(self.SETTINGS.output, 'w', newline = '') as f:
+            csv.writer(f).writerow(CSV_FIELDS)
+        ez.logger.info(f'Soak test results: {self.SETTINGS.output}')
+
+    @ez.subscriber(INPUT_SOURCE)
+    async def on_source(self, msg: SourceReport) -> None:
+        self.STATE.source = msg
+
+    @ez.subscriber(INPUT_PROBE)
+    async def on_probe(self, msg: ProbeReport) -> None:
+        probe = self.STATE.probes.setdefault(msg.headset, ProbeReport(msg.headset, 0, 0))
+        probe.windows += msg.windows
+        probe.decodes += msg.decodes
+        probe.latencies.extend(msg.latencies)
+
+    def measure(self) -> typing.Optional[int]:
+        pid = self.SETTINGS.root_pid or os.getpid()
+        total = rss(pid)
+        if total is None:
+            return None
+        return total + sum(rss(child) or 0 for child in descendants(pid))
+
+    @ez.task
+    async def report(self) -> None:
+        while True:
+            await asyncio.sleep(self.SETTINGS.report_interval)
+            now = time.time()
+            elapsed = now - self.STATE.start
+
+            source, self.STATE.source = self.STATE.source, None
+            probes, self.STATE.probes = list(self.STATE.probes.values()), {}
+            active = source.active if source is not None else 0
+            latencies = np.array([lat for probe in probes for lat in probe.latencies]) * 1e3
+            nbytes = self.measure()
+
+            row = {
+                'time': now,
+                'elapsed': elapsed,
+                'active': active,
+                'chunks': source.chunks if source is not None else 0,
+                'source_lag_ms': source.lag * 1e3 if source is not None else float('nan'),
+                'windows': sum(probe.windows for probe in probes),
+                'decodes': sum(probe.decodes for probe in probes),
+                'expected': int(active * self.SETTINGS.report_interval / self.SETTINGS.stride),
+                'p50_ms': np.percentile(latencies, 50) if len(latencies) else float('nan'),
+                'p99_ms': np.percentile(latencies, 99) if len(latencies) else float('nan'),
+                'max_ms': latencies.max() if len(latencies) else float('nan'),
+                'rss': nbytes if nbytes is not None else '',
+            }
+
+            with open(self.SETTINGS.output, 'a', newline = '') as f:
+                csv.writer(f).writerow([row[name] for name in CSV_FIELDS])
+
+            ez.logger.info(
+                f'Soak {elapsed:.0f} sec: {active} headsets, '
+                f'{row["decodes"]}/{row["expected"]} windows decoded, '
+                f'latency p50 {row["p50_ms"]:.1f} / p99 {row["p99_ms"]:.1f} / max {row["max_ms"]:.1f} ms, '
+                f'source lag {row["source_lag_ms"]:.1f} ms, '
+                f'RSS {format_bytes(nbytes) if nbytes is not None else "n/a"}'
+            )
+
+            if self.SETTINGS.duration > 0 and elapsed >= self.SETTINGS.duration:
+                raise ez.NormalTermination
+
+
+def soak(config_path: typing.Optional[Path] = None, single_process: bool = False) -> None:
+    """
+    Ramp virtual headsets ([soak]) through bcpi's realtime chain, recording latency,
+    drops and memory to data_dir/soak until interrupted or [soak] duration elapses.
+    """
+
+    config = BCPIConfig.load(config_path)
+    source_settings = config.virtual_headset_settings
+
+    model_path = config.model_path()
+    if not model_path.exists():
+        ez.logger.error(f'Soak test decodes with the boot model, but {model_path} does not exist')
+        return
+
+    source = VirtualHeadset(source_settings)
+    monitor = SoakMonitor(
+        SoakMonitorSettings(
+            output = config.data_dir / 'soak' / f'soak-{time.strftime("%Y%m%d-%H%M%S")}.csv',
+            stride = config.decode_settings.stride,
+            report_interval = source_settings.report_interval,
+            duration = config.soak_duration,
+            root_pid = os.getpid()
+        )
+    )
+
+    components: typing.Dict[str, ez.Component] = dict(SOURCE = source, MONITOR = monitor)
+    connections: typing.List[typing.Tuple[typing.Any, typing.Any]] = [
+        (source.OUTPUT_REPORT, monitor.INPUT_SOURCE),
+    ]
+
+    # Like additional headsets, each pipeline gets its own process.  Headsets are selected
+    # in the source's process, so each pipeline only receives its own headset's signal
+    pipelines = []
+    for headset in range(source_settings.n_headsets):
+        select = SelectHeadset(SelectHeadsetSettings(index = headset))
+        pipeline = SoakPipeline(
+            SoakPipelineSettings(
+                headset = headset,
+                config_path = config_path
+            )
+        )
+        components[f'SELECT_{headset}'] = select
+        components[f'HEADSET_{headset}'] = pipeline
+        connections.append((source.OUTPUT_SIGNAL, select.INPUT_SIGNAL))
+        connections.append((select.OUTPUT_SIGNAL, pipeline.INPUT_SIGNAL))
+        connections.append((pipeline.OUTPUT_REPORT, monitor.INPUT_PROBE))
+        pipelines.append(pipeline)
+
+    ez.run(
+        components = components,
+        connections = connections,
+        process_components = pipelines,
+        force_single_process = single_process,
+        graph_address = config.graph_address,
+    )
+
@@ -0,0 +1,122 @@
+import time
+import asyncio
+import typing
+
+from collections import deque
+from dataclasses import dataclass, field
+
+import ezmsg.core as ez
+from ezmsg.util.messages.axisarray import AxisArray
+
+
+def newest_sample(msg: AxisArray, time_axis: str = 'time', batch_axis: typing.Optional[str] = None) -> float:
+    """ Timestamp of the last sample in a (possibly batched, see `stack_windows`) decode window """
+    axis = msg.get_axis(time_axis)
+    newest = axis.offset + (msg.data.shape[msg.get_axis_idx(time_axis)] - 1) * axis.gain
+    if batch_axis is not None and batch_axis in msg.dims:
+        n_win = msg.data.shape[msg.get_axis_idx(batch_axis)]
+        newest += (n_win - 1) * msg.get_axis(batch_axis).gain
+    return newest
+
+
+def n_windows(msg: AxisArray, batch_axis: typing.Optional[str] = None) -> int:
+    if batch_axis is not None and batch_axis in msg.dims:
+        return msg.data.shape[msg.get_axis_idx(batch_axis)]
+    return 1
+
+
+class PendingWindows:
+    """
+    Windows sent to the decoder, awaiting their decodes.  Decodes that carry the
+    window's time axis are paired with the window ending at the same sample; windows
+    older than that were never decoded and are dropped.  Decodes without a time axis
+    are paired in order.
+    """
+
+    def __init__(self, time_axis: str = 'time', batch_axis: typing.Optional[str] = None, max_pending: int = 256):
+        self.time_axis = time_axis
+        self.batch_axis = batch_axis
+        self.pending: typing.Deque[typing.Tuple[float, int]] = deque(maxlen = max_pending) # (newest sample, windows)
+        self.tolerance = 0.0 # sec; half a sample period of the windows
+        self.dropped = 0 # windows that were never decoded
+
+    def sent(self, msg: AxisArray) -> int:
+        """ Track window(s) `msg`; returns the number of windows """
+        n = n_windows(msg, self.batch_axis)
+        self.pending.append((newest_sample(msg, self.time_axis, self.batch_axis), n))
+        self.tolerance = msg.get_axis(self.time_axis).gain / 2.0
+        return n
+
+    def decoded(self, msg: AxisArray) -> typing.Optional[typing.Tuple[float, int]]:
+        """ (newest sample, windows) of the window(s) `msg` decodes; None if they aren't pending """
+        if not self.pending:
+            return None
+        if self.time_axis not in msg.dims:
+            return self.pending.popleft()
+
+        newest = newest_sample(msg, self.time_axis, self.batch_axis)
+        while self.pending and self.pending[0][0] < newest - self.tolerance:
+            self.dropped += self.pending.popleft()[1]
+        if self.pending and self.pending[0][0] <= newest + self.tolerance:
+            return self.pending.popleft()
+        return None
+
+
+@dataclass
+class ProbeReport:
+    """ Decodes of one soak headset over the last report interval """
+    headset: int
+    windows: int # sent to the decoder
+    decodes: int # windows decoded
+    latencies: typing.List[float] = field(default_factory = list) # sec; newest sample to decode, per message
+
+
+class SoakProbeSettings(ez.Settings):
+    headset: int
+    report_interval: float = 10.0
+    batch_axis: typing.Optional[str] = None
+    time_axis: str = 'time'
+
+
+class SoakProbeState(ez.State):
+    pending: PendingWindows
+    report: ProbeReport
+
+
+class SoakProbe(ez.Unit):
+    """
+    Pairs the windows a DecodeScheduler sends to the decoder with the decodes that come
+    back (see `PendingWindows`) to measure sample-to-decode latency.  Timestamps of virtual
+    headsets are wall-clock times, so this includes queuing anywhere along the chain.
+    """
+
+    SETTINGS: SoakProbeSettings
+    STATE: SoakProbeState
+
+    INPUT_WINDOW = ez.InputStream(AxisArray)
+    INPUT_DECODE = ez.InputStream(AxisArray)
+    OUTPUT_REPORT = ez.OutputStream(ProbeReport)
+
+    def initialize(self) -> None:
+        self.STATE.pending = PendingWindows(self.SETTINGS.time_axis, self.SETTINGS.batch_axis)
+        self.STATE.report = ProbeReport(self.SETTINGS.headset, 0, 0)
+
+    @ez.subscriber(INPUT_WINDOW, zero_copy = True)
+    async def on_window(self, msg: AxisArray) -> None:
+        self.STATE.report.windows += self.STATE.pending.sent(msg)
+
+    @ez.subscriber(INPUT_DECODE, zero_copy = True)
+    async def on_decode(self, msg: AxisArray) -> None:
+        window = self.STATE.pending.decoded(msg)
+        if window is None:
+            return
+        newest, n = window
+        self.STATE.report.latencies.append(time.time() - newest)
+        self.STATE.report.decodes += n
+
+    @ez.publisher(OUTPUT_REPORT)
+    async def report(self) -> typing.AsyncGenerator:
+        while True:
+            await asyncio.sleep(self.SETTINGS.report_interval)
+            report, self.STATE.report = self.STATE.report, ProbeReport(self.SETTINGS.headset, 0, 0)
+            yield self.OUTPUT_REPORT, report
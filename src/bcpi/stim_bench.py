@@ -0,0 +1,205 @@
+import time
+import asyncio
+import argparse
+import typing
+
+import numpy as np
+
+import ezmsg.core as ez
+
+from .clocksync import ClockSyncMessage
+from .messages import StimMessage, seq_gap
+from .stim_server import StimServer, StimServerSettings
+from .stim_client import StimClient, StimClientSettings
+from .stim_transport import TRANSPORT_LOOPBACK, LoopbackLink
+
+BENCH_MTU = 185 # simulated ATT MTU; commonly negotiated by current centrals
+
+
+class StimSourceSettings(ez.Settings):
+    n_events: int = 10000
+    rate: float = 0.0 # events/sec; 0 sends as fast as the server accepts them
+
+
+class StimSourceState(ez.State):
+    synced: asyncio.Event
+
+
+class StimSource(ez.Unit):
+    """
+    Sends stim events once the client's clock is synchronized; until then the client
+    stamps events with their arrival time, which would hide the link latency.
+    """
+
+    SETTINGS: StimSourceSettings
+    STATE: StimSourceState
+
+    INPUT_SYNC = ez.InputStream(ClockSyncMessage)
+    OUTPUT_STIM = ez.OutputStream(StimMessage)
+
+    async def initialize(self) -> None:
+        self.STATE.synced = asyncio.Event()
+
+    @ez.subscriber(INPUT_SYNC)
+    async def on_sync(self, msg: ClockSyncMessage) -> None:
+        if msg.ready:
+            self.STATE.synced.set()
+
+    @ez.publisher(OUTPUT_STIM)
+    async def send(self) -> typing.AsyncGenerator:
+        await self.STATE.synced.wait()
+        interval = 1.0 / self.SETTINGS.rate if self.SETTINGS.rate > 0 else 0.0
+        for idx in range(self.SETTINGS.n_events):
+            yield self.OUTPUT_STIM, StimMessage(value = idx % 0xFFFF)
+            await asyncio.sleep(interval)
+
+
+class StimBenchSinkSettings(ez.Settings):
+    n_events: int = 10000
+    timeout: float = 30.0 # sec without a new event before giving up
+
+
+class StimBenchSinkState(ez.State):
+    latency: typing.List[float]
+    rtt: typing.List[float]
+    last_seq: typing.Optional[int] = None
+    lost: int = 0
+    first: typing.Optional[float] = None
+    last: float = 0.0
+
+
+class StimBenchSink(ez.Unit):
+    SETTINGS: StimBenchSinkSettings
+    STATE: StimBenchSinkState
+
+    INPUT_STIM = ez.InputStream(StimMessage)
+    INPUT_SYNC = ez.InputStream(ClockSyncMessage)
+
+    async def initialize(self) -> None:
+        self.STATE.latency = []
+        self.STATE.rtt = []
+        self.STATE.last = time.time()
+
+    @ez.subscriber(INPUT_SYNC)
+    async def on_sync(self, msg: ClockSyncMessage) -> None:
+        self.STATE.rtt.append(msg.delay)
+
+    @ez.subscriber(INPUT_STIM)
+    async def on_stim(self, msg: StimMessage) -> None:
+        now = time.time()
+        if self.STATE.first is None:
+            self.STATE.first = now
+        self.STATE.last = now
+
+        # Source and sink share a clock, so this is the end-to-end stim latency
+        self.STATE.latency.append(now - msg.timestamp)
+        self.STATE.lost += seq_gap(self.STATE.last_seq, msg.seq)
+        self.STATE.last_seq = msg.seq
+
+        if len(self.STATE.latency) + self.STATE.lost >= self.SETTINGS.n_events:
+            self.report()
+            raise ez.NormalTermination
+
+    @ez.task
+    async def watchdog(self) -> None:
+        while True:
+            await asyncio.sleep(1.0)
+            if time.time() - self.STATE.last > self.SETTINGS.timeout:
+                ez.logger.warning('Timed out waiting for stim events')
+                self.report()
+                raise ez.NormalTermination
+
+    def report(self) -> None:
+        received = len(self.STATE.latency)
+        elapsed = self.STATE.last - self.STATE.first if self.STATE.first is not None else 0.0
+        rate = received / elapsed if elapsed > 0 else float('nan')
+        latency = np.array(self.STATE.latency) * 1e3 if received else np.array([np.nan])
+        rtt = np.array(self.STATE.rtt) * 1e3 if self.STATE.rtt else np.array([np.nan])
+        print(
+            f'Received {received} stim events ({self.STATE.lost} lost) in {elapsed:.3f} sec: {rate:.1f} events/sec\n'
+            f'Latency (ms): median {np.median(latency):.3f}, p99 {np.percentile(latency, 99):.3f}, max {latency.max():.3f}\n'
+            f'Clock sync round trip (ms): best {rtt.min():.3f}, median {np.median(rtt):.3f}'
+        )
+
+
+def bench(
+    n_events: int = 10000,
+    rate: float = 0.0,
+    latency: float = 0.0,
+    mtu: int = BENCH_MTU,
+    sync_interval: float = 0.1
+) -> None:
+    """ Drive the full stim path (server -> loopback link -> client) in one process """
+
+    link_name = 'StimBench'
+    LoopbackLink.remove(link_name)
+
+    source = StimSource(
+        StimSourceSettings(
+            n_events = n_events,
+            rate = rate
+        )
+    )
+
+    server = StimServer(
+        StimServerSettings(
+            name = link_name,
+            mtu = mtu,
+            transport = TRANSPORT_LOOPBACK,
+            latency = latency
+        )
+    )
+
+    client = StimClient(
+        StimClientSettings(
+            name = link_name,
+            transport = TRANSPORT_LOOPBACK,
+            sync_interval = sync_interval
+        )
+    )
+
+    sink = StimBenchSink(
+        StimBenchSinkSettings(
+            n_events = n_events
+        )
+    )
+
+    ez.run(
+        SOURCE = source,
+        SERVER = server,
+        CLIENT = client,
+        SINK = sink,
+
+        connections = (
+            (source.OUTPUT_STIM, server.INPUT_STIM),
+            (client.OUTPUT_STIM, sink.INPUT_STIM),
+            (client.OUTPUT_SYNC, sink.INPUT_SYNC),
+            (client.OUTPUT_SYNC, source.INPUT_SYNC),
+        ),
+
+        # The loopback link only spans a single event loop
+        force_single_process = True
+    )
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description = 'Benchmark the stim path over an in-process loopback link'
+    )
+
+    parser.add_argument('--events', type = int, default = 10000, help = 'number of stim events to send')
+    parser.add_argument('--rate', type = float, default = 0.0, help = 'events/sec (default = 0; as fast as possible)')
+    parser.add_argument('--latency', type = float, default = 0.0, help = 'simulated one-way link latency (sec)')
+    parser.add_argument('--mtu', type = int, default = BENCH_MTU, help = f'simulated ATT MTU (default = {BENCH_MTU})')
+    parser.add_argument('--sync-interval', type = float, default = 0.1, help = 'sec between clock sync requests')
+
+    args = parser.parse_args()
+
+    bench(
+        n_events = args.events,
+        rate = args.rate,
+        latency = args.latency,
+        mtu = args.mtu,
+        sync_interval = args.sync_interval
+    )
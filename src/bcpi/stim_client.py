@@ -1,74 +1,145 @@
+import time
 import asyncio
 import typing
 
-from bleak import (
-    BleakClient,
-    BleakScanner,
-)
+from dataclasses import replace
 
 import ezmsg.core as ez
 
 from ezmsg.sigproc.sampler import SampleTriggerMessage
 
-from .messages import StimMessage
+from .clocksync import ClockSync, ClockSyncMessage
+from .messages import (
+    StimMessage, 
+    FRAME_SYNC_RESPONSE,
+    frame_kind,
+    pack_sync_request,
+    unpack_frame, 
+    unpack_sync_response,
+    seq_gap
+)
 from .stim_server import (
     DEFAULT_TRIG_CHAR_UUID, 
     DEFAULT_STIM_CHAR_UUID,
     STIM_SERVICE_NAME
 )
+from .stim_transport import (
+    StimClientTransport,
+    BleakClientTransport,
+    LoopbackLink,
+    LoopbackClientTransport,
+    TRANSPORT_BLE,
+    TRANSPORT_LOOPBACK,
+)
 
 class StimClientSettings(ez.Settings):
     name: str = STIM_SERVICE_NAME
     stim_char_uuid: str = DEFAULT_STIM_CHAR_UUID
     trig_char_uuid: str = DEFAULT_TRIG_CHAR_UUID
+    sync_interval: float = 1.0 # sec between clock sync requests
+    sync_history: int = 64 # clock sync exchanges used for offset/drift fit
+    transport: str = TRANSPORT_BLE # or TRANSPORT_LOOPBACK
 
 class StimClientState(ez.State):
-    conn: typing.Optional[BleakClient] = None
-    queue: asyncio.Queue
+    transport: StimClientTransport
+    queue: "asyncio.Queue[typing.Tuple[float, bytes]]"
+    clock: ClockSync
+    sync_t1: typing.Dict[int, float] # request send time by exchange id
+    exchange: int = 0
+    last_seq: typing.Optional[int] = None
+    received: int = 0
+    dropped: int = 0
 
 class StimClient(ez.Unit):
     SETTINGS: StimClientSettings
     STATE: StimClientState
 
     OUTPUT_STIM = ez.OutputStream(StimMessage)
+    OUTPUT_SYNC = ez.OutputStream(ClockSyncMessage)
     INPUT_TRIGGER = ez.InputStream(SampleTriggerMessage)
 
     async def initialize(self) -> None:
         self.STATE.queue = asyncio.Queue()
-        device = await BleakScanner.find_device_by_name(self.SETTINGS.name, **{})
-        if device is None:
-            raise Exception("Device not found!")
-        self.STATE.conn = BleakClient(device)
-        await self.STATE.conn.connect()
-        ez.logger.info("Connected to Stim Server")
-        
+        self.STATE.clock = ClockSync(history = self.SETTINGS.sync_history)
+        self.STATE.sync_t1 = {}
+
+        if self.SETTINGS.transport == TRANSPORT_LOOPBACK:
+            self.STATE.transport = LoopbackClientTransport(LoopbackLink.get(self.SETTINGS.name))
+        elif self.SETTINGS.transport == TRANSPORT_BLE:
+            self.STATE.transport = BleakClientTransport(self.SETTINGS.name)
+        else:
+            raise ValueError(f'Unknown stim transport: {self.SETTINGS.transport}')
 
-        async def callback_handler(_, data):
-            await self.STATE.queue.put(data)
+        async def callback_handler(data: bytes) -> None:
+            # Stamp arrival immediately; this is t4 for clock sync responses
+            await self.STATE.queue.put((time.time(), data))
 
-        await self.STATE.conn.start_notify(self.SETTINGS.stim_char_uuid, callback_handler)
+        await self.STATE.transport.connect(self.SETTINGS.stim_char_uuid, callback_handler)
 
     async def shutdown(self) -> None:
-        if self.STATE.conn:
-            await self.STATE.conn.stop_notify(self.SETTINGS.stim_char_uuid)
-            await self.STATE.conn.disconnect()
+        await self.STATE.transport.disconnect()
 
 
+    @ez.task
+    async def request_sync(self) -> None:
+        while True:
+            exchange = self.STATE.exchange % 0x100
+            self.STATE.exchange += 1
+            self.STATE.sync_t1[exchange] = time.time()
+            await self.STATE.transport.write(
+                self.SETTINGS.trig_char_uuid,
+                pack_sync_request(exchange)
+            )
+            await asyncio.sleep(self.SETTINGS.sync_interval)
+
     @ez.publisher(OUTPUT_STIM)
+    @ez.publisher(OUTPUT_SYNC)
     async def pub_stims(self) -> typing.AsyncGenerator:
         while True:
             # Await stim notification from stim characteristic
-            data = await self.STATE.queue.get()
-            ez.logger.info(f'Notified! {data=}')
-
-            msg = StimMessage(3)
-            yield self.OUTPUT_STIM, msg
+            t4, data = await self.STATE.queue.get()
+            ez.logger.debug('Notified! data=%r', data)
+
+            try:
+                if frame_kind(data) == FRAME_SYNC_RESPONSE:
+                    exchange, t2, t3 = unpack_sync_response(data)
+                    t1 = self.STATE.sync_t1.pop(exchange, None)
+                    if t1 is None:
+                        ez.logger.debug('Unmatched clock sync response exchange=%r', exchange)
+                        continue
+                    self.STATE.clock.add(t1, t2 * 1e-9, t3 * 1e-9, t4)
+                    sync = self.STATE.clock.message()
+                    ez.logger.debug('sync=%r', sync)
+                    yield self.OUTPUT_SYNC, sync
+                    continue
+
+                msgs = unpack_frame(data)
+            except ValueError as e:
+                ez.logger.warning(f'Discarding stim frame: {e}')
+                continue
+
+            for msg in msgs:
+                # Map server event times onto our (EEG) clock; until the clock
+                # is synchronized, arrival time is the best estimate we have
+                local_ts = self.STATE.clock.to_local(msg.timestamp) if self.STATE.clock.ready else t4
+                msg = replace(msg, timestamp = local_ts)
+
+                gap = seq_gap(self.STATE.last_seq, msg.seq)
+                if gap:
+                    self.STATE.dropped += gap
+                    ez.logger.warning(
+                        f'Lost {gap} stim events ({self.STATE.dropped} of '
+                        f'{self.STATE.received + self.STATE.dropped} total)'
+                    )
+                self.STATE.last_seq = msg.seq
+                self.STATE.received += 1
+                yield self.OUTPUT_STIM, msg
 
 
     @ez.subscriber(INPUT_TRIGGER)
     async def on_trig(self, msg: SampleTriggerMessage) -> None:
         # Send trigger to trigger characteristic
-        ez.logger.info(f'{msg=}')
+        ez.logger.debug('msg=%r', msg)
 
 if __name__ == '__main__':
 
@@ -80,8 +151,12 @@ if __name__ == '__main__':
         @ez.subscriber(INPUT_STIM)
         @ez.publisher(OUTPUT_TRIGGER)
         async def on_stim(self, msg: StimMessage) -> typing.AsyncGenerator:
-            await asyncio.sleep(msg.value)
-            yield self.OUTPUT_TRIGGER, SampleTriggerMessage(period = (msg.value * -1.0, 0.0))
+            # Stim timestamps are already on the local clock; 
+            # samplers hold the trigger until its period has been acquired
+            yield self.OUTPUT_TRIGGER, SampleTriggerMessage(
+                timestamp = msg.timestamp,
+                period = (0.0, float(msg.value))
+            )
 
     stim_client = StimClient(
         StimClientSettings(
@@ -1,18 +1,30 @@
+import time
 import asyncio
 import typing
 
-from bless import ( 
-    BlessServer, # type: ignore
-    BlessGATTCharacteristic,# type: ignore
-    GATTCharacteristicProperties, # type: ignore
-    GATTAttributePermissions # type: ignore
-)
+from dataclasses import replace
 
 import ezmsg.core as ez
 
 from ezmsg.sigproc.sampler import SampleTriggerMessage
 
-from .messages import StimMessage
+from .messages import (
+    StimMessage, 
+    FRAME_EVENTS, 
+    FRAME_HEADER, 
+    pack_frames,
+    BLE_MIN_MTU,
+    pack_sync_response,
+    unpack_sync_request,
+)
+from .stim_transport import (
+    StimServerTransport,
+    BlessServerTransport,
+    LoopbackLink,
+    LoopbackServerTransport,
+    TRANSPORT_BLE,
+    TRANSPORT_LOOPBACK,
+)
 
 STIM_SERVICE_NAME = 'BCPIStim'
 DEFAULT_SERVICE_UUID = "A07498CA-AD5B-474E-940D-16F1FBE7E8CD"
@@ -21,12 +33,18 @@ DEFAULT_TRIG_CHAR_UUID = "51FF12BB-3ED8-46E5-B4F9-D64E2FEC021C"
 
 
 class StimServerSettings(ez.Settings):
+    name: str = STIM_SERVICE_NAME
     service_uuid: str = DEFAULT_SERVICE_UUID
     stim_char_uuid: str = DEFAULT_STIM_CHAR_UUID
     trig_char_uuid: str = DEFAULT_TRIG_CHAR_UUID
+    mtu: int = BLE_MIN_MTU # ATT MTU frames are packed for when the transport can't report the negotiated one
+    transport: str = TRANSPORT_BLE # or TRANSPORT_LOOPBACK
+    latency: float = 0.0 # sec; one-way delay simulated by the loopback transport
 
 class StimServerState(ez.State):
-    server: BlessServer
+    transport: StimServerTransport
+    queue: "asyncio.Queue[StimMessage]"
+    seq: int = 0
 
 class StimServer(ez.Unit):
     SETTINGS: StimServerSettings
@@ -36,53 +54,65 @@ class StimServer(ez.Unit):
     OUTPUT_TRIGGER = ez.OutputStream(SampleTriggerMessage)
 
     async def initialize(self) -> None:
+        self.STATE.queue = asyncio.Queue()
 
-        # Instantiate the server
-        self.STATE.server = BlessServer(
-            name = STIM_SERVICE_NAME,
-            loop = asyncio.get_running_loop()
-        )
-
-        self.STATE.server.read_request_func = self.read_request
-        self.STATE.server.write_request_func = self.write_request
-
-        # Add Service
-        await self.STATE.server.add_new_service(self.SETTINGS.service_uuid)
-
-        # Add the stim characteristic to the service
-        await self.STATE.server.add_new_characteristic(
-            service_uuid = self.SETTINGS.service_uuid, 
-            char_uuid = self.SETTINGS.stim_char_uuid, 
-            properties = (
-                GATTCharacteristicProperties.read
-                | GATTCharacteristicProperties.write
-                | GATTCharacteristicProperties.indicate
-            ), 
-            value = bytearray(int.to_bytes(0xface, 2, 'big')), 
-            permissions = (
-                GATTAttributePermissions.readable 
-                | GATTAttributePermissions.writeable
+        if self.SETTINGS.transport == TRANSPORT_LOOPBACK:
+            self.STATE.transport = LoopbackServerTransport(
+                LoopbackLink.get(self.SETTINGS.name),
+                latency = self.SETTINGS.latency,
+                mtu = self.SETTINGS.mtu
             )
+        elif self.SETTINGS.transport == TRANSPORT_BLE:
+            self.STATE.transport = BlessServerTransport(
+                name = self.SETTINGS.name,
+                service_uuid = self.SETTINGS.service_uuid,
+                stim_char_uuid = self.SETTINGS.stim_char_uuid,
+                trig_char_uuid = self.SETTINGS.trig_char_uuid,
+                stim_value = FRAME_HEADER.pack(FRAME_EVENTS, 0)
+            )
+        else:
+            raise ValueError(f'Unknown stim transport: {self.SETTINGS.transport}')
+
+        await self.STATE.transport.start(self.on_write)
+
+    def on_write(self, char_uuid: str, data: bytes) -> None:
+        t2 = time.time_ns()
+        if char_uuid.upper() != self.SETTINGS.trig_char_uuid.upper():
+            return
+
+        try:
+            exchange = unpack_sync_request(data)
+        except ValueError as e:
+            ez.logger.warning(f"Ignoring trig write: {e}")
+            return
+
+        # Answer on the stim characteristic; nothing else can run on
+        # the event loop between stamping t3 and queuing the notification
+        self.STATE.transport.notify(
+            self.SETTINGS.stim_char_uuid,
+            pack_sync_response(exchange, t2, time.time_ns())
         )
 
-        await self.STATE.server.start()
-        ez.logger.info("Advertising")
-
-    def read_request(self, characteristic: BlessGATTCharacteristic, **kwargs) -> bytearray:
-        ez.logger.info(f"Reading {characteristic.value}")
-        return characteristic.value
-
-    def write_request(self, characteristic: BlessGATTCharacteristic, value: typing.Any, **kwargs):
-        characteristic.value = value
-        ez.logger.info(f"Char value set to {characteristic.value}")
-
     async def shutdown(self) -> None:
-        await self.STATE.server.stop()
+        await self.STATE.transport.stop()
 
     @ez.subscriber(INPUT_STIM)
     async def on_stim(self, msg: StimMessage) -> None:
-        self.STATE.server.get_characteristic(self.SETTINGS.stim_char_uuid)
-        self.STATE.server.update_value(self.SETTINGS.service_uuid, self.SETTINGS.stim_char_uuid)
+        self.STATE.queue.put_nowait(replace(msg, seq = self.STATE.seq))
+        self.STATE.seq += 1
+
+    @ez.task
+    async def notify(self) -> None:
+        while True:
+            # Coalesce everything that queued up during the last notification
+            msgs = [await self.STATE.queue.get()]
+            while not self.STATE.queue.empty():
+                msgs.append(self.STATE.queue.get_nowait())
+
+            mtu = self.STATE.transport.mtu or self.SETTINGS.mtu
+            for frame in pack_frames(msgs, mtu):
+                self.STATE.transport.notify(self.SETTINGS.stim_char_uuid, frame)
+                await asyncio.sleep(0) # Let the radio stack drain between frames
 
 
 if __name__ == '__main__':
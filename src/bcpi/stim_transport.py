@@ -0,0 +1,298 @@
+import asyncio
+import typing
+
+from abc import ABC, abstractmethod
+
+import ezmsg.core as ez
+
+from .messages import ATT_HEADER_SIZE, BLE_MIN_MTU
+
+# Callback signatures; the server is told which characteristic was written
+WriteCallback = typing.Callable[[str, bytes], None]
+NotifyCallback = typing.Callable[[bytes], typing.Awaitable[None]]
+
+TRANSPORT_BLE = 'ble'
+TRANSPORT_LOOPBACK = 'loopback'
+
+
+class StimServerTransport(ABC):
+    """ Peripheral (GATT server) side of the stim link """
+
+    @property
+    def mtu(self) -> typing.Optional[int]:
+        """ ATT MTU negotiated with the central; None if the transport can't tell """
+        return None
+
+    @abstractmethod
+    async def start(self, on_write: WriteCallback) -> None:
+        ...
+
+    @abstractmethod
+    def notify(self, char_uuid: str, data: bytes) -> None:
+        ...
+
+    @abstractmethod
+    async def stop(self) -> None:
+        ...
+
+
+class StimClientTransport(ABC):
+    """ Central (GATT client) side of the stim link """
+
+    @property
+    @abstractmethod
+    def mtu(self) -> int:
+        ...
+
+    @abstractmethod
+    async def connect(self, notify_char_uuid: str, on_notify: NotifyCallback) -> None:
+        ...
+
+    @abstractmethod
+    async def write(self, char_uuid: str, data: bytes) -> None:
+        ...
+
+    @abstractmethod
+    async def disconnect(self) -> None:
+        ...
+
+
+class BlessServerTransport(StimServerTransport):
+    """
+    BLE peripheral using bless; exposes a notifying stim and a writable trig characteristic.
+    bless doesn't pass on the negotiated MTU (BlueZ's request options), so `mtu` is unknown.
+    """
+
+    def __init__(
+        self, 
+        name: str, 
+        service_uuid: str, 
+        stim_char_uuid: str, 
+        trig_char_uuid: str, 
+        stim_value: bytes = b''
+    ):
+        self.name = name
+        self.service_uuid = service_uuid
+        self.stim_char_uuid = stim_char_uuid
+        self.trig_char_uuid = trig_char_uuid
+        self.stim_value = stim_value
+        self.server = None
+
+    async def start(self, on_write: WriteCallback) -> None:
+        from bless import (
+            BlessServer, # type: ignore
+            BlessGATTCharacteristic,# type: ignore
+            GATTCharacteristicProperties, # type: ignore
+            GATTAttributePermissions # type: ignore
+        )
+
+        self.server = BlessServer(
+            name = self.name,
+            loop = asyncio.get_running_loop()
+        )
+
+        def read_request(characteristic: BlessGATTCharacteristic, **kwargs) -> bytearray:
+            ez.logger.debug(f"Reading {characteristic.value}")
+            return characteristic.value
+
+        def write_request(characteristic: BlessGATTCharacteristic, value: typing.Any, **kwargs):
+            characteristic.value = value
+            ez.logger.debug(f"Char value set to {characteristic.value}")
+            on_write(characteristic.uuid.upper(), bytes(value))
+
+        self.server.read_request_func = read_request
+        self.server.write_request_func = write_request
+
+        await self.server.add_new_service(self.service_uuid)
+
+        await self.server.add_new_characteristic(
+            service_uuid = self.service_uuid,
+            char_uuid = self.stim_char_uuid,
+            properties = (
+                GATTCharacteristicProperties.read
+                | GATTCharacteristicProperties.write
+                | GATTCharacteristicProperties.indicate
+            ),
+            value = bytearray(self.stim_value),
+            permissions = (
+                GATTAttributePermissions.readable
+                | GATTAttributePermissions.writeable
+            )
+        )
+
+        await self.server.add_new_characteristic(
+            service_uuid = self.service_uuid,
+            char_uuid = self.trig_char_uuid,
+            properties = (
+                GATTCharacteristicProperties.write
+                | GATTCharacteristicProperties.write_without_response
+            ),
+            value = None,
+            permissions = GATTAttributePermissions.writeable
+        )
+
+        await self.server.start()
+        ez.logger.info("Advertising")
+
+    def notify(self, char_uuid: str, data: bytes) -> None:
+        assert self.server is not None
+        self.server.get_characteristic(char_uuid).value = bytearray(data)
+        self.server.update_value(self.service_uuid, char_uuid)
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            await self.server.stop()
+
+
+class BleakClientTransport(StimClientTransport):
+    """ BLE central using bleak; connects to the first peripheral advertising `name` """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.conn = None
+        self.notify_char_uuid: typing.Optional[str] = None
+
+    @property
+    def mtu(self) -> int:
+        return BLE_MIN_MTU if self.conn is None else self.conn.mtu_size
+
+    async def connect(self, notify_char_uuid: str, on_notify: NotifyCallback) -> None:
+        from bleak import BleakClient, BleakScanner
+
+        device = await BleakScanner.find_device_by_name(self.name, **{})
+        if device is None:
+            raise Exception("Device not found!")
+        self.conn = BleakClient(device)
+        await self.conn.connect()
+        ez.logger.info(f"Connected to Stim Server ({self.mtu=})")
+
+        async def callback_handler(_, data):
+            await on_notify(bytes(data))
+
+        self.notify_char_uuid = notify_char_uuid
+        await self.conn.start_notify(notify_char_uuid, callback_handler)
+
+    async def write(self, char_uuid: str, data: bytes) -> None:
+        assert self.conn is not None
+        await self.conn.write_gatt_char(char_uuid, data, response = False)
+
+    async def disconnect(self) -> None:
+        if self.conn is not None:
+            if self.notify_char_uuid is not None:
+                await self.conn.stop_notify(self.notify_char_uuid)
+            await self.conn.disconnect()
+
+
+class LoopbackLink:
+    """
+    In-process stand-in for a BLE connection.
+
+    Mimics GATT semantics closely enough to exercise the stim path: writes and
+    notifications are delivered in order after a fixed `latency`, and payloads
+    larger than the ATT payload for `mtu` are rejected.  Server and client must
+    run on the same event loop (i.e. in the same ezmsg process).
+    """
+
+    _links: typing.ClassVar[typing.Dict[str, "LoopbackLink"]] = {}
+
+    name: str
+    latency: float
+    mtu: int
+    on_write: typing.Optional[WriteCallback]
+    on_notify: typing.Optional[typing.Tuple[str, NotifyCallback]]
+    notified: int
+    written: int
+
+    def __init__(self, name: str, latency: float = 0.0, mtu: int = BLE_MIN_MTU):
+        self.name = name
+        self.latency = latency
+        self.mtu = mtu
+        self.on_write = None
+        self.on_notify = None
+        self.notified = 0
+        self.written = 0
+
+    @classmethod
+    def get(cls, name: str) -> "LoopbackLink":
+        """ Both sides of a link look it up by name """
+        link = cls._links.get(name)
+        if link is None:
+            link = cls(name)
+            cls._links[name] = link
+        return link
+
+    @classmethod
+    def remove(cls, name: str) -> None:
+        cls._links.pop(name, None)
+
+    def _check_size(self, data: bytes) -> None:
+        if len(data) > self.mtu - ATT_HEADER_SIZE:
+            raise ValueError(f'{len(data)} byte payload exceeds {self.mtu=}')
+
+    def _deliver(self, fn: typing.Callable[[], typing.Any]) -> None:
+        loop = asyncio.get_running_loop()
+        if self.latency > 0.0:
+            loop.call_later(self.latency, fn)
+        else:
+            loop.call_soon(fn)
+
+    def server_write(self, char_uuid: str, data: bytes) -> None:
+        """ Client -> server (write without response); dropped if no server is running """
+        self._check_size(data)
+        self.written += 1
+        if self.on_write is not None:
+            on_write = self.on_write
+            self._deliver(lambda: on_write(char_uuid.upper(), data))
+
+    def client_notify(self, char_uuid: str, data: bytes) -> None:
+        """ Server -> client (notification); dropped if the client isn't subscribed """
+        self._check_size(data)
+        self.notified += 1
+        if self.on_notify is not None and self.on_notify[0].upper() == char_uuid.upper():
+            on_notify = self.on_notify[1]
+            self._deliver(lambda: asyncio.ensure_future(on_notify(data)))
+
+
+class LoopbackServerTransport(StimServerTransport):
+    """ The server side owns the link; it sets the simulated `latency` and `mtu` """
+
+    def __init__(self, link: LoopbackLink, latency: float = 0.0, mtu: int = BLE_MIN_MTU):
+        self.link = link
+        self.latency = latency
+        self.link.mtu = mtu
+
+    @property
+    def mtu(self) -> typing.Optional[int]:
+        return self.link.mtu
+
+    async def start(self, on_write: WriteCallback) -> None:
+        self.link.latency = self.latency
+        self.link.on_write = on_write
+
+    def notify(self, char_uuid: str, data: bytes) -> None:
+        self.link.client_notify(char_uuid, data)
+
+    async def stop(self) -> None:
+        self.link.on_write = None
+
+
+class LoopbackClientTransport(StimClientTransport):
+
+    def __init__(self, link: LoopbackLink):
+        self.link = link
+
+    @property
+    def mtu(self) -> int:
+        return self.link.mtu
+
+    async def connect(self, notify_char_uuid: str, on_notify: NotifyCallback) -> None:
+        # ezmsg initializes units one at a time, so don't wait on the server here;
+        # writes made before it starts are dropped, just as they would be over the air
+        self.link.on_notify = (notify_char_uuid, on_notify)
+        ez.logger.info(f"Connected to loopback Stim Server ({self.mtu=}, {self.link.latency=})")
+
+    async def write(self, char_uuid: str, data: bytes) -> None:
+        self.link.server_write(char_uuid, data)
+
+    async def disconnect(self) -> None:
+        self.link.on_notify = None
@@ -0,0 +1,282 @@
+import sys
+import time
+import asyncio
+import inspect
+import typing
+import importlib.util
+
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+import ezmsg.core as ez
+from ezmsg.util.messages.axisarray import AxisArray
+
+# How main.py is run ([strategy] isolation)
+ISOLATION_INPROCESS = 'inprocess' # loaded into the core process by StrategyHost
+ISOLATION_SUBPROCESS = 'subprocess' # StrategyHost in its own process (python -m bcpi.strategy)
+ISOLATION_SCRIPT = 'script' # main.py is a standalone ezmsg script (python main.py)
+ISOLATIONS = (ISOLATION_INPROCESS, ISOLATION_SUBPROCESS, ISOLATION_SCRIPT)
+
+EVENT_START = 'start'
+EVENT_STOP = 'stop'
+EVENT_CLASS = 'class'
+EVENT_DECODE = 'decode'
+EVENT_COMMAND = 'command'
+EVENTS = (EVENT_START, EVENT_STOP, EVENT_CLASS, EVENT_DECODE, EVENT_COMMAND)
+
+# Callbacks may be plain functions or coroutines; plain functions are cheaper
+StrategyCallback = typing.Callable[..., typing.Optional[typing.Awaitable[None]]]
+
+
+def entrypoint(data_dir: Path) -> Path:
+    return data_dir / 'strategy' / 'main.py'
+
+
+class LatencyStats:
+    """ Recent callback latencies (receipt of a message to its callbacks returning) """
+
+    def __init__(self, history: int = 1000):
+        self.latencies: typing.Deque[float] = deque(maxlen = history)
+        self.count = 0
+
+    def add(self, latency: float) -> None:
+        self.latencies.append(latency)
+        self.count += 1
+
+    def summary(self) -> typing.Dict[str, float]:
+        """ Latency percentiles over the recent history, in ms """
+        if not self.latencies:
+            return {}
+        ms = np.array(self.latencies) * 1e3
+        return {
+            'p50': float(np.percentile(ms, 50)),
+            'p99': float(np.percentile(ms, 99)),
+            'max': float(ms.max()),
+        }
+
+
+@dataclass
+class Strategy:
+    """ Callbacks registered by a strategy module, by event """
+    path: typing.Optional[Path] = None
+    callbacks: typing.Dict[str, typing.List[StrategyCallback]] = field(
+        default_factory = lambda: {event: [] for event in EVENTS}
+    )
+
+    def register(self, event: str, callback: StrategyCallback) -> StrategyCallback:
+        self.callbacks[event].append(callback)
+        return callback
+
+    @property
+    def empty(self) -> bool:
+        return not any(self.callbacks.values())
+
+    async def dispatch(self, event: str, *args: typing.Any) -> float:
+        """
+        Call every callback for `event` in registration order; returns the elapsed time (sec).
+        Exceptions are logged rather than raised so one bad callback doesn't stop the others.
+        """
+        start = time.perf_counter()
+        for callback in self.callbacks[event]:
+            try:
+                result = callback(*args)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                ez.logger.warning(f'Strategy {event} callback {callback.__name__} failed: {e!r}')
+        return time.perf_counter() - start
+
+
+# Registrations made while a strategy module is being loaded land here
+_loading = Strategy()
+
+def on_start(callback: StrategyCallback) -> StrategyCallback:
+    """ `callback()` once the strategy is loaded """
+    return _loading.register(EVENT_START, callback)
+
+def on_stop(callback: StrategyCallback) -> StrategyCallback:
+    """ `callback()` before the strategy is stopped or reloaded """
+    return _loading.register(EVENT_STOP, callback)
+
+def on_class(callback: StrategyCallback) -> StrategyCallback:
+    """ `callback(cls: Optional[str])` for every decoded class (BCPITopics.CLASS) """
+    return _loading.register(EVENT_CLASS, callback)
+
+def on_decode(callback: StrategyCallback) -> StrategyCallback:
+    """ `callback(msg: AxisArray)` for every set of decoder posteriors (BCPITopics.DECODE) """
+    return _loading.register(EVENT_DECODE, callback)
+
+def on_command(callback: StrategyCallback) -> StrategyCallback:
+    """ `callback(cls: str)` for every debounced command (BCPITopics.COMMAND) """
+    return _loading.register(EVENT_COMMAND, callback)
+
+
+def load_strategy(path: Path) -> Strategy:
+    """ Import the strategy module at `path` and collect the callbacks it registers """
+    global _loading
+
+    strategy = Strategy(path = path)
+    spec = importlib.util.spec_from_file_location(f'bcpi_strategy_{path.stem}', path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f'Cannot load strategy from {path}')
+    module = importlib.util.module_from_spec(spec)
+
+    # Helper modules next to main.py are importable, as when run as a script
+    sys.path.insert(0, str(path.parent))
+    prev, _loading = _loading, strategy
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        _loading = prev
+        sys.path.remove(str(path.parent))
+
+    return strategy
+
+
+class StrategyHostSettings(ez.Settings):
+    entrypoint: typing.Optional[Path] = None
+    autostart: bool = True
+    report_interval: float = 30.0 # sec between latency reports in the log
+
+
+class StrategyHostState(ez.State):
+    strategy: typing.Optional[Strategy] = None
+    stats: typing.Dict[str, LatencyStats]
+
+
+class StrategyHost(ez.Unit):
+    """
+    Runs the callbacks of a strategy module (see `on_class` etc.) directly in the
+    subscribers for CLASS/DECODE, without a separate graph connection or process hop.
+
+    A strategy main.py looks like:
+
+        from bcpi.strategy import on_class
+
+        @on_class
+        def react(cls):
+            ...
+    """
+
+    SETTINGS: StrategyHostSettings
+    STATE: StrategyHostState
+
+    INPUT_CONTROL = ez.InputStream(bool) # True: (re)load entrypoint; False: stop
+    INPUT_CLASS = ez.InputStream(typing.Optional[str])
+    INPUT_DECODE = ez.InputStream(AxisArray)
+    INPUT_COMMAND = ez.InputStream(str)
+
+    async def initialize(self) -> None:
+        self.STATE.stats = {event: LatencyStats() for event in (EVENT_CLASS, EVENT_DECODE, EVENT_COMMAND)}
+        if self.SETTINGS.autostart:
+            await self.start()
+
+    async def shutdown(self) -> None:
+        await self.stop()
+
+    async def start(self) -> None:
+        await self.stop()
+
+        path = self.SETTINGS.entrypoint
+        if path is None or not path.exists():
+            ez.logger.warning(f'Strategy entrypoint does not exist: {path}')
+            return
+
+        try:
+            strategy = load_strategy(path)
+        except Exception as e:
+            ez.logger.warning(f'Could not load strategy {path}: {e!r}')
+            return
+
+        if strategy.empty:
+            ez.logger.warning(
+                f'Strategy {path} registered no callbacks; '
+                f'standalone scripts need [strategy] isolation = {ISOLATION_SCRIPT}'
+            )
+
+        self.STATE.strategy = strategy
+        ez.logger.info(f'Loaded strategy {path}')
+        await strategy.dispatch(EVENT_START)
+
+    async def stop(self) -> None:
+        strategy = self.STATE.strategy
+        if strategy is not None:
+            self.STATE.strategy = None
+            await strategy.dispatch(EVENT_STOP)
+            ez.logger.info(f'Stopped strategy {strategy.path}')
+
+    @ez.subscriber(INPUT_CONTROL)
+    async def on_control(self, msg: bool) -> None:
+        if msg:
+            await self.start()
+        else:
+            await self.stop()
+
+    @ez.subscriber(INPUT_CLASS)
+    async def on_class(self, msg: typing.Optional[str]) -> None:
+        if self.STATE.strategy is not None:
+            self.STATE.stats[EVENT_CLASS].add(await self.STATE.strategy.dispatch(EVENT_CLASS, msg))
+
+    @ez.subscriber(INPUT_DECODE, zero_copy = True)
+    async def on_decode(self, msg: AxisArray) -> None:
+        if self.STATE.strategy is not None:
+            self.STATE.stats[EVENT_DECODE].add(await self.STATE.strategy.dispatch(EVENT_DECODE, msg))
+
+    @ez.subscriber(INPUT_COMMAND)
+    async def on_command(self, msg: str) -> None:
+        if self.STATE.strategy is not None:
+            self.STATE.stats[EVENT_COMMAND].add(await self.STATE.strategy.dispatch(EVENT_COMMAND, msg))
+
+    @ez.task
+    async def report(self) -> None:
+        counts = {event: 0 for event in self.STATE.stats}
+        while True:
+            await asyncio.sleep(self.SETTINGS.report_interval)
+            for event, stats in self.STATE.stats.items():
+                if stats.count == counts[event]:
+                    continue
+                counts[event] = stats.count
+                summary = ', '.join(f'{k}={v:.2f}ms' for k, v in stats.summary().items())
+                ez.logger.info(f'Strategy {event} callback latency: {summary} ({stats.count} total)')
+
+
+if __name__ == '__main__':
+
+    ## Strategy in its own process ([strategy] isolation = subprocess)
+
+    import argparse
+
+    from .topics import BCPITopics
+
+    parser = argparse.ArgumentParser(
+        description = 'Run a bcpi strategy in its own process'
+    )
+
+    parser.add_argument('entrypoint', type = lambda x: Path(x).expanduser(), help = 'strategy module (main.py)')
+    parser.add_argument('--graphserver', default = None, help = 'address of the GraphServer (host:port)')
+
+    args = parser.parse_args()
+
+    graph_address = None
+    if args.graphserver is not None:
+        address, port = args.graphserver.split(':')
+        graph_address = (address, int(port))
+
+    host = StrategyHost(
+        StrategyHostSettings(
+            entrypoint = args.entrypoint
+        )
+    )
+
+    ez.run(
+        STRATEGY = host,
+        connections = (
+            (BCPITopics.CLASS, host.INPUT_CLASS),
+            (BCPITopics.DECODE, host.INPUT_DECODE),
+            (BCPITopics.COMMAND, host.INPUT_COMMAND),
+        ),
+        graph_address = graph_address
+    )
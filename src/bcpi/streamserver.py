@@ -0,0 +1,299 @@
+import json
+import struct
+import asyncio
+import typing
+import dataclasses
+
+from dataclasses import dataclass, field
+
+import numpy as np
+import numpy.typing as npt
+import scipy.signal
+
+import ezmsg.core as ez
+from ezmsg.core.graphcontext import GraphContext
+from ezmsg.core.graphserver import GraphService
+from ezmsg.util.messages.axisarray import AxisArray
+
+# Frame formats a client can ask for
+FORMAT_RAW = 'raw' # u32 LE header length, JSON header, raw little-endian C-order array
+FORMAT_MSGPACK = 'msgpack' # optional dependency: msgpack; header fields plus 'data' (bytes)
+FORMATS = (FORMAT_RAW, FORMAT_MSGPACK)
+
+LOOPBACK_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+
+def _jsonable(value: typing.Any) -> typing.Any:
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return {f.name: _jsonable(getattr(value, f.name)) for f in dataclasses.fields(value)}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    return value
+
+
+def frame_parts(topic: str, msg: typing.Any) -> typing.Tuple[typing.Dict[str, typing.Any], bytes]:
+    """
+    Header and payload of a frame for `msg`.  AxisArrays (and subclasses, whose extra
+    fields go in the header) travel as raw little-endian C-order bytes; anything else
+    (e.g. CLASS strings) travels as the header's 'value'.
+    """
+    if not isinstance(msg, AxisArray):
+        return {'topic': topic, 'value': _jsonable(msg)}, b''
+
+    data = np.ascontiguousarray(msg.data)
+    data = data.astype(data.dtype.newbyteorder('<'), copy = False)
+    header = {
+        'topic': topic,
+        'dims': list(msg.dims),
+        'shape': list(data.shape),
+        'dtype': data.dtype.str,
+        'axes': {name: _jsonable(axis) for name, axis in msg.axes.items()},
+    }
+    base = {f.name for f in dataclasses.fields(AxisArray)}
+    for f in dataclasses.fields(msg):
+        if f.name not in base:
+            header[f.name] = _jsonable(getattr(msg, f.name))
+    return header, data.tobytes()
+
+
+def encode_frame(topic: str, msg: typing.Any, fmt: str = FORMAT_RAW) -> bytes:
+    header, payload = frame_parts(topic, msg)
+    if fmt == FORMAT_RAW:
+        header_bytes = json.dumps(header).encode('utf-8')
+        return struct.pack('<I', len(header_bytes)) + header_bytes + payload
+    elif fmt == FORMAT_MSGPACK:
+        import msgpack # type: ignore
+        return msgpack.packb({**header, 'data': payload})
+    raise ValueError(f'Unknown stream format {fmt}; expected one of {FORMATS}')
+
+
+def decode_raw_frame(frame: bytes) -> typing.Tuple[typing.Dict[str, typing.Any], typing.Optional[np.ndarray]]:
+    """ Header and array (None for value frames) of a FORMAT_RAW frame; for clients and tests """
+    (n,) = struct.unpack_from('<I', frame)
+    header = json.loads(frame[4:4 + n].decode('utf-8'))
+    if 'value' in header:
+        return header, None
+    data = np.frombuffer(frame, dtype = header['dtype'], offset = 4 + n)
+    return header, data.reshape(header['shape'])
+
+
+@dataclass(eq = False)
+class StreamClient:
+    """ One WebSocket consumer; frames wait in `queue` until its sender gets to them """
+    queue: 'asyncio.Queue[bytes]'
+    socket: typing.Any = None
+    fmt: str = FORMAT_RAW
+    subscriptions: typing.Dict[str, int] = field(default_factory = dict) # topic: decimation factor
+    dropped: int = 0 # frames dropped over the connection's lifetime
+    behind: int = 0 # consecutive frames dropped
+
+
+class StreamHub:
+    """
+    Fans messages out to `StreamClient`s.  Each message is encoded at most once per
+    (format, decimation) in use, whatever the number of clients sharing it.
+    Decimated streams are low-passed first, with filter state per (topic, factor).  Frames
+    for clients whose queue is full are dropped; after `max_drops` consecutive drops
+    the client is reported as stalled (to be disconnected).
+    """
+
+    def __init__(self, topics: typing.List[str], queue_size: int = 32, max_drops: int = 256):
+        self.topics = topics
+        self.queue_size = queue_size
+        self.max_drops = max_drops
+        self.clients: typing.Set[StreamClient] = set()
+        self._phases: typing.Dict[typing.Tuple[str, int], int] = {} # (topic, factor): next sample
+        self._zi: typing.Dict[typing.Tuple[str, int], npt.NDArray] = {} # (topic, factor): anti-aliasing filter state
+        self._sos: typing.Dict[int, npt.NDArray] = {} # factor: anti-aliasing filter
+
+    def connect(self, socket: typing.Any = None) -> StreamClient:
+        client = StreamClient(queue = asyncio.Queue(maxsize = self.queue_size), socket = socket)
+        self.clients.add(client)
+        return client
+
+    def disconnect(self, client: StreamClient) -> None:
+        self.clients.discard(client)
+
+    def hello(self) -> str:
+        return json.dumps({'topics': self.topics, 'formats': list(FORMATS)})
+
+    def control(self, client: StreamClient, text: str) -> None:
+        """
+        Apply a client's JSON control message, e.g.
+        {"format": "raw", "subscribe": {"EPHYS": {"decimate": 4}, "CLASS": {}}, "unsubscribe": ["DECODE"]}
+        """
+        request = json.loads(text)
+        fmt = request.get('format', client.fmt)
+        if fmt not in FORMATS:
+            raise ValueError(f'Unknown stream format {fmt}')
+        if fmt == FORMAT_MSGPACK:
+            try:
+                import msgpack # type: ignore # noqa: F401
+            except ImportError:
+                raise ValueError('msgpack is not installed on the server')
+        client.fmt = fmt
+
+        subscribe = request.get('subscribe', {})
+        if isinstance(subscribe, list):
+            subscribe = {topic: {} for topic in subscribe}
+        for topic, options in subscribe.items():
+            if topic not in self.topics:
+                raise ValueError(f'Topic {topic} is not served; available: {self.topics}')
+            client.subscriptions[topic] = max(1, int((options or {}).get('decimate', 1)))
+
+        for topic in request.get('unsubscribe', []):
+            client.subscriptions.pop(topic, None)
+
+    def _lowpass(self, topic: str, x: npt.NDArray, factor: int) -> npt.NDArray:
+        """ Anti-alias time-major `x` for decimation by `factor`, continuing across messages """
+        if factor not in self._sos:
+            # Same anti-aliasing filter as ezmsg.sigproc.decimate.Decimate
+            self._sos[factor] = scipy.signal.cheby1(8, 0.05, 0.8 / factor, output = 'sos')
+        sos = self._sos[factor]
+
+        zi = self._zi.get((topic, factor))
+        if zi is None or zi.shape[2:] != x.shape[1:]:
+            # Start in steady state for the first sample rather than from rest
+            zi = scipy.signal.sosfilt_zi(sos)
+            zi = zi.reshape(zi.shape + (1,) * (x.ndim - 1)) * x[0]
+        y, self._zi[(topic, factor)] = scipy.signal.sosfilt(sos, x, axis = 0, zi = zi)
+        return y.astype(x.dtype, copy = False) if np.issubdtype(x.dtype, np.floating) else y
+
+    def _decimate(self, topic: str, msg: typing.Any, factor: int) -> typing.Any:
+        """ Every `factor`-th sample of `msg` along time after low-passing, continuing across messages """
+        if factor == 1 or not isinstance(msg, AxisArray) or 'time' not in msg.dims:
+            return msg
+        time_idx = msg.get_axis_idx('time')
+        n = msg.data.shape[time_idx]
+        if n == 0:
+            return msg
+        phase = self._phases.get((topic, factor), 0)
+        self._phases[(topic, factor)] = (phase - n) % factor
+
+        filtered = self._lowpass(topic, np.moveaxis(msg.data, time_idx, 0), factor)
+        axis = msg.get_axis('time')
+        return dataclasses.replace(
+            msg,
+            data = np.moveaxis(filtered[phase::factor], 0, time_idx),
+            axes = {
+                **msg.axes,
+                'time': dataclasses.replace(axis, offset = axis.offset + phase * axis.gain, gain = axis.gain * factor)
+            }
+        )
+
+    def publish(self, topic: str, msg: typing.Any) -> typing.List[StreamClient]:
+        """ Queue `msg` for every client subscribed to `topic`; returns clients that stalled """
+        subscribers = [client for client in self.clients if topic in client.subscriptions]
+
+        decimated = {
+            factor: self._decimate(topic, msg, factor)
+            for factor in {client.subscriptions[topic] for client in subscribers}
+        }
+
+        frames: typing.Dict[typing.Tuple[str, int], bytes] = {}
+        stalled = []
+        for client in subscribers:
+            key = (client.fmt, client.subscriptions[topic])
+            if key not in frames:
+                frames[key] = encode_frame(topic, decimated[key[1]], key[0])
+            try:
+                client.queue.put_nowait(frames[key])
+                client.behind = 0
+            except asyncio.QueueFull:
+                client.dropped += 1
+                client.behind += 1
+                if client.behind >= self.max_drops:
+                    stalled.append(client)
+        return stalled
+
+
+class StreamServerSettings(ez.Settings):
+    topics: typing.List[str] = field(default_factory = list) # served topics (e.g. BCPITopics.CLASS)
+    host: str = '127.0.0.1' # local consumers only; clients are not authenticated
+    port: int = 8765
+    graph_address: typing.Optional[typing.Tuple[str, int]] = None
+    queue_size: int = 32 # frames buffered per client
+    max_drops: int = 256 # consecutive frames dropped before a slow client is disconnected
+
+
+class StreamServerState(ez.State):
+    hub: StreamHub
+
+
+class StreamServer(ez.Unit):
+    """
+    Serves `topics` over WebSocket (optional dependency: websockets) to external
+    consumers (games, assistive UIs) that aren't ezmsg clients.
+
+    Clients receive a JSON hello listing the served topics, then send JSON control
+    messages (see `StreamHub.control`) to pick a format and their topics, each with
+    optional server-side decimation; frames are binary (see `encode_frame`).
+    Topics are subscribed once by name, whatever the number of clients.
+    There is no authentication: only bind a non-loopback `host` on a trusted network.
+    """
+
+    SETTINGS: StreamServerSettings
+    STATE: StreamServerState
+
+    def initialize(self) -> None:
+        self.STATE.hub = StreamHub(self.SETTINGS.topics, self.SETTINGS.queue_size, self.SETTINGS.max_drops)
+
+    async def handler(self, websocket: typing.Any, path: typing.Optional[str] = None) -> None:
+        hub = self.STATE.hub
+        client = hub.connect(websocket)
+        address = getattr(websocket, 'remote_address', None)
+        ez.logger.info(f'Stream client connected: {address}')
+
+        async def send() -> None:
+            while True:
+                await websocket.send(await client.queue.get())
+
+        sender = asyncio.create_task(send())
+        try:
+            await websocket.send(hub.hello())
+            async for text in websocket:
+                try:
+                    hub.control(client, text)
+                except (ValueError, TypeError, AttributeError) as e:
+                    await websocket.send(json.dumps({'error': str(e)}))
+        except Exception as e:
+            ez.logger.info(f'Stream client {address} closed: {e!r}')
+        finally:
+            sender.cancel()
+            hub.disconnect(client)
+            ez.logger.info(f'Stream client disconnected: {address} ({client.dropped} frames dropped)')
+
+    async def pump(self, context: GraphContext, topic: str) -> None:
+        hub = self.STATE.hub
+        subscriber = await context.subscriber(topic)
+        while True:
+            async with subscriber.recv_zero_copy() as msg:
+                # Frames are encoded (copied) here, so the zero-copy message isn't held
+                stalled = hub.publish(topic, msg)
+            for client in stalled:
+                ez.logger.warning(f'Stream client fell behind on {topic}; disconnecting')
+                hub.disconnect(client)
+                if client.socket is not None:
+                    await client.socket.close(code = 1013, reason = 'too slow')
+
+    @ez.task
+    async def serve(self) -> None:
+        import websockets # type: ignore
+
+        if self.SETTINGS.host not in LOOPBACK_HOSTS:
+            ez.logger.warning(f'Stream server is exposed on {self.SETTINGS.host} without authentication')
+
+        address = self.SETTINGS.graph_address
+        async with GraphContext(GraphService(address)) as context:
+            async with websockets.serve(self.handler, self.SETTINGS.host, self.SETTINGS.port):
+                ez.logger.info(f'Streaming {self.SETTINGS.topics} on ws://{self.SETTINGS.host}:{self.SETTINGS.port}')
+                await asyncio.gather(*[
+                    self.pump(context, topic)
+                    for topic in self.SETTINGS.topics
+                ])
@@ -15,8 +15,14 @@ from param.parameterized import Event
 
 from ezmsg.panel.tabbedapp import Tab, TabbedApp
 
+from .loghandler import BatchedLogHandler
+from .strategy import ISOLATION_INPROCESS, ISOLATION_SUBPROCESS, ISOLATION_SCRIPT, entrypoint
+
 class SystemTabSettings(ez.Settings):
     data_dir: Path
+    strategy_isolation: str = ISOLATION_SCRIPT # BCPICore uses [strategy] isolation
+    graph_address: typing.Optional[typing.Tuple[str, int]] = None # for strategy subprocesses
+    log_capacity: int = 1000 # log records buffered for the terminal
 
 class SystemTabState(ez.State):
     shell: pn.widgets.Terminal
@@ -29,6 +35,7 @@ class SystemTabState(ez.State):
     main_running: pn.indicators.LoadingSpinner
 
     log_term: pn.widgets.Terminal
+    log_handler: BatchedLogHandler
 
     shutdown_button: pn.widgets.Button
     reboot_button: pn.widgets.Button
@@ -38,16 +45,25 @@ class SystemTabState(ez.State):
 
     task: typing.Optional[asyncio.Task] = None
 
+    # In-process strategy control, published from dashboard callbacks
+    loop: asyncio.AbstractEventLoop
+    strategy_queue: asyncio.Queue
+
 class SystemTab(ez.Unit, Tab):
     SETTINGS: SystemTabSettings
     STATE: SystemTabState
 
+    OUTPUT_STRATEGY = ez.OutputStream(bool) # True: (re)load in-process strategy; False: stop
+
     @property
     def title(self) -> str:
         return 'System'
 
     async def initialize(self) -> None:
 
+        self.STATE.loop = asyncio.get_running_loop()
+        self.STATE.strategy_queue = asyncio.Queue()
+
         self.STATE.shell = pn.widgets.Terminal(
             options = {"cursorBlink": True},
             sizing_mode = 'stretch_both',
@@ -64,9 +80,11 @@ class SystemTab(ez.Unit, Tab):
 
         self.STATE.shell.subprocess.param.watch(on_shell_exit, 'running', onlychanged = True)
 
-        entrypoint = self.SETTINGS.data_dir / 'strategy' / 'main.py'
-        if not entrypoint.parent.exists():
-            entrypoint.parent.mkdir(parents = True, exist_ok = True)
+        main_path = entrypoint(self.SETTINGS.data_dir)
+        if not main_path.parent.exists():
+            main_path.parent.mkdir(parents = True, exist_ok = True)
+
+        isolation = self.SETTINGS.strategy_isolation
 
         self.STATE.main_term = pn.widgets.Terminal(
             sizing_mode = 'stretch_both',
@@ -84,13 +102,36 @@ class SystemTab(ez.Unit, Tab):
             button_type = 'success',
         )
 
+        def set_inprocess_running(running: bool) -> None:
+            # Reloading is always allowed while loaded in-process
+            self.STATE.start_main.disabled = False
+            self.STATE.stop_main.disabled = not running
+            self.STATE.main_running.value = running
+
+        def publish_strategy(running: bool) -> None:
+            # Dashboard callbacks don't run on this unit's event loop
+            self.STATE.loop.call_soon_threadsafe(self.STATE.strategy_queue.put_nowait, running)
+
         def start_main(_: typing.Optional[Event] = None) -> None:
-            if entrypoint.exists():
-                self.STATE.main_term.clear() # type: ignore
-                self.STATE.main_term.subprocess.run(sys.executable, str(entrypoint))
-            else:
-                errmsg = f'ERROR: Entrypoint does not exist: {str(entrypoint)}'
+            if not main_path.exists():
+                errmsg = f'ERROR: Entrypoint does not exist: {str(main_path)}'
                 self.STATE.main_term.subprocess.run('echo', errmsg)
+                return
+
+            self.STATE.main_term.clear() # type: ignore
+            if isolation == ISOLATION_INPROCESS:
+                # Event is None on startup, where StrategyHost autostarts the strategy itself
+                if _ is not None:
+                    publish_strategy(True)
+                self.STATE.main_term.write(f'Strategy {main_path} runs in the core process; output goes to the Log\n')
+                set_inprocess_running(True)
+            elif isolation == ISOLATION_SUBPROCESS:
+                cmd = [sys.executable, '-m', 'bcpi.strategy', str(main_path)]
+                if self.SETTINGS.graph_address is not None:
+                    cmd.append('--graphserver={}:{}'.format(*self.SETTINGS.graph_address))
+                self.STATE.main_term.subprocess.run(*cmd)
+            else:
+                self.STATE.main_term.subprocess.run(sys.executable, str(main_path))
 
         self.STATE.start_main.on_click(start_main)
 
@@ -100,13 +141,17 @@ class SystemTab(ez.Unit, Tab):
         )
 
         def stop_main(_: typing.Optional[Event] = None) -> None:
-            self.STATE.main_term.subprocess.kill() # type: ignore
+            if isolation == ISOLATION_INPROCESS:
+                publish_strategy(False)
+                set_inprocess_running(False)
+            else:
+                self.STATE.main_term.subprocess.kill() # type: ignore
 
         self.STATE.stop_main.on_click(stop_main)
 
         self.STATE.main_file = pn.widgets.StaticText(
             name = 'Main Entrypoint',
-            value = str(entrypoint)
+            value = str(main_path)
         )
 
         def main_running(event: Event) -> None:
@@ -139,15 +184,21 @@ class SystemTab(ez.Unit, Tab):
             name = 'Log'
         )
 
-        stream_handler = logging.StreamHandler(self.STATE.log_term)
-        stream_handler.terminator = "  \n"
+        # Records are formatted and written to the terminal on a background thread,
+        # batched per frame, so logging never waits on the dashboard
+        log_handler = BatchedLogHandler(
+            self.STATE.log_term,
+            capacity = self.SETTINGS.log_capacity,
+            terminator = "  \n"
+        )
         formatter = logging.Formatter(
             "%(asctime)s.%(msecs)03d - pid: %(process)d - %(threadName)s "
             + "- %(levelname)s - %(funcName)s: %(message)s",
             datefmt="%Y-%m-%d %H:%M:%S",
         )
-        stream_handler.setFormatter(formatter)
-        ez.logger.addHandler(stream_handler)
+        log_handler.setFormatter(formatter)
+        ez.logger.addHandler(log_handler)
+        self.STATE.log_handler = log_handler
 
         self.STATE.content = pn.Tabs(
             self.STATE.log_term,
@@ -190,6 +241,16 @@ class SystemTab(ez.Unit, Tab):
             sizing_mode = 'stretch_width',
         )
 
+    async def shutdown(self) -> None:
+        ez.logger.removeHandler(self.STATE.log_handler)
+        self.STATE.log_handler.close()
+
+    @ez.publisher(OUTPUT_STRATEGY)
+    async def publish_strategy(self) -> typing.AsyncGenerator:
+        while True:
+            running = await self.STATE.strategy_queue.get()
+            yield self.OUTPUT_STRATEGY, running
+
     def sidebar(self) -> pn.viewable.Viewable:
         return self.STATE.sidebar
     
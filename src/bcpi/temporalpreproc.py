@@ -1,18 +1,33 @@
-from dataclasses import field
+import asyncio
+import typing
+
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+import scipy.signal
 
 import ezmsg.core as ez
+from ezmsg.util.generator import consumer
 from ezmsg.util.messages.axisarray import AxisArray
 
-from ezmsg.sigproc.butterworthfilter import ButterworthFilter, ButterworthFilterSettings
-from ezmsg.sigproc.decimate import Decimate, DownsampleSettings
-from ezmsg.sigproc.ewmfilter import EWMFilter, EWMFilterSettings
+from ezmsg.sigproc.butterworthfilter import ButterworthFilterSettings
+from ezmsg.sigproc.decimate import DownsampleSettings
+
+from .ringbuffer import RingBuffer
+from .snapshot import fingerprint, snapshot_path, save_snapshot, load_snapshot
 
 class TemporalPreprocSettings( ez.Settings ):
     # 1. Bandpass Filter
-    filt_settings: ButterworthFilterSettings = field( 
+    filt_settings: ButterworthFilterSettings = field(
         default_factory = ButterworthFilterSettings
     )
 
+    # 1b. Notch filter(s) at line frequency (Hz), merged into the bandpass cascade
+    notch_freqs: typing.List[float] = field(default_factory = list)
+    notch_q: float = 30.0
+
     # X. TODO: Common Average Reference/Spatial Filtering?
 
     # 2. Downsample
@@ -23,33 +38,420 @@ class TemporalPreprocSettings( ez.Settings ):
     # 3. Exponentially Weighted Standardization
     ewm_history_dur: float = 2.0 # sec
 
+    # Working dtype (e.g. 'float32'); input, filter coefficients and state are
+    # converted to it so the whole chain runs at that precision. None: input dtype
+    dtype: typing.Optional[str] = None
+
+    # Settings changes while running
+    warmup_dur: float = 1.0 # sec of input history used to warm up a redesigned filter
+    crossfade_dur: float = 0.25 # sec to cross-fade from the old filter to the new one
+
+    # Filter/EWM state is saved here (per unit address) and restored on startup
+    snapshot_dir: typing.Optional[Path] = None
+    device: typing.Optional[str] = None # identity of the source (e.g. headset address); state isn't restored across devices
+    snapshot_interval: float = 10.0 # sec; 0: only at shutdown
+    snapshot_max_age: float = 3600.0 # sec; older snapshots aren't restored
+
+
+@dataclass
+class PreprocDesign:
+    """ Filter coefficients for `settings` at input rate `fs` """
+    settings: TemporalPreprocSettings
+    fs: float # Hz; input rate
+    factor: int # decimation factor
+    aa_sos: typing.Optional[npt.NDArray] # anti-aliasing filter (before decimation)
+    bp_sos: typing.Optional[npt.NDArray] # bandpass and notch filters (after decimation)
+    ewm_samples: int # EWM history (including the current chunk) at the output rate
+
+    @property
+    def fs_out(self) -> float:
+        return self.fs / self.factor
+
+
+def design_preproc(settings: TemporalPreprocSettings, fs: float) -> PreprocDesign:
+    factor = max(1, settings.decimate_settings.factor)
+
+    # Same anti-aliasing filter as ezmsg.sigproc.decimate.Decimate
+    aa_sos = scipy.signal.cheby1(8, 0.05, 0.8 / factor, output = 'sos') if factor > 1 else None
+
+    bp_sos = None
+    specs = settings.filt_settings.filter_specs()
+    if settings.filt_settings.order > 0 and specs is not None:
+        btype, cut = specs
+        bp_sos = scipy.signal.butter(
+            settings.filt_settings.order,
+            Wn = cut,
+            btype = btype,
+            fs = fs / factor,
+            output = 'sos'
+        )
+
+    # Notches run in the same sosfilt call (and state) as the bandpass
+    for freq in settings.notch_freqs:
+        if not 0.0 < freq < fs / factor / 2.0:
+            ez.logger.warning(f'Notch at {freq} Hz is beyond Nyquist after decimation; skipping')
+            continue
+        b, a = scipy.signal.iirnotch(freq, settings.notch_q, fs = fs / factor)
+        notch_sos = scipy.signal.tf2sos(b, a)
+        bp_sos = notch_sos if bp_sos is None else np.concatenate([bp_sos, notch_sos])
+
+    if settings.dtype is not None:
+        aa_sos = None if aa_sos is None else aa_sos.astype(settings.dtype)
+        bp_sos = None if bp_sos is None else bp_sos.astype(settings.dtype)
+
+    return PreprocDesign(
+        settings = settings,
+        fs = fs,
+        factor = factor,
+        aa_sos = aa_sos,
+        bp_sos = bp_sos,
+        ewm_samples = max(1, int(settings.ewm_history_dur * fs / factor))
+    )
+
+
+@dataclass
+class PreprocChainState:
+    """ State of the anti-alias -> decimate -> bandpass chain """
+    aa_zi: typing.Optional[npt.NDArray] = None
+    bp_zi: typing.Optional[npt.NDArray] = None
+    ds_idx: int = 0 # decimation phase
+
+
+@dataclass
+class PreprocFade:
+    """ Previous design, still running while its output is faded out """
+    design: PreprocDesign
+    chain: PreprocChainState
+    n_total: int # output samples
+    n_done: int = 0
+
+
+@dataclass
+class PreprocState:
+    """
+    Everything `temporal_preproc` carries between chunks;
+    pass one in to inspect or restore it
+    """
+    fs: typing.Optional[float] = None
+    sample_shape: typing.Optional[typing.Tuple[int, ...]] = None
+    chain: PreprocChainState = field(default_factory = PreprocChainState)
+    fade: typing.Optional[PreprocFade] = None
+    ewm_buffer: typing.Optional[npt.NDArray] = None # recent output of the chain, for the EWM
+    history: typing.Optional[RingBuffer] = None # recent input, for warming up redesigned filters
+
+
+def snapshot_preproc(state: PreprocState) -> typing.Dict[str, npt.NDArray]:
+    """ Copies of the arrays `state` can be restored from; a settings cross-fade in progress isn't kept """
+    assert state.fs is not None and state.sample_shape is not None
+    arrays = {
+        'fs': np.array(state.fs),
+        'sample_shape': np.array(state.sample_shape, dtype = int),
+        'ds_idx': np.array(state.chain.ds_idx),
+    }
+    for name, value in (
+        ('aa_zi', state.chain.aa_zi),
+        ('bp_zi', state.chain.bp_zi),
+        ('ewm_buffer', state.ewm_buffer),
+    ):
+        if value is not None:
+            arrays[name] = value.copy()
+    if state.history is not None:
+        arrays['history'] = state.history.data.copy()
+        arrays['history_written'] = np.array(state.history.n_written)
+    return arrays
+
+
+def restore_preproc(arrays: typing.Mapping[str, npt.NDArray]) -> PreprocState:
+    """ `PreprocState` from `snapshot_preproc` arrays """
+    state = PreprocState(
+        fs = float(arrays['fs']),
+        sample_shape = tuple(int(n) for n in arrays['sample_shape']),
+        chain = PreprocChainState(
+            aa_zi = arrays.get('aa_zi'),
+            bp_zi = arrays.get('bp_zi'),
+            ds_idx = int(arrays['ds_idx'])
+        ),
+        ewm_buffer = arrays.get('ewm_buffer')
+    )
+    if 'history' in arrays:
+        history = arrays['history']
+        state.history = RingBuffer(history.shape[0], history.shape[1:], dtype = history.dtype)
+        state.history.data[:] = history
+        state.history.n_written = int(arrays['history_written'])
+    return state
+
+
+def _sosfilt(sos: npt.NDArray, x: npt.NDArray, zi: typing.Optional[npt.NDArray]) -> typing.Tuple[npt.NDArray, npt.NDArray]:
+    if zi is None:
+        # Start in steady state for the first sample rather than from rest
+        zi = scipy.signal.sosfilt_zi(sos)
+        zi = (zi.reshape(zi.shape + (1,) * (x.ndim - 1)) * x[0]).astype(x.dtype)
+    return scipy.signal.sosfilt(sos, x, axis = 0, zi = zi)
+
+
+def _run_chain(design: PreprocDesign, chain: PreprocChainState, x: npt.NDArray) -> npt.NDArray:
+    """ Filter and decimate time-major `x`, updating `chain` in place """
+    if x.shape[0] == 0:
+        return x
+
+    if design.aa_sos is not None:
+        x, chain.aa_zi = _sosfilt(design.aa_sos, x, chain.aa_zi)
+
+    if design.factor > 1:
+        n_in = x.shape[0]
+        x = x[(-chain.ds_idx) % design.factor::design.factor]
+        chain.ds_idx = (chain.ds_idx + n_in) % design.factor
+
+    if design.bp_sos is not None and x.shape[0]:
+        x, chain.bp_zi = _sosfilt(design.bp_sos, x, chain.bp_zi)
+
+    return x
+
+
+def _ewm_standardize(buffer: npt.NDArray, n_block: int) -> npt.NDArray:
+    """
+    Standardize the last `n_block` samples of time-major `buffer` (which includes them)
+    exactly as ezmsg.sigproc.ewmfilter.EWM does with zero_offset = True
+    """
+    buffer_len = buffer.shape[0]
+    # EWM has no guard for chunks approaching the history length: the weights
+    # underflow as alpha -> 1, so the span is kept to at least half the buffer
+    window = max(buffer_len - n_block, buffer_len // 2, 1)
+
+    alpha = 2.0 / (window + 1.0)
+    alpha_rev = 1.0 - alpha
 
-class TemporalPreproc( ez.Collection ):
+    pows = alpha_rev ** np.arange(buffer_len + 1)
+    scale_arr = (1.0 / pows[:-1]).reshape((-1,) + (1,) * (buffer.ndim - 1))
+    pw0 = alpha * alpha_rev ** (buffer_len - 1)
+
+    def ewma(data: npt.NDArray) -> npt.NDArray:
+        return scale_arr[::-1] * (scale_arr * data * pw0).cumsum(axis = 0)
+
+    mean = ewma(buffer)
+    var = ewma((buffer - mean) ** 2.0)
+    standardized = (buffer - mean) / np.sqrt(var).clip(1e-4)
+    return standardized[-n_block:].astype(buffer.dtype, copy = False)
+
+
+def _warm_chain(design: PreprocDesign, state: PreprocState) -> PreprocChainState:
+    """ State for `design` as if it had been running over the recent input history """
+    history = np.zeros((0,) + (state.sample_shape or ()), dtype = design.settings.dtype)
+    if state.history is not None:
+        history = state.history.read(state.history.oldest, state.history.n_written)
+
+    # Line the decimation phase up with the running chain after the history
+    chain = PreprocChainState(ds_idx = (state.chain.ds_idx - history.shape[0]) % design.factor)
+    _run_chain(design, chain, history)
+    return chain
+
+
+@consumer
+def temporal_preproc(
+    settings: TemporalPreprocSettings = TemporalPreprocSettings(),
+    state: typing.Optional[PreprocState] = None
+) -> typing.Generator[typing.Optional[AxisArray], typing.Union[AxisArray, PreprocDesign], None]:
+    """
+    # `temporal_preproc`
+    Anti-aliased decimation, bandpass filtering and exponentially weighted standardization
+    in a single pass.  Equivalent to chaining ezmsg.sigproc's `Decimate`, `ButterworthFilter`
+    and `EWMFilter` (the EWM is recomputed over a zero-padded `ewm_history_dur` window, as
+    `EWMFilter` does in 1:1 mode), but with all filter state in one `PreprocState` so that
+    it can be preserved across settings changes.
+
+    ## Parameters:
+    * `settings (TemporalPreprocSettings)`: Initial settings
+    * `state (PreprocState | None)`: State to resume from; a new state is created if None.
+        Any state that doesn't match the incoming signal (sampling rate/shape) is discarded.
+
+    ## Sends:
+    * `AxisArray`: Signal to preprocess
+    * `PreprocDesign`: New settings (see `design_preproc`) to swap in.  The new filters are
+        warmed up on recent input and cross-faded in over `settings.crossfade_dur`; the EWM history
+        carries over, so there is no gap or warm-up period in the output.
+    ## Yields:
+    * `AxisArray | None`: Preprocessed signal; None if a chunk produced no output samples,
+        or in response to a `PreprocDesign`
+    """
+
+    state = PreprocState() if state is None else state
+    design: typing.Optional[PreprocDesign] = None
+    output: typing.Optional[AxisArray] = None
+
+    while True:
+        input = yield output
+        output = None
+
+        if isinstance(input, PreprocDesign):
+            settings = input.settings
+            if state.fs is None or input.fs != state.fs:
+                design = None # Designed when the next chunk arrives
+                continue
+
+            n_fade = int(settings.crossfade_dur * input.fs_out)
+            if design is not None and design.factor == input.factor and n_fade > 0:
+                state.fade = PreprocFade(design = design, chain = state.chain, n_total = n_fade)
+            else:
+                state.fade = None # Output rate changed; switch over to the warmed up filter
+            state.chain = _warm_chain(input, state)
+            design = input
+            continue
+
+        axis_name = settings.decimate_settings.axis or settings.filt_settings.axis or input.dims[0]
+        axis_idx = input.get_axis_idx(axis_name)
+        axis = input.get_axis(axis_name)
+        fs = 1.0 / axis.gain
+
+        x = np.moveaxis(input.data, axis_idx, 0)
+        if settings.dtype is not None:
+            x = x.astype(settings.dtype, copy = False)
+        sample_shape = x.shape[1:]
+
+        dtype_changed = state.history is None or state.history.data.dtype != x.dtype
+        if state.fs != fs or state.sample_shape != sample_shape or dtype_changed:
+            state.fs = fs
+            state.sample_shape = sample_shape
+            state.chain = PreprocChainState()
+            state.fade = None
+            state.ewm_buffer = None
+            state.history = RingBuffer(max(1, int(settings.warmup_dur * fs)), sample_shape, dtype = x.dtype)
+            design = None
+
+        if design is None or design.settings is not settings:
+            design = design_preproc(settings, fs)
+
+        assert state.history is not None
+        state.history.write(x)
+
+        first = (-state.chain.ds_idx) % design.factor
+        y = _run_chain(design, state.chain, x)
+
+        fade = state.fade
+        if fade is not None:
+            y_old = _run_chain(fade.design, fade.chain, x)
+            w = (np.arange(1, y.shape[0] + 1) + fade.n_done) / fade.n_total
+            w = w.clip(0.0, 1.0).reshape((-1,) + (1,) * (y.ndim - 1))
+            y = y_old + w * (y - y_old)
+            fade.n_done += y.shape[0]
+            if fade.n_done >= fade.n_total:
+                state.fade = None
+
+        if y.shape[0] == 0:
+            continue
+
+        # Zero-padded history of the chain output, as ezmsg.sigproc's Window keeps in 1:1 mode
+        # (a changed history length keeps the most recent samples)
+        n_ewm = design.ewm_samples
+        if state.ewm_buffer is None:
+            state.ewm_buffer = np.zeros((n_ewm,) + sample_shape, dtype = y.dtype)
+        buffer = np.concatenate([state.ewm_buffer, y])[-max(n_ewm, y.shape[0]):]
+        state.ewm_buffer = buffer[-n_ewm:]
+
+        standardized = _ewm_standardize(buffer, y.shape[0])
+
+        output = replace(
+            input,
+            data = np.moveaxis(standardized, 0, axis_idx),
+            axes = {
+                **input.axes,
+                axis_name: replace(
+                    axis,
+                    gain = axis.gain * design.factor,
+                    offset = axis.offset + axis.gain * first
+                )
+            }
+        )
+
+
+class TemporalPreprocState( ez.State ):
+    settings: TemporalPreprocSettings
+    preproc: PreprocState
+    gen: typing.Generator[typing.Optional[AxisArray], typing.Union[AxisArray, PreprocDesign], None]
+
+
+class TemporalPreproc( ez.Unit ):
 
     SETTINGS: TemporalPreprocSettings
+    STATE: TemporalPreprocState
 
     INPUT_SIGNAL = ez.InputStream( AxisArray )
+    INPUT_SETTINGS = ez.InputStream( TemporalPreprocSettings )
     OUTPUT_SIGNAL = ez.OutputStream( AxisArray )
 
-    # Subunits
-    BPFILT = ButterworthFilter()
-    DECIMATE = Decimate()
-    EWM = EWMFilter()
-
-    def configure( self ) -> None:
-        self.BPFILT.apply_settings(self.SETTINGS.filt_settings)
-        self.DECIMATE.apply_settings(self.SETTINGS.decimate_settings)
-        self.EWM.apply_settings(
-            EWMFilterSettings(
-                axis = 'time',
-                history_dur = self.SETTINGS.ewm_history_dur,
-            )
-        )
+    def create_generator( self, settings: TemporalPreprocSettings, state: typing.Optional[PreprocState] = None ) -> None:
+        self.STATE.settings = settings
+        self.STATE.preproc = PreprocState() if state is None else state
+        self.STATE.gen = temporal_preproc( settings = settings, state = self.STATE.preproc )
+
+    def snapshot_meta( self ) -> typing.Dict[str, typing.Any]:
+        # Snapshot options don't affect the state itself; the device is keyed on separately
+        # (from SETTINGS, as settings changes while running don't carry it)
+        settings = replace( self.STATE.settings, snapshot_dir = None, snapshot_interval = 0.0, snapshot_max_age = 0.0, device = None )
+        return { 'address': self.address, 'device': self.SETTINGS.device, 'settings': fingerprint( settings ) }
+
+    def initialize( self ) -> None:
+        self.create_generator( self.SETTINGS )
+
+        state = None
+        if self.SETTINGS.snapshot_dir is not None:
+            path = snapshot_path( self.SETTINGS.snapshot_dir, self.address )
+            arrays = load_snapshot( path, self.snapshot_meta(), self.SETTINGS.snapshot_max_age )
+            if arrays is not None:
+                try:
+                    state = restore_preproc( arrays )
+                    ez.logger.info( f'Restored preprocessing state from {path}' )
+                except ( KeyError, ValueError, TypeError ) as e:
+                    ez.logger.warning( f'Could not restore preprocessing state from {path}: {e!r}' )
+
+        if state is not None:
+            self.create_generator( self.SETTINGS, state )
+
+    def save( self ) -> None:
+        snapshot_dir = self.STATE.settings.snapshot_dir
+        if snapshot_dir is None or self.STATE.preproc.fs is None:
+            return
+        path = snapshot_path( snapshot_dir, self.address )
+        try:
+            save_snapshot( path, snapshot_preproc( self.STATE.preproc ), self.snapshot_meta() )
+        except OSError as e:
+            ez.logger.warning( f'Could not save preprocessing state to {path}: {e!r}' )
+
+    def shutdown( self ) -> None:
+        self.save()
+
+    @ez.task
+    async def snapshot( self ) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            interval = self.STATE.settings.snapshot_interval
+            await asyncio.sleep( interval if interval > 0 else 1.0 )
+            if interval <= 0 or self.STATE.settings.snapshot_dir is None or self.STATE.preproc.fs is None:
+                continue
+
+            # Arrays are copied on the loop (consistent with the signal path); written off it
+            arrays = snapshot_preproc( self.STATE.preproc )
+            path = snapshot_path( self.STATE.settings.snapshot_dir, self.address )
+            try:
+                await loop.run_in_executor( None, save_snapshot, path, arrays, self.snapshot_meta() )
+            except OSError as e:
+                ez.logger.warning( f'Could not save preprocessing state to {path}: {e!r}' )
+
+    @ez.subscriber( INPUT_SETTINGS )
+    async def on_settings( self, msg: TemporalPreprocSettings ) -> None:
+        fs = self.STATE.preproc.fs
+        if fs is None:
+            self.create_generator( msg ) # Nothing to preserve yet
+            return
+
+        # Design off the event loop so signal keeps flowing meanwhile
+        loop = asyncio.get_running_loop()
+        design = await loop.run_in_executor( None, design_preproc, msg, fs )
+        self.STATE.settings = msg
+        self.STATE.gen.send( design )
 
-    def network( self ) -> ez.NetworkDefinition:
-        return (
-            ( self.INPUT_SIGNAL, self.DECIMATE.INPUT_SIGNAL),
-            ( self.DECIMATE.OUTPUT_SIGNAL, self.BPFILT.INPUT_SIGNAL ),
-            ( self.BPFILT.OUTPUT_SIGNAL, self.EWM.INPUT_SIGNAL ),
-            ( self.EWM.OUTPUT_SIGNAL, self.OUTPUT_SIGNAL )
-        )
\ No newline at end of file
+    @ez.subscriber( INPUT_SIGNAL, zero_copy = True )
+    @ez.publisher( OUTPUT_SIGNAL )
+    async def on_signal( self, msg: AxisArray ) -> typing.AsyncGenerator:
+        out = self.STATE.gen.send( msg )
+        if out is not None:
+            yield self.OUTPUT_SIGNAL, out
@@ -1,15 +1,37 @@
+import typing
+
 class BCPITopics:
     EPHYS = 'EPHYS' # AxisArray -- Electrophysiology
     EPHYS_PREPROC = 'EPHYS_PREPROC' # AxisArray -- Preprocessed Electrophysiology
+    EPHYS_BANDS = 'EPHYS_BANDS' # FilterBankMessage -- Sub-band signal of EPHYS_PREPROC ([filterbank])
+    QUALITY = 'QUALITY' # ChannelQualityMessage -- Per-channel signal quality of EPHYS
     ACCELEROMETER = 'ACCEL' # AxisArray -- Accelerometer timeseries from device
     GYROSCOPE = 'GYRO' # AxisArray -- Gyroscope timeseries from device
+    MOTION = 'MOTION' # bool -- Head movement onset (True)/offset (False) from ACCEL/GYRO
     DECODE = 'DECODE' # ClassDecodeMessage -- Posterior Decoder Probabilities
     CLASS = 'CLASS' # typing.Optional[str] -- Decoded class
+    COMMAND = 'COMMAND' # str -- Class decided on by accumulating DECODE evidence (debounced)
     CAT_TARGET = 'CAT_TARGET' # typing.Optional[str] -- Target class (from CAT)
     CAT_TRIAL = 'CAT_TRIAL' # SampleMessage -- Clipped trial data (Preprocessed) for CAT
     SSVEP_TRIAL = 'SSVEP_TRIAL' # SampleMessage -- Clipped trial data (Preprocessed) for SSVEP
+    PREPROC_SETTINGS = 'PREPROC_SETTINGS' # TemporalPreprocSettings -- Live changes to [preproc]
 
 
     @classmethod
     def device(cls, name: str) -> str:
-        return f'{name}/INPUT_HID'
\ No newline at end of file
+        return f'{name}/INPUT_HID'
+
+    @classmethod
+    def headset(cls, topic: str, name: typing.Optional[str] = None) -> str:
+        """ `topic` for the headset declared in [device:`name`]; the [unicorn] headset uses bare topics """
+        return topic if name is None else f'{name}/{topic}'
+
+    @classmethod
+    def encoded(cls, topic: str) -> str:
+        """ `topic` quantized/compressed for constrained links (EncodedAxisArray) """
+        return f'{topic}/ENCODED'
+
+    @classmethod
+    def decoded(cls, topic: str) -> str:
+        """ `topic` as decoded on the receiving side of a constrained link """
+        return f'{topic}/DECODED'
@@ -0,0 +1,160 @@
+import typing
+
+from collections import deque
+from dataclasses import replace
+
+import ezmsg.core as ez
+from ezmsg.util.messages.axisarray import AxisArray
+from ezmsg.sigproc.sampler import SampleMessage, SampleTriggerMessage, SamplerSettings
+
+from .ringbuffer import AxisArrayBuffer
+
+
+def extract_trials(
+    buffer: AxisArrayBuffer,
+    triggers: typing.Deque[SampleTriggerMessage]
+) -> typing.List[SampleMessage]:
+    """
+    Resolve pending `triggers` against `buffer`.
+    Triggers that are fully enclosed in the buffer are removed from `triggers`
+    and returned as `SampleMessage`s; triggers whose period has already been
+    overwritten are dropped with a warning, and triggers whose period extends
+    into the future stay pending.
+
+    Each trial is copied out of the buffer once.  Tasks keep their trials for the
+    whole recording (far longer than `buffer_dur`), and in-process subscribers get
+    the published object itself, so a view would be overwritten when the buffer wraps.
+    Nothing else is copied: the signal is written into the buffer in place rather than
+    concatenated onto it per chunk, as each task's Sampler did.
+    """
+    samples: typing.List[SampleMessage] = []
+    fs = buffer.fs
+    if fs is None:
+        return samples
+
+    for trig in list(triggers):
+        assert trig.period is not None
+        start = buffer.index(trig.timestamp + trig.period[0])
+        stop = start + int(fs * (trig.period[1] - trig.period[0]))
+
+        if start < buffer.oldest:
+            ez.logger.warning(
+                f'Sampling failed: {trig.period=} starts before the oldest buffered sample; '
+                'increase buffer_dur'
+            )
+            triggers.remove(trig)
+
+        elif stop <= buffer.newest:
+            view = buffer.view(start, stop)
+            samples.append(SampleMessage(trigger = trig, sample = replace(view, data = view.data.copy())))
+            triggers.remove(trig)
+
+    return samples
+
+
+class TrialBufferSettings(ez.Settings):
+    buffer_dur: float = 10.0 # sec
+    axis: typing.Optional[str] = 'time'
+
+
+class TrialBufferState(ez.State):
+    buffer: AxisArrayBuffer
+    cat_triggers: typing.Deque[SampleTriggerMessage]
+    ssvep_triggers: typing.Deque[SampleTriggerMessage]
+
+
+class TrialBuffer(ez.Unit):
+    """
+    One preallocated circular buffer of (preprocessed) signal shared between
+    the CAT and SSVEP tasks.  Each task's triggers are resolved against the same
+    buffer and published as `SampleMessage`s on that task's output.
+    """
+    SETTINGS: TrialBufferSettings
+    STATE: TrialBufferState
+
+    INPUT_SIGNAL = ez.InputStream(AxisArray)
+    INPUT_CAT_TRIGGER = ez.InputStream(SampleTriggerMessage)
+    INPUT_SSVEP_TRIGGER = ez.InputStream(SampleTriggerMessage)
+    OUTPUT_CAT_TRIAL = ez.OutputStream(SampleMessage)
+    OUTPUT_SSVEP_TRIAL = ez.OutputStream(SampleMessage)
+
+    async def initialize(self) -> None:
+        self.STATE.buffer = AxisArrayBuffer(self.SETTINGS.buffer_dur, self.SETTINGS.axis)
+        self.STATE.cat_triggers = deque()
+        self.STATE.ssvep_triggers = deque()
+
+    def queue_trigger(self, msg: SampleTriggerMessage, triggers: typing.Deque[SampleTriggerMessage]) -> None:
+        if self.STATE.buffer.fs is None:
+            ez.logger.warning('Sampling failed: no data buffered yet')
+        elif msg.period is None:
+            ez.logger.warning('Sampling failed: period not specified')
+        elif msg.period[0] >= msg.period[1]:
+            ez.logger.warning(f'Sampling failed: invalid period requested ({msg.period})')
+        elif msg.period[1] - msg.period[0] >= self.SETTINGS.buffer_dur:
+            ez.logger.warning(f'Sampling failed: {msg.period=} >= {self.SETTINGS.buffer_dur=}')
+        else:
+            triggers.append(msg)
+
+    @ez.subscriber(INPUT_CAT_TRIGGER)
+    async def on_cat_trigger(self, msg: SampleTriggerMessage) -> None:
+        self.queue_trigger(msg, self.STATE.cat_triggers)
+
+    @ez.subscriber(INPUT_SSVEP_TRIGGER)
+    async def on_ssvep_trigger(self, msg: SampleTriggerMessage) -> None:
+        self.queue_trigger(msg, self.STATE.ssvep_triggers)
+
+    @ez.subscriber(INPUT_SIGNAL, zero_copy = True)
+    @ez.publisher(OUTPUT_CAT_TRIAL)
+    @ez.publisher(OUTPUT_SSVEP_TRIAL)
+    async def on_signal(self, msg: AxisArray) -> typing.AsyncGenerator:
+        if self.STATE.buffer.write(msg):
+            if len(self.STATE.cat_triggers) or len(self.STATE.ssvep_triggers):
+                ez.logger.warning('Data stream changed: Discarding all triggers')
+            self.STATE.cat_triggers.clear()
+            self.STATE.ssvep_triggers.clear()
+
+        for sample in extract_trials(self.STATE.buffer, self.STATE.cat_triggers):
+            yield self.OUTPUT_CAT_TRIAL, sample
+
+        for sample in extract_trials(self.STATE.buffer, self.STATE.ssvep_triggers):
+            yield self.OUTPUT_SSVEP_TRIAL, sample
+
+
+class SamplerPortState(ez.State):
+    settings: SamplerSettings
+
+
+class SamplerPort(ez.Unit):
+    """
+    Stands in for a task's own Sampler (declare it as the task's SAMPLER in a subclass):
+    it has the same streams, so the task's connections to its sampler still resolve, but
+    it keeps no buffer.  Triggers get the period/value of the sampler's settings where they
+    don't set their own (as the Sampler did) and go out on OUTPUT_TRIGGER, to a TrialBuffer
+    whose trials are published on OUTPUT_SAMPLE.
+    """
+
+    SETTINGS: SamplerSettings
+    STATE: SamplerPortState
+
+    INPUT_TRIGGER = ez.InputStream(SampleTriggerMessage)
+    INPUT_SETTINGS = ez.InputStream(SamplerSettings)
+    INPUT_SIGNAL = ez.InputStream(AxisArray)
+    OUTPUT_SAMPLE = ez.OutputStream(SampleMessage)
+    OUTPUT_TRIGGER = ez.OutputStream(SampleTriggerMessage)
+
+    def initialize(self) -> None:
+        self.STATE.settings = self.SETTINGS
+
+    @ez.subscriber(INPUT_SETTINGS)
+    async def on_settings(self, msg: SamplerSettings) -> None:
+        self.STATE.settings = msg
+
+    @ez.subscriber(INPUT_TRIGGER)
+    @ez.publisher(OUTPUT_TRIGGER)
+    async def on_trigger(self, msg: SampleTriggerMessage) -> typing.AsyncGenerator:
+        settings = self.STATE.settings
+        yield self.OUTPUT_TRIGGER, replace(
+            msg,
+            period = msg.period if msg.period is not None else settings.period,
+            value = msg.value if msg.value is not None else settings.value
+        )
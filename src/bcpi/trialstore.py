@@ -0,0 +1,396 @@
+import os
+import json
+import time
+import asyncio
+import typing
+import tempfile
+
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+import ezmsg.core as ez
+from ezmsg.util.messages.axisarray import AxisArray
+from ezmsg.sigproc.sampler import SampleMessage, SampleTriggerMessage
+
+STORE_VERSION = 1
+META_FILE = 'store.json'
+INDEX_FILE = 'index.bin'
+CHUNK_FILE = 'chunk-{:05d}.bin'
+
+# One fixed-size record per trial, appended to INDEX_FILE
+INDEX_DTYPE = np.dtype([
+    ('chunk', '<u4'),
+    ('start', '<u8'), # sample within the chunk
+    ('length', '<u8'), # samples
+    ('fs', '<f8'),
+    ('offset', '<f8'), # time of the first sample
+    ('timestamp', '<f8'), # trigger time
+    ('period', '<f8', (2,)),
+    ('label', 'S32'), # utf-8 trigger value (truncated)
+    ('session', 'S32'),
+    ('settings', 'S16'), # preproc settings fingerprint (see snapshot.fingerprint)
+])
+
+
+def _encode(text: str, dtype: np.dtype) -> bytes:
+    return text.encode('utf-8')[:dtype.itemsize]
+
+
+def trial_label(trigger: SampleTriggerMessage) -> str:
+    return '' if trigger.value is None else str(trigger.value)
+
+
+def session_name() -> str:
+    """ Session recorded with trials; one per launch of bcpi """
+    return time.strftime('%Y%m%d-%H%M%S')
+
+
+class TrialStore:
+    """
+    Append-only store of trials (`SampleMessage`s) in `path`.  Signal goes into
+    preallocated, memory-mapped chunk files; each trial gets a record in a compact
+    index (`INDEX_DTYPE`) that is the only thing read to query the store.
+
+    Trial data is flushed before its index record is written, so after a crash the
+    index never refers to missing signal.  Readers (`readonly`) see trials appended
+    by a writer in another process after `refresh()`.
+    """
+
+    def __init__(self, path: Path, chunk_dur: float = 600.0, readonly: bool = False):
+        self.path = path
+        self.chunk_dur = chunk_dur # sec of signal per chunk file
+        self.readonly = readonly
+        self.meta: typing.Optional[typing.Dict[str, typing.Any]] = None
+        self._index = np.zeros(0, dtype = INDEX_DTYPE)
+        self._chunks: typing.Dict[int, np.memmap] = {}
+
+        if not readonly:
+            path.mkdir(parents = True, exist_ok = True)
+        meta_path = path / META_FILE
+        if meta_path.exists():
+            self.meta = json.loads(meta_path.read_text())
+            if self.meta.get('version') != STORE_VERSION:
+                raise ValueError(f'Trial store {path} is from another version of bcpi')
+        self.refresh()
+
+        index_path = path / INDEX_FILE
+        if not readonly and index_path.exists():
+            # Drop a record left partially written by a crash so appends stay aligned
+            os.truncate(index_path, len(self._index) * INDEX_DTYPE.itemsize)
+
+        # Appends go to a new chunk; a crash may have left the last one partially indexed
+        chunk_ids = [int(p.stem.split('-')[1]) for p in path.glob('chunk-*.bin')]
+        self._next_chunk = 1 + max(chunk_ids, default = -1)
+        self._tail: typing.Optional[typing.Tuple[int, int]] = None # (chunk, next free sample)
+
+    def refresh(self) -> None:
+        """ Pick up trials appended since the index was last read """
+        index_path = self.path / INDEX_FILE
+        if not index_path.exists():
+            return
+        with open(index_path, 'rb') as f:
+            f.seek(len(self._index) * INDEX_DTYPE.itemsize)
+            raw = f.read()
+        n = len(raw) // INDEX_DTYPE.itemsize # a partially written record isn't a trial yet
+        if n:
+            new = np.frombuffer(raw[:n * INDEX_DTYPE.itemsize], dtype = INDEX_DTYPE)
+            self._index = np.concatenate([self._index, new])
+
+    @property
+    def index(self) -> npt.NDArray:
+        """ One `INDEX_DTYPE` record per trial, in the order they were appended """
+        return self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _chunk(self, chunk: int) -> np.memmap:
+        mm = self._chunks.get(chunk)
+        if mm is None:
+            assert self.meta is not None
+            mm = np.memmap(
+                self.path / CHUNK_FILE.format(chunk),
+                dtype = np.dtype(self.meta['dtype']),
+                mode = 'r' if self.readonly else 'r+'
+            )
+            mm = mm.reshape((-1,) + tuple(self.meta['sample_shape']))
+            self._chunks[chunk] = mm
+        return mm
+
+    def _new_chunk(self, n_samp: int) -> int:
+        assert self.meta is not None
+        chunk = self._next_chunk
+        self._next_chunk += 1
+        # Preallocated (sparse where the filesystem allows) so it can be mapped once
+        self._chunks[chunk] = np.memmap(
+            self.path / CHUNK_FILE.format(chunk),
+            dtype = np.dtype(self.meta['dtype']),
+            mode = 'w+',
+            shape = (n_samp,) + tuple(self.meta['sample_shape'])
+        )
+        return chunk
+
+    def _write_meta(self, meta: typing.Dict[str, typing.Any]) -> None:
+        fd, tmp = tempfile.mkstemp(dir = self.path, prefix = META_FILE, suffix = '.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, self.path / META_FILE)
+        self.meta = meta
+
+    def append(self, msg: SampleMessage, session: str = '', settings: str = '', time_axis: str = 'time') -> int:
+        """ Store `msg`; returns its trial number """
+        if self.readonly:
+            raise PermissionError(f'Trial store {self.path} is read-only')
+
+        sample = msg.sample
+        axis = sample.get_axis(time_axis)
+        data = np.moveaxis(sample.data, sample.get_axis_idx(time_axis), 0)
+        dims = [time_axis] + [dim for dim in sample.dims if dim != time_axis]
+
+        if self.meta is None:
+            self._write_meta({
+                'version': STORE_VERSION,
+                'dims': dims,
+                'sample_shape': list(data.shape[1:]),
+                'dtype': data.dtype.str,
+            })
+        elif (
+            tuple(self.meta['sample_shape']) != data.shape[1:]
+            or np.dtype(self.meta['dtype']) != data.dtype
+            or self.meta['dims'] != dims
+        ):
+            raise ValueError(
+                f'Trial {dims} {data.shape[1:]} {data.dtype} does not match trial store {self.path} '
+                f'({self.meta["dims"]} {tuple(self.meta["sample_shape"])} {self.meta["dtype"]})'
+            )
+
+        fs = 1.0 / axis.gain
+        n_samp = data.shape[0]
+        if self._tail is None or self._tail[1] + n_samp > self._chunk(self._tail[0]).shape[0]:
+            self._tail = (self._new_chunk(max(n_samp, int(self.chunk_dur * fs))), 0)
+        chunk, start = self._tail
+
+        mm = self._chunk(chunk)
+        mm[start:start + n_samp] = data
+        mm.flush()
+        self._tail = (chunk, start + n_samp)
+
+        record = np.zeros(1, dtype = INDEX_DTYPE)
+        record['chunk'] = chunk
+        record['start'] = start
+        record['length'] = n_samp
+        record['fs'] = fs
+        record['offset'] = axis.offset
+        record['timestamp'] = msg.trigger.timestamp
+        record['period'] = msg.trigger.period if msg.trigger.period is not None else (np.nan, np.nan)
+        record['label'] = _encode(trial_label(msg.trigger), INDEX_DTYPE['label'])
+        record['session'] = _encode(session, INDEX_DTYPE['session'])
+        record['settings'] = _encode(settings, INDEX_DTYPE['settings'])
+        with open(self.path / INDEX_FILE, 'ab') as f:
+            f.write(record.tobytes())
+
+        self._index = np.concatenate([self._index, record])
+        return len(self._index) - 1
+
+    def select(
+        self,
+        label: typing.Optional[typing.Union[str, typing.Collection[str]]] = None,
+        session: typing.Optional[str] = None,
+        settings: typing.Optional[str] = None,
+        since: typing.Optional[float] = None,
+        until: typing.Optional[float] = None
+    ) -> npt.NDArray:
+        """ Numbers of the trials matching every given criterion (trigger time in [since, until)) """
+        index = self._index
+        mask = np.ones(len(index), dtype = bool)
+        if label is not None:
+            labels = [label] if isinstance(label, str) else list(label)
+            mask &= np.isin(index['label'], [_encode(lbl, INDEX_DTYPE['label']) for lbl in labels])
+        if session is not None:
+            mask &= index['session'] == _encode(session, INDEX_DTYPE['session'])
+        if settings is not None:
+            mask &= index['settings'] == _encode(settings, INDEX_DTYPE['settings'])
+        if since is not None:
+            mask &= index['timestamp'] >= since
+        if until is not None:
+            mask &= index['timestamp'] < until
+        return np.flatnonzero(mask)
+
+    def labels(self, trials: typing.Optional[npt.NDArray] = None) -> typing.List[str]:
+        index = self._index if trials is None else self._index[trials]
+        return [label.decode('utf-8', errors = 'replace') for label in index['label']]
+
+    def view(self, trial: int) -> npt.NDArray:
+        """ (time, ...) signal of `trial`; a view of the mapped chunk (no copy) """
+        record = self._index[trial]
+        start = int(record['start'])
+        return self._chunk(int(record['chunk']))[start:start + int(record['length'])]
+
+    def read(self, trial: int) -> SampleMessage:
+        """ `trial` as it was recorded (though with the time axis first); the signal isn't copied """
+        assert self.meta is not None
+        record = self._index[trial]
+        period = tuple(record['period'])
+        return SampleMessage(
+            trigger = SampleTriggerMessage(
+                timestamp = float(record['timestamp']),
+                period = None if np.isnan(period[0]) else (float(period[0]), float(period[1])),
+                value = self.labels(np.array([trial]))[0] or None
+            ),
+            sample = AxisArray(
+                self.view(trial),
+                dims = list(self.meta['dims']),
+                axes = {
+                    self.meta['dims'][0]: AxisArray.Axis.TimeAxis(
+                        fs = float(record['fs']),
+                        offset = float(record['offset'])
+                    )
+                }
+            )
+        )
+
+    def batch(self, trials: npt.ArrayLike, n_samp: typing.Optional[int] = None) -> npt.NDArray:
+        """
+        (trial, time, ...) signal of `trials`, each cut to `n_samp` samples (default: their
+        common length).  Trials recorded back to back in one chunk (the usual case for a
+        session) come back as a read-only view of the mapping; others are copied.
+        """
+        trials = np.asarray(trials, dtype = int)
+        records = self._index[trials]
+        if n_samp is None:
+            lengths = np.unique(records['length'])
+            if len(lengths) > 1:
+                raise ValueError(f'Trials have different lengths {lengths.tolist()}; pass n_samp')
+            n_samp = int(lengths[0]) if len(lengths) else 0
+        elif len(records) and records['length'].min() < n_samp:
+            raise ValueError(f'Trials are shorter than {n_samp} samples')
+
+        assert self.meta is not None
+        if not len(records):
+            return np.zeros((0, n_samp) + tuple(self.meta['sample_shape']), dtype = np.dtype(self.meta['dtype']))
+
+        starts = records['start'].astype(np.int64)
+        steps = np.diff(starts)
+        if (records['chunk'] == records['chunk'][0]).all() and (
+            len(steps) == 0 or (steps[0] >= n_samp and (steps == steps[0]).all())
+        ):
+            mm = self._chunk(int(records['chunk'][0]))
+            step = int(steps[0]) if len(steps) else n_samp
+            return np.lib.stride_tricks.as_strided(
+                mm[starts[0]:],
+                shape = (len(records), n_samp) + mm.shape[1:],
+                strides = (step * mm.strides[0],) + mm.strides,
+                writeable = False
+            )
+
+        return np.stack([self.view(trial)[:n_samp] for trial in trials])
+
+    def dataset(self, trials: npt.ArrayLike, n_samp: typing.Optional[int] = None) -> typing.Tuple[AxisArray, typing.List[str]]:
+        """
+        (trial, time, ...) `AxisArray` of `trials` for training/evaluation, with their
+        labels; the signal comes from `batch`, so usually isn't copied
+        """
+        assert self.meta is not None
+        trials = np.asarray(trials, dtype = int)
+        rates = np.unique(self._index[trials]['fs'])
+        if len(rates) > 1:
+            raise ValueError(f'Trials were recorded at different rates {rates.tolist()}')
+        time_axis = self.meta['dims'][0]
+        axes = {}
+        if len(rates):
+            axes[time_axis] = AxisArray.Axis.TimeAxis(fs = float(rates[0]))
+        return AxisArray(
+            self.batch(trials, n_samp = n_samp),
+            dims = ['trial'] + list(self.meta['dims']),
+            axes = axes
+        ), self.labels(trials)
+
+    def close(self) -> None:
+        for mm in self._chunks.values():
+            if not self.readonly:
+                mm.flush()
+        self._chunks.clear()
+
+
+def load_dataset(
+    path: Path,
+    label: typing.Optional[typing.Union[str, typing.Collection[str]]] = None,
+    session: typing.Optional[str] = None,
+    settings: typing.Optional[str] = None,
+    since: typing.Optional[float] = None,
+    until: typing.Optional[float] = None,
+    n_samp: typing.Optional[int] = None
+) -> typing.Tuple[AxisArray, typing.List[str]]:
+    """
+    Training dataset of the trials in the store at `path` matching the `TrialStore.select`
+    criteria (see `TrialStore.dataset`); the store is opened read-only and only its
+    index is read to find the trials
+    """
+    store = TrialStore(path, readonly = True)
+    if store.meta is None:
+        raise ValueError(f'No trials in trial store {path}')
+    trials = store.select(label = label, session = session, settings = settings, since = since, until = until)
+    return store.dataset(trials, n_samp = n_samp)
+
+
+class TrialRecorderSettings(ez.Settings):
+    store_dir: typing.Optional[Path] = None # one TrialStore per topic beneath it; None: trials aren't stored
+    session: str = '' # e.g. when bcpi was launched
+    settings: str = '' # fingerprint of the settings trials were preprocessed with
+    chunk_dur: float = 600.0 # sec of signal per chunk file
+
+
+class TrialRecorderState(ez.State):
+    stores: typing.Dict[str, TrialStore]
+    lock: asyncio.Lock # one append at a time; stores aren't thread-safe
+
+
+class TrialRecorder(ez.Unit):
+    """
+    Appends CAT_TRIAL and SSVEP_TRIAL trials to `TrialStore`s (store_dir/CAT_TRIAL,
+    store_dir/SSVEP_TRIAL) so datasets can be queried and read without loading them whole.
+    Appends (flushes and index writes) run off the event loop.
+    """
+
+    SETTINGS: TrialRecorderSettings
+    STATE: TrialRecorderState
+
+    INPUT_CAT_TRIAL = ez.InputStream(SampleMessage)
+    INPUT_SSVEP_TRIAL = ez.InputStream(SampleMessage)
+
+    def initialize(self) -> None:
+        self.STATE.stores = {}
+        self.STATE.lock = asyncio.Lock()
+
+    def shutdown(self) -> None:
+        for store in self.STATE.stores.values():
+            store.close()
+
+    def record(self, name: str, msg: SampleMessage) -> None:
+        """ Blocking; see `on_trial` """
+        try:
+            store = self.STATE.stores.get(name)
+            if store is None:
+                store = TrialStore(self.SETTINGS.store_dir / name, chunk_dur = self.SETTINGS.chunk_dur)
+                self.STATE.stores[name] = store
+            trial = store.append(msg, session = self.SETTINGS.session, settings = self.SETTINGS.settings)
+            ez.logger.debug(f'Stored {name} trial {trial} ({trial_label(msg.trigger)})')
+        except (ValueError, OSError) as e:
+            ez.logger.warning(f'Could not store {name} trial: {e}')
+
+    async def on_trial(self, name: str, msg: SampleMessage) -> None:
+        if self.SETTINGS.store_dir is None:
+            return
+        loop = asyncio.get_running_loop()
+        async with self.STATE.lock:
+            await loop.run_in_executor(None, self.record, name, msg)
+
+    @ez.subscriber(INPUT_CAT_TRIAL, zero_copy = True)
+    async def on_cat_trial(self, msg: SampleMessage) -> None:
+        await self.on_trial('CAT_TRIAL', msg)
+
+    @ez.subscriber(INPUT_SSVEP_TRIAL, zero_copy = True)
+    async def on_ssvep_trial(self, msg: SampleMessage) -> None:
+        await self.on_trial('SSVEP_TRIAL', msg)
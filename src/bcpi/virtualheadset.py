@@ -0,0 +1,227 @@
+import time
+import asyncio
+import typing
+
+from dataclasses import dataclass, field
+
+import numpy as np
+import numpy.typing as npt
+import scipy.signal
+
+import ezmsg.core as ez
+from ezmsg.util.generator import consumer
+from ezmsg.util.messages.axisarray import AxisArray
+
+# 1/f ("pink") background from white noise (Kasdin/Kellet approximation)
+PINK_B = np.array([0.049922035, -0.095993537, 0.050612699, -0.004408786])
+PINK_A = np.array([1.0, -2.494956002, 2.017265875, -0.522189400])
+PINK_GAIN = 1.0 / 0.063 # ~unit RMS at the output for unit variance input
+
+MU_FREQ = 10.0 # Hz; sensorimotor rhythm desynchronized by motor imagery
+BLINK_DUR = 0.3 # sec
+POP_TAU = 0.2 # sec; decay of an electrode pop
+
+
+class VirtualHeadsetSettings(ez.Settings):
+    n_headsets: int = 1
+    channels: int = 8
+    fs: float = 250.0 # Hz
+    n_samp: int = 50 # samples per chunk
+
+    noise_uv: float = 10.0 # RMS of the 1/f background
+    ssvep_freqs: typing.List[float] = field(default_factory = lambda: [12.0, 15.0, 17.0, 20.0])
+    ssvep_uv: float = 2.0
+    mi_uv: float = 5.0 # mu rhythm; halved over one hemisphere while imagining the opposite hand
+    class_dur: float = 4.0 # sec each headset attends one SSVEP target / imagines one hand
+    artifact_rate: float = 0.1 # blinks and electrode pops per sec per headset
+    artifact_uv: float = 100.0
+    seed: int = 0
+
+    # Headsets added every ramp_interval (sec); 0: all of them from the start
+    ramp_step: int = 0
+    ramp_interval: float = 60.0
+
+    report_interval: float = 10.0 # sec between SourceReports
+
+
+@dataclass
+class VirtualEEGState:
+    rng: np.random.Generator
+    n: int = 0 # samples generated per headset
+    zi: typing.Optional[npt.NDArray] = None # pink filter state; (order, headset * channel)
+
+
+@dataclass
+class SourceReport:
+    """ Load offered by a VirtualHeadset over the last report interval """
+    active: int # headsets
+    chunks: int
+    lag: float # sec; how far (at most) the source ran behind real time
+
+
+def active_headsets(settings: VirtualHeadsetSettings, elapsed: float) -> int:
+    if settings.ramp_step <= 0:
+        return settings.n_headsets
+    steps = 1 + int(elapsed // settings.ramp_interval)
+    return min(settings.n_headsets, steps * settings.ramp_step)
+
+
+@consumer
+def virtual_eeg(
+    settings: VirtualHeadsetSettings = VirtualHeadsetSettings(),
+    state: typing.Optional[VirtualEEGState] = None
+) -> typing.Generator[npt.NDArray, int, None]:
+    """
+    # `virtual_eeg`
+    Synthetic EEG (in µV) for many headsets at once: 1/f background, SSVEP at a target
+    that changes every `class_dur`, a mu rhythm with lateralized desynchronization
+    for (alternating) imagined hands, and occasional blinks/electrode pops.
+    Every headset is generated in the same array operations.
+
+    ## Sends:
+    * `int`: Number of headsets to generate the next chunk for (at most `n_headsets`)
+    ## Yields:
+    * `ndarray`: float32 (headset, time, channel) chunk of `n_samp` samples
+    """
+
+    state = VirtualEEGState(rng = np.random.default_rng(settings.seed)) if state is None else state
+    order = len(PINK_A) - 1
+    n_all = settings.n_headsets * settings.channels
+    if state.zi is None:
+        state.zi = np.zeros((order, n_all))
+
+    # Left hemisphere is the first half of the channels
+    left = (np.arange(settings.channels) < settings.channels // 2).astype(float)
+    hemispheres = np.stack([left, 1.0 - left]) # (hand, channel)
+    freqs = np.array(settings.ssvep_freqs or [0.0])
+    blink_len = max(1, int(BLINK_DUR * settings.fs))
+    blink = np.hanning(blink_len)
+
+    output = np.zeros((0, settings.n_samp, settings.channels), dtype = np.float32)
+
+    while True:
+        n_active = yield output
+        n_active = max(0, min(settings.n_headsets, n_active))
+        T, C = settings.n_samp, settings.channels
+
+        t = (state.n + np.arange(T)) / settings.fs # (time,)
+        heads = np.arange(n_active)
+        cls = (int(state.n / settings.fs // settings.class_dur) + heads) # per headset
+
+        # Filter every headset's noise (active or not) so inactive ones stay in steady state
+        white = state.rng.standard_normal((T, n_all))
+        pink, state.zi = scipy.signal.lfilter(PINK_B, PINK_A, white, axis = 0, zi = state.zi)
+        x = (settings.noise_uv * PINK_GAIN) * pink.reshape(T, settings.n_headsets, C)[:, :n_active].transpose(1, 0, 2)
+
+        # SSVEP: same target on every channel
+        f = freqs[cls % len(freqs)][:, None] # (headset, 1)
+        x += (settings.ssvep_uv * np.sin(2.0 * np.pi * f * t[None, :]))[:, :, None]
+
+        # Mu rhythm, halved contralateral to the imagined hand
+        erd = 1.0 - 0.5 * hemispheres[(cls + 1) % 2] # (headset, channel)
+        x += settings.mi_uv * np.sin(2.0 * np.pi * MU_FREQ * t)[None, :, None] * erd[:, None, :]
+
+        # Artifacts are rare; only these few are placed individually
+        n_events = state.rng.poisson(settings.artifact_rate * T / settings.fs, size = n_active)
+        for head in np.flatnonzero(n_events):
+            start = state.rng.integers(T)
+            if state.rng.random() < 0.5:
+                # Blink: frontal (first two channels), truncated at the end of the chunk
+                stop = min(T, start + blink_len)
+                x[head, start:stop, :2] += settings.artifact_uv * blink[:stop - start, None]
+            else:
+                ch = state.rng.integers(C)
+                decay = np.exp(-np.arange(T - start) / (POP_TAU * settings.fs))
+                x[head, start:, ch] += settings.artifact_uv * decay
+
+        state.n += T
+        output = x.astype(np.float32)
+
+
+class VirtualHeadsetState(ez.State):
+    gen: typing.Generator[npt.NDArray, int, None]
+
+
+class VirtualHeadset(ez.Unit):
+    """
+    Emulates `n_headsets` headsets in real time for scale and soak testing.
+    Each chunk holds every active headset along a leading 'headset' axis
+    (see `SelectHeadset`); timestamps are wall-clock times of the samples.
+    """
+
+    SETTINGS: VirtualHeadsetSettings
+    STATE: VirtualHeadsetState
+
+    OUTPUT_SIGNAL = ez.OutputStream(AxisArray)
+    OUTPUT_REPORT = ez.OutputStream(SourceReport)
+
+    def initialize(self) -> None:
+        self.STATE.gen = virtual_eeg(self.SETTINGS)
+
+    @ez.publisher(OUTPUT_SIGNAL)
+    @ez.publisher(OUTPUT_REPORT)
+    async def generate(self) -> typing.AsyncGenerator:
+        chunk_dur = self.SETTINGS.n_samp / self.SETTINGS.fs
+        start = time.time()
+        last_report = start
+        n_chunks = 0
+        chunks, lag, active = 0, 0.0, 0
+
+        while True:
+            due = start + n_chunks * chunk_dur # wall-clock time of the chunk's first sample
+            now = time.time()
+            if now < due + chunk_dur:
+                await asyncio.sleep(due + chunk_dur - now) # Samples exist once the chunk is over
+            else:
+                lag = max(lag, now - due - chunk_dur)
+
+            elapsed = due - start
+            n_active = active_headsets(self.SETTINGS, elapsed)
+            if n_active != active:
+                ez.logger.info(f'Virtual headsets active: {n_active}')
+                active = n_active
+
+            data = self.STATE.gen.send(n_active)
+            n_chunks += 1
+            chunks += 1
+            yield self.OUTPUT_SIGNAL, AxisArray(
+                data,
+                dims = ['headset', 'time', 'ch'],
+                axes = {'time': AxisArray.Axis.TimeAxis(fs = self.SETTINGS.fs, offset = due)}
+            )
+
+            if time.time() - last_report >= self.SETTINGS.report_interval:
+                yield self.OUTPUT_REPORT, SourceReport(active = active, chunks = chunks, lag = lag)
+                last_report = time.time()
+                chunks, lag = 0, 0.0
+
+
+class SelectHeadsetSettings(ez.Settings):
+    index: int
+    axis: str = 'headset'
+
+
+class SelectHeadset(ez.Unit):
+    """
+    One headset's signal (a view into the chunk) out of VirtualHeadset chunks; nothing
+    while it isn't active.  Run it alongside the VirtualHeadset so only the selected
+    headset crosses a process boundary.
+    """
+
+    SETTINGS: SelectHeadsetSettings
+
+    INPUT_SIGNAL = ez.InputStream(AxisArray)
+    OUTPUT_SIGNAL = ez.OutputStream(AxisArray)
+
+    @ez.subscriber(INPUT_SIGNAL, zero_copy = True)
+    @ez.publisher(OUTPUT_SIGNAL)
+    async def on_signal(self, msg: AxisArray) -> typing.AsyncGenerator:
+        axis_idx = msg.get_axis_idx(self.SETTINGS.axis)
+        if self.SETTINGS.index >= msg.data.shape[axis_idx]:
+            return
+        dims = [dim for dim in msg.dims if dim != self.SETTINGS.axis]
+        yield self.OUTPUT_SIGNAL, AxisArray(
+            msg.data[(slice(None),) * axis_idx + (self.SETTINGS.index,)],
+            dims = dims,
+            axes = {name: axis for name, axis in msg.axes.items() if name != self.SETTINGS.axis}
+        )
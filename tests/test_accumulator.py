@@ -0,0 +1,73 @@
+import numpy as np
+
+from ezmsg.util.messages.axisarray import AxisArray
+
+from bcpi.accumulator import EvidenceAccumulatorSettings, accumulate_evidence
+
+CLASSES = ['left', 'right', 'rest']
+RATE = 10.0 # decodes per sec
+
+
+def decodes(posteriors: np.ndarray, offset: float = 0.0) -> AxisArray:
+    return AxisArray(
+        posteriors,
+        dims = ['time', 'class'],
+        axes = {'time': AxisArray.Axis.TimeAxis(fs = RATE, offset = offset)}
+    )
+
+
+def run(settings: EvidenceAccumulatorSettings, posteriors: np.ndarray):
+    gen = accumulate_evidence(settings)
+    commands = []
+    for idx, row in enumerate(posteriors):
+        command = gen.send(decodes(row[None], offset = idx / RATE))
+        if command is not None:
+            commands.append((idx, command))
+    return commands
+
+
+def test_noisy_flips():
+    # Mostly 'left' with frequent single-decode flips to 'right'
+    rng = np.random.default_rng(0)
+    posteriors = np.tile([0.6, 0.3, 0.1], (50, 1))
+    flips = rng.random(50) < 0.3
+    posteriors[flips] = [0.3, 0.6, 0.1]
+
+    raw = [CLASSES[idx] for idx in posteriors.argmax(axis = 1)]
+    assert 'right' in raw
+
+    settings = EvidenceAccumulatorSettings(classes = CLASSES, threshold = 0.95, refractory = 1.0)
+    commands = run(settings, posteriors)
+
+    assert len(commands) > 0
+    assert all(command == 'left' for _, command in commands)
+
+    # Refractory period separates commands
+    times = [idx / RATE for idx, _ in commands]
+    assert np.all(np.diff(times) >= settings.refractory)
+
+
+def test_null_class_and_leak():
+    settings = EvidenceAccumulatorSettings(classes = CLASSES, null_class = 'rest', refractory = 0.0)
+    assert run(settings, np.tile([0.1, 0.1, 0.8], (20, 1))) == []
+
+    # Weak evidence never adds up with a short leak, does without one (SPRT)
+    weak = np.tile([0.4, 0.35, 0.25], (40, 1))
+    leaky = EvidenceAccumulatorSettings(classes = CLASSES, leak_tau = 0.1)
+    sprt = EvidenceAccumulatorSettings(classes = CLASSES, leak_tau = None)
+    assert run(leaky, weak) == []
+    assert run(sprt, weak)[0][1] == 'left'
+
+
+def test_batched_decodes():
+    # Several decodes per message, labels from the message when not configured
+    msg = decodes(np.tile([0.05, 0.95, 0.0], (3, 1)))
+    msg.labels = CLASSES
+    gen = accumulate_evidence(EvidenceAccumulatorSettings())
+    assert gen.send(msg) == 'right'
+
+
+if __name__ == '__main__':
+    test_noisy_flips()
+    test_null_class_and_leak()
+    test_batched_decodes()
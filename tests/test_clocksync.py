@@ -0,0 +1,42 @@
+import numpy as np
+
+from bcpi.clocksync import ClockSync
+
+
+def test_clocksync():
+    rng = np.random.default_rng(0)
+
+    offset = 12.345 # sec; remote - local
+    drift = 50e-6 # 50 ppm
+    t0 = 1700000000.0
+
+    def remote(local_t: float) -> float:
+        return local_t + offset + drift * (local_t - t0)
+
+    clock = ClockSync(history = 64)
+    assert not clock.ready and not clock.message().ready
+
+    for idx in range(64):
+        t1 = t0 + idx * 1.0
+        # Asymmetric, occasionally very large queueing delays
+        up = 0.004 + rng.exponential(0.002) + (0.05 if idx % 7 == 0 else 0.0)
+        down = 0.004 + rng.exponential(0.002)
+        t2 = remote(t1 + up)
+        t3 = t2 + 0.0005
+        t4 = t1 + up + 0.0005 + down
+        clock.add(t1, t2, t3, t4)
+
+    assert clock.ready
+    msg = clock.message()
+    assert msg.ready
+    assert abs(msg.drift - drift) < 20e-6
+    assert msg.jitter < 0.005
+
+    # Remote event times map back onto the local clock within a few ms
+    for local_t in [t0 + 10.0, t0 + 60.0, t0 + 65.0]:
+        assert abs(clock.to_local(remote(local_t)) - local_t) < 0.005
+        assert abs(clock.to_remote(local_t) - remote(local_t)) < 0.005
+
+
+if __name__ == '__main__':
+    test_clocksync()
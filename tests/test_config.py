@@ -0,0 +1,61 @@
+import os
+import time
+
+from pathlib import Path
+
+from bcpi.config import BCPIConfig
+from bcpi.topics import BCPITopics
+
+
+def test_config_reload(tmp_path: Path):
+    config_path = tmp_path / 'bcpi'
+    config_path.mkdir()
+    conf = config_path / 'bcpi.conf'
+    conf.write_text('[unicorn]\naddress = simulator\n')
+
+    # Drop-ins override the main config
+    dropin_dir = tmp_path / 'bcpi.d'
+    dropin_dir.mkdir()
+    (dropin_dir / 'preproc.conf').write_text('[preproc]\ncutoff = 40.0\n')
+    (dropin_dir / 'bands.conf').write_text('[filterbank]\nbands = 8-12 12-16\n')
+
+    config = BCPIConfig.load(config_path)
+    assert BCPIConfig.load(config_path) is config # parsed once
+    assert config.preproc_settings.filt_settings.cutoff == 40.0
+    assert config.preproc_settings.decimate_settings.factor == 2
+    assert config.filterbank_settings.bands == [(8.0, 12.0), (12.0, 16.0)]
+    assert config.memory_plan is config.memory_plan # planned once per load
+
+    conf.write_text('[unicorn]\naddress = simulator\n\n[bcpi]\nport = 9999\n')
+    os.utime(conf, ns = (time.time_ns(), time.time_ns() + 1_000_000_000))
+
+    reloaded = BCPIConfig.load(config_path)
+    assert reloaded is not config
+    assert reloaded.port == 9999
+    assert config.diff(reloaded) == {'bcpi'}
+    assert reloaded.memory_plan is not config.memory_plan
+
+
+def test_config_devices(tmp_path: Path):
+    conf = tmp_path / 'bcpi.conf'
+    conf.write_text(
+        '[bcpi]\ndata_dir = /data\n\n'
+        '[device:alice]\naddress = 60:B6:47:E1:26:9E\nmodel = /models/alice.model\n\n'
+        '[device:bob]\nn_samp = 25\n'
+    )
+
+    config = BCPIConfig.load(conf)
+    assert list(config.devices) == ['alice', 'bob']
+    assert config.devices['alice'].address == '60:B6:47:E1:26:9E'
+    assert config.devices['bob'].n_samp == 25
+    assert config.model_path('alice') == Path('/models/alice.model')
+    assert config.model_path('bob') == Path('/data/models/boot.model')
+    assert BCPITopics.headset(BCPITopics.EPHYS, 'alice') == 'alice/EPHYS'
+    assert BCPITopics.headset(BCPITopics.EPHYS) == BCPITopics.EPHYS
+
+
+if __name__ == '__main__':
+    import tempfile
+    for test in [test_config_reload, test_config_devices]:
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
@@ -0,0 +1,90 @@
+import numpy as np
+
+from dataclasses import replace
+
+from ezmsg.util.messages.axisarray import AxisArray
+from ezmsg.sigproc.butterworthfilter import ButterworthFilterSettings
+from ezmsg.sigproc.decimate import DownsampleSettings
+
+from bcpi.cast import cast
+from bcpi.temporalpreproc import TemporalPreprocSettings, temporal_preproc
+from bcpi.frequencydecoder import frequency_decode
+
+
+FS = 250.0
+
+
+def eeg(dur: float = 20.0, n_ch: int = 8) -> np.ndarray:
+    t = np.arange(int(dur * FS)) / FS
+    rng = np.random.default_rng(0)
+    # Microvolt-scale SSVEP on top of a large DC offset, like raw Unicorn data
+    return 1000.0 + 5.0 * np.sin(2.0 * np.pi * 15.0 * t)[:, None] + rng.normal(0.0, 10.0, (len(t), n_ch))
+
+
+def run_preproc(data: np.ndarray, dtype) -> np.ndarray:
+    settings = TemporalPreprocSettings(
+        filt_settings = ButterworthFilterSettings(axis = 'time', order = 3, cuton = 5.0, cutoff = 50.0),
+        decimate_settings = DownsampleSettings(axis = 'time', factor = 2),
+        dtype = dtype
+    )
+    gen = temporal_preproc(settings = settings)
+
+    out = []
+    for idx in range(0, data.shape[0], 50):
+        msg = AxisArray(
+            data[idx:idx + 50],
+            dims = ['time', 'ch'],
+            axes = {'time': AxisArray.Axis.TimeAxis(fs = FS, offset = idx / FS)}
+        )
+        res = gen.send(cast(msg, dtype))
+        if res is not None:
+            out.append(res.data)
+    return np.concatenate(out)
+
+
+def test_cast():
+    msg = AxisArray(np.zeros((4, 2)), dims = ['time', 'ch'])
+    assert cast(msg, None) is msg
+    assert cast(msg, 'float64') is msg
+    assert cast(msg, 'float32').data.dtype == np.float32
+
+
+def test_preproc_float32():
+    data = eeg()
+    y64 = run_preproc(data, None)
+    y32 = run_preproc(data, 'float32')
+
+    assert y64.dtype == np.float64
+    assert y32.dtype == np.float32
+
+    # Output is standardized (unit scale), so absolute error is meaningful.
+    # Skip the first second, where the EWM variance is still ~0 and amplifies rounding
+    settled = int(FS / 2)
+    assert np.abs(y32[settled:] - y64[settled:]).max() < 1e-3
+
+
+def test_frequency_decode_float32():
+    data = eeg(dur = 2.0)
+    freqs = [12.0, 15.0, 17.0, 20.0]
+
+    def decode(dtype) -> np.ndarray:
+        msg = AxisArray(
+            data.astype(dtype),
+            dims = ['time', 'ch'],
+            axes = {'time': AxisArray.Axis.TimeAxis(fs = FS)}
+        )
+        gen = frequency_decode(time_axis = 'time', harmonics = 1, freqs = freqs)
+        return gen.send(msg).data
+
+    p64 = decode(np.float64)
+    p32 = decode(np.float32)
+
+    assert p32.dtype == np.float32
+    assert np.argmax(p32) == np.argmax(p64) == freqs.index(15.0)
+    assert np.allclose(p32, p64, atol = 1e-4)
+
+
+if __name__ == '__main__':
+    test_cast()
+    test_preproc_float32()
+    test_frequency_decode_float32()
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from ezmsg.util.messages.axisarray import AxisArray
+
+from bcpi.encoding import encode, decode, CODEC_NONE, CODEC_ZLIB
+
+
+def _signal(n_time = 250, n_ch = 8, seed = 0) -> AxisArray:
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_time) / 250.0
+    data = 50.0 * np.sin(2.0 * np.pi * 10.0 * t)[:, None] + rng.normal(0.0, 5.0, (n_time, n_ch))
+    return AxisArray(data, dims = ['time', 'ch'], axes = {'time': AxisArray.Axis.TimeAxis(fs = 250.0, offset = 1.0)})
+
+
+@pytest.mark.parametrize('bits', [16, 24])
+@pytest.mark.parametrize('delta', [True, False])
+@pytest.mark.parametrize('codec', [CODEC_NONE, CODEC_ZLIB])
+def test_roundtrip(bits: int, delta: bool, codec: str):
+    msg = _signal()
+    enc = encode(msg, axis = 'time', bits = bits, delta = delta, codec = codec)
+    out = decode(enc)
+
+    assert out.dims == msg.dims
+    assert out.data.dtype == msg.data.dtype
+    assert out.axes['time'].offset == msg.axes['time'].offset
+
+    # Quantization error is at most half a step per channel
+    assert np.all(np.abs(out.data - msg.data) <= enc.scale[None] * 0.5 + 1e-9)
+
+    if codec == CODEC_NONE:
+        assert enc.nbytes < msg.data.nbytes * (bits / 64) + enc.scale.nbytes + 1
+
+
+def test_time_not_first():
+    msg = _signal(n_time = 100, n_ch = 3)
+    msg = AxisArray(msg.data.T.copy(), dims = ['ch', 'time'], axes = msg.axes)
+    out = decode(encode(msg, axis = 'time'))
+    assert out.data.shape == msg.data.shape
+    assert np.allclose(out.data, msg.data, atol = np.abs(msg.data).max() / 32767)
+
+
+def test_edge_cases():
+    # Constant (all zero) channels and empty chunks survive the trip
+    msg = AxisArray(np.zeros((10, 2)), dims = ['time', 'ch'])
+    assert np.array_equal(decode(encode(msg)).data, msg.data)
+
+    msg = AxisArray(np.zeros((0, 2)), dims = ['time', 'ch'])
+    assert decode(encode(msg)).data.shape == (0, 2)
+
+    with pytest.raises(ValueError):
+        encode(msg, bits = 12)
+
+    with pytest.raises(ValueError):
+        encode(msg, codec = 'bogus')
+
+
+if __name__ == '__main__':
+    test_roundtrip(16, True, CODEC_ZLIB)
+    test_time_not_first()
+    test_edge_cases()
@@ -0,0 +1,66 @@
+import numpy as np
+
+from ezmsg.util.messages.axisarray import AxisArray
+
+from bcpi.filterbank import FilterBankSettings, FilterBankMessage, filter_bank
+from bcpi.frequencydecoder import METHOD_PSDA, frequency_decode
+
+
+def chunks(data: np.ndarray, fs: float, n_samp: int):
+    for idx in range(0, data.shape[0], n_samp):
+        yield AxisArray(
+            data[idx:idx + n_samp],
+            dims = ['time', 'ch'],
+            axes = {'time': AxisArray.Axis.TimeAxis(fs = fs, offset = idx / fs)}
+        )
+
+
+def test_filter_bank():
+    fs = 125.0
+    t = np.arange(int(8 * fs)) / fs
+    data = np.stack([np.sin(2.0 * np.pi * 10.0 * t), np.sin(2.0 * np.pi * 22.0 * t)], axis = 1)
+    data = data.astype(np.float32)
+
+    settings = FilterBankSettings(bands = [(8.0, 12.0), (20.0, 24.0)])
+    gen = filter_bank(settings)
+    out = [gen.send(msg) for msg in chunks(data, fs, 25)]
+    assert all(isinstance(msg, FilterBankMessage) for msg in out)
+    assert out[0].dims == ['time', 'ch', 'band']
+    assert out[0].data.dtype == np.float32
+
+    y = np.concatenate([msg.data for msg in out])
+    assert y.shape == (len(t), 2, 2)
+
+    # Each channel's sinusoid lands in its own band only
+    rms = np.sqrt(np.mean(y[len(t) // 2:] ** 2, axis = 0)) # (ch, band)
+    assert rms[0, 0] > 0.5 and rms[1, 1] > 0.5
+    assert rms[0, 1] < 0.05 and rms[1, 0] < 0.05
+
+    # Filter state carries over between messages
+    whole = filter_bank(settings).send(next(chunks(data, fs, len(t))))
+    assert np.allclose(whole.data, y, atol = 1e-4)
+
+    # No bands: nothing to publish
+    msg = next(chunks(data, fs, 25))
+    assert filter_bank(FilterBankSettings()).send(msg) is None
+
+
+def test_frequency_decode_bands():
+    fs = 125.0
+    t = np.arange(int(4 * fs)) / fs
+    rng = np.random.default_rng(0)
+    data = np.sin(2.0 * np.pi * 15.0 * t)[:, None] + rng.standard_normal((len(t), 4))
+
+    bands = filter_bank(FilterBankSettings(bands = [(8.0, 13.0), (13.0, 18.0), (18.0, 23.0)]))
+    msg = bands.send(next(chunks(data, fs, len(t))))
+    assert msg.dims == ['time', 'ch', 'band']
+
+    # The band axis is pooled like channels
+    decode = frequency_decode(time_axis = 'time', freqs = [10.0, 15.0, 20.0], method = METHOD_PSDA)
+    out = decode.send(msg)
+    assert out is not None and out.freqs[int(np.argmax(out.data))] == 15.0
+
+
+if __name__ == '__main__':
+    test_filter_bank()
+    test_frequency_decode_bands()
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from ezmsg.util.messages.axisarray import AxisArray
+
+from bcpi.frequencydecoder import (
+    FrequencyDecodeMessage,
+    frequency_decode,
+    psda_projection,
+    METHOD_CCA,
+    METHOD_PSDA,
+)
+
+FS = 250.0
+FREQS = [12.0, 15.0, 17.0, 20.0]
+
+
+def ssvep(freq: float, dur: float = 2.0, seed: int = 0) -> AxisArray:
+    t = np.arange(int(dur * FS)) / FS
+    rng = np.random.default_rng(seed)
+    mixing = rng.random(8)
+    response = np.sin(2.0 * np.pi * freq * t) + 0.5 * np.sin(2.0 * np.pi * 2.0 * freq * t + 1.0)
+    data = 1000.0 + response[:, None] * mixing + rng.normal(0.0, 3.0, (len(t), 8))
+    return AxisArray(data, dims = ['time', 'ch'], axes = {'time': AxisArray.Axis.TimeAxis(fs = FS)})
+
+
+@pytest.mark.parametrize('method', [METHOD_CCA, METHOD_PSDA])
+def test_frequency_decode(method: str):
+    gen = frequency_decode(time_axis = 'time', harmonics = 1, freqs = FREQS, method = method)
+    for seed, freq in enumerate(FREQS):
+        out = gen.send(ssvep(freq, seed = seed))
+        assert isinstance(out, FrequencyDecodeMessage)
+        assert out.freqs == FREQS
+        assert np.isclose(out.data.sum(), 1.0)
+        assert FREQS[int(np.argmax(out.data))] == freq
+
+
+def test_psda_projection_cached():
+    psda_projection.cache_clear()
+    gen = frequency_decode(time_axis = 'time', harmonics = 1, freqs = FREQS, method = METHOD_PSDA, psda_neighbors = 2)
+    for _ in range(3):
+        gen.send(ssvep(15.0))
+
+    info = psda_projection.cache_info()
+    assert (info.misses, info.hits) == (1, 2)
+
+    # Only the target and neighbor bins are evaluated: freqs * harmonics * (1 + 2 * neighbors) * (cos, sin)
+    proj = psda_projection(500, FS, tuple(FREQS), 1, 2)
+    assert proj.shape == (len(FREQS) * 2 * 5 * 2, 500)
+
+    with pytest.raises(ValueError):
+        frequency_decode(method = 'fft')
+
+
+if __name__ == '__main__':
+    test_frequency_decode(METHOD_CCA)
+    test_frequency_decode(METHOD_PSDA)
+    test_psda_projection_cached()
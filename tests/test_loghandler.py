@@ -0,0 +1,69 @@
+import time
+import logging
+import threading
+
+from bcpi.loghandler import BatchedLogHandler
+
+
+class SlowStream:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.writes = []
+        self.written = threading.Event()
+
+    def write(self, text: str) -> None:
+        time.sleep(self.delay)
+        self.writes.append(text)
+        self.written.set()
+
+
+def make_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    return logger
+
+
+def test_rate_limit():
+    stream = SlowStream()
+    handler = BatchedLogHandler(stream, frame_interval = 0.05, rate_limit = 5, rate_interval = 60.0)
+    logger = make_logger('test_rate_limit', handler)
+
+    for idx in range(100):
+        logger.info('flood %d', idx)
+    logger.warning('different call site')
+
+    # Written in the background without waiting for a flush
+    assert stream.written.wait(1.0)
+
+    # Suppressed records are summarized once the rate window closes (or on close)
+    handler.close()
+    lines = ''.join(stream.writes).splitlines()
+    assert lines == [f'flood {idx}' for idx in range(5)] + [
+        'different call site',
+        '(95 more INFO records from test_rate_limit like "flood %d" suppressed)'
+    ]
+
+
+def test_non_blocking():
+    stream = SlowStream(delay = 0.5)
+    handler = BatchedLogHandler(stream, capacity = 10, frame_interval = 0.01, rate_limit = 1000)
+    logger = make_logger('test_non_blocking', handler)
+
+    # Logging doesn't wait on a slow destination; the ring drops the oldest records
+    start = time.perf_counter()
+    for idx in range(100):
+        logger.info('record %d', idx)
+    assert time.perf_counter() - start < 0.1
+
+    handler.close()
+    text = ''.join(stream.writes)
+    assert 'record 99' in text
+    assert 'dropped' in text
+    assert text.count('record') < 100
+
+
+if __name__ == '__main__':
+    test_rate_limit()
+    test_non_blocking()
@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+
+from bcpi.memory import plan_memory, rss, descendants
+
+
+def plan(budget, buffer_dur = 10.0):
+    return plan_memory(
+        budget = budget,
+        buffer_dur = buffer_dur,
+        headsets = ['SYSTEM/CORE', 'HEADSET_alice'],
+        itemsize = 4,
+        decimate = 2,
+        warmup_dur = 1.0,
+        decode_dur = 3.0,
+        log_capacity = 1000,
+        model_bytes = {'SYSTEM/CORE': 1 << 20}
+    )
+
+
+def test_plan_memory():
+    unconstrained = plan(None)
+    assert unconstrained.buffer_dur == 10.0
+    assert unconstrained.log_capacity == 1000
+    assert unconstrained.allocations['SYSTEM/CORE/INFERENCE'] == 1 << 20
+    assert unconstrained.allocations['HEADSET_alice/INFERENCE'] == 0
+    assert unconstrained.allocations['SYSTEM/TRIALS'] == 10 * 125 * 8 * 4
+    assert not unconstrained.warnings
+    assert len(unconstrained.report()) == len(unconstrained.allocations) + 2
+
+    # Plenty of room: nothing changes
+    assert plan(512 << 20).buffer_dur == 10.0
+
+    # Buffers shrink to fit what's left after the model
+    tight = plan(8 << 20, buffer_dur = 600.0)
+    assert tight.buffer_dur < 600.0
+    assert tight.log_capacity < 1000
+    assert tight.total <= (8 << 20) * 0.25
+    assert tight.warnings
+
+
+def test_rss():
+    if not os.path.exists('/proc/self/status'):
+        return
+
+    assert (rss() or 0) > 0
+
+    child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(5)'])
+    try:
+        assert child.pid in descendants(os.getpid())
+        assert (rss(child.pid) or 0) > 0
+    finally:
+        child.kill()
+        child.wait()
+
+
+if __name__ == '__main__':
+    test_plan_memory()
+    test_rss()
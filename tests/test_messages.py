@@ -0,0 +1,52 @@
+import pytest
+
+from bcpi.messages import (
+    StimMessage,
+    BLE_MIN_MTU,
+    max_events,
+    pack_frames,
+    unpack_frame,
+    seq_gap,
+    SEQ_MODULUS,
+)
+
+
+def test_stim_frames():
+    msgs = [
+        StimMessage(value = idx, timestamp = 1700000000.0 + idx * 1e-3, seq = idx)
+        for idx in range(40)
+    ]
+
+    mtu = 185
+    frames = pack_frames(msgs, mtu)
+    assert len(frames) == -(-len(msgs) // max_events(mtu))
+    assert all(len(frame) <= mtu - 3 for frame in frames)
+
+    decoded = [msg for frame in frames for msg in unpack_frame(frame)]
+    assert [msg.seq for msg in decoded] == [msg.seq for msg in msgs]
+    assert [msg.value for msg in decoded] == [msg.value for msg in msgs]
+    for sent, recv in zip(msgs, decoded):
+        assert abs(sent.timestamp - recv.timestamp) < 1e-6
+
+    # Every central supports the minimum MTU; one event per notification
+    assert len(pack_frames(msgs, BLE_MIN_MTU)) == len(msgs)
+
+    with pytest.raises(ValueError):
+        unpack_frame(frames[0][:-1])
+
+    with pytest.raises(ValueError):
+        unpack_frame(int.to_bytes(0xface, 2, 'big'))
+
+
+def test_seq_gap():
+    assert seq_gap(None, 10) == 0
+    assert seq_gap(9, 10) == 0
+    assert seq_gap(7, 10) == 2
+    assert seq_gap(SEQ_MODULUS - 1, 1) == 1
+    assert seq_gap(10, 10) == 0 # duplicate
+    assert seq_gap(10, 9) == 0 # reordered
+
+
+if __name__ == '__main__':
+    test_stim_frames()
+    test_seq_gap()
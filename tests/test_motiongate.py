@@ -0,0 +1,51 @@
+from collections import deque
+
+import numpy as np
+
+from ezmsg.util.messages.axisarray import AxisArray
+
+from bcpi.motiongate import IMUState, imu_motion, add_motion, affected
+
+FS = 250.0
+
+
+def test_imu_motion():
+    # Still headset (gravity on z) with a head turn between 4 and 4.5 sec
+    t = np.arange(int(8 * FS)) / FS
+    accel = np.tile([0.0, 0.0, 1.0], (len(t), 1))
+    turn = (t >= 4.0) & (t < 4.5)
+    accel[turn, 0] += 0.5 * np.sin(2.0 * np.pi * 2.0 * (t[turn] - 4.0))
+    accel += np.random.default_rng(0).normal(0.0, 0.005, accel.shape)
+
+    state = IMUState()
+    times = []
+    for idx in range(0, len(t), 50):
+        msg = AxisArray(
+            accel[idx:idx + 50],
+            dims = ['time', 'ch'],
+            axes = {'time': AxisArray.Axis.TimeAxis(fs = FS, offset = idx / FS)}
+        )
+        times.append(imu_motion(msg, state, threshold = 0.1, baseline_dur = 2.0))
+    times = np.concatenate(times)
+
+    assert len(times) > 0
+    assert times.min() >= 4.0 and times.max() < 4.6
+
+
+def test_gating():
+    intervals = deque()
+    add_motion(intervals, np.array([1.0, 1.1, 1.2]), hold = 0.5)
+    add_motion(intervals, np.array([1.05, 3.0]), hold = 0.5) # out of order (e.g. gyro after accel)
+    assert list(intervals) == [(1.0, 1.7), (3.0, 3.5)]
+
+    assert not affected(intervals, 0.0, 0.9)
+    assert affected(intervals, 0.9, 1.1)
+    assert affected(intervals, 1.6, 1.8)
+    assert not affected(intervals, 2.0, 2.9)
+    assert list(intervals) == [(3.0, 3.5)] # motion that ended is forgotten
+    assert affected(intervals, 2.9, 3.1)
+
+
+if __name__ == '__main__':
+    test_imu_motion()
+    test_gating()
@@ -0,0 +1,113 @@
+import os
+import asyncio
+import functools
+
+from pathlib import Path
+
+import pytest
+
+import ezmsg.core as ez
+
+from bcpi.placement import Placement, PlacementBackendProcess, parse_cpus, split_process
+
+
+def test_parse_cpus():
+    assert parse_cpus('2,3') == {2, 3}
+    assert parse_cpus('0-2, 5') == {0, 1, 2, 5}
+
+    placement = Placement(name = 'rt', components = ['SYSTEM/CORE/PREPROC'])
+    assert placement.matches('SYSTEM/CORE/PREPROC')
+    assert placement.matches('SYSTEM/CORE/PREPROC/BPFILT')
+    assert not placement.matches('SYSTEM/CORE/PREPROCESSOR')
+
+
+class AffinityProbeSettings(ez.Settings):
+    output: Path
+
+
+class AffinityProbe(ez.Unit):
+    SETTINGS: AffinityProbeSettings
+
+    @ez.task
+    async def probe(self) -> None:
+        cpus = sorted(os.sched_getaffinity(0))
+        nice = os.getpriority(os.PRIO_PROCESS, 0)
+        self.SETTINGS.output.write_text(f'{cpus} {nice}')
+        raise ez.NormalTermination
+
+
+class Idle(ez.Unit):
+
+    @ez.task
+    async def idle(self) -> None:
+        while True:
+            await asyncio.sleep(1.0)
+
+
+@pytest.mark.skipif(not hasattr(os, 'sched_getaffinity'), reason = 'requires sched_getaffinity')
+def test_placement_affinity(tmp_path: Path):
+    cpu = max(os.sched_getaffinity(0))
+    nice = os.getpriority(os.PRIO_PROCESS, 0)
+    output = tmp_path / 'affinity'
+
+    # Unprivileged processes can always lower their own priority
+    probe = AffinityProbe(AffinityProbeSettings(output = output))
+    placements = [Placement(name = 'probe', components = ['PROBE'], cpus = {cpu}, nice = nice + 3)]
+
+    ez.run(
+        PROBE = probe,
+        IDLE = Idle(),
+        process_components = [probe],
+        backend_process = functools.partial(PlacementBackendProcess, placements), # type: ignore
+    )
+
+    # Only the probe's process was placed
+    assert output.read_text() == f'{[cpu]} {nice + 3}'
+    assert os.getpriority(os.PRIO_PROCESS, 0) == nice
+
+
+class NestedProbeSettings(ez.Settings):
+    output: Path
+
+
+class NestedProbe(ez.Collection):
+    SETTINGS: NestedProbeSettings
+
+    PROBE = AffinityProbe()
+    IDLE = Idle()
+
+    def configure(self) -> None:
+        self.PROBE.apply_settings(AffinityProbeSettings(output = self.SETTINGS.output))
+
+
+@pytest.mark.skipif(not hasattr(os, 'sched_getaffinity'), reason = 'requires sched_getaffinity')
+def test_nested_placement(tmp_path: Path):
+    cpu = max(os.sched_getaffinity(0))
+    nice = os.getpriority(os.PRIO_PROCESS, 0)
+    output = tmp_path / 'affinity'
+
+    components = {'SYSTEM': NestedProbe(NestedProbeSettings(output = output))}
+    placements = [Placement(name = 'probe', components = ['SYSTEM/PROBE'], cpus = {cpu}, nice = nice + 3)]
+
+    # Nested components are split off by their parent, not passed to ez.run
+    assert split_process(components, 'SYSTEM/PROBE') is None
+    with pytest.raises(KeyError):
+        split_process(components, 'SYSTEM/NOTHING')
+
+    ez.run(
+        components = components,
+        backend_process = functools.partial(PlacementBackendProcess, placements), # type: ignore
+    )
+
+    # The probe ran in its own (placed) process; the rest of SYSTEM wasn't placed
+    assert output.read_text() == f'{[cpu]} {nice + 3}'
+    assert os.getpriority(os.PRIO_PROCESS, 0) == nice
+
+
+if __name__ == '__main__':
+    import tempfile
+    test_parse_cpus()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_placement_affinity(Path(tmp))
+    with tempfile.TemporaryDirectory() as tmp:
+        test_nested_placement(Path(tmp))
@@ -0,0 +1,56 @@
+import time
+import asyncio
+import threading
+
+import ezmsg.core as ez
+
+from bcpi.profiler import SamplingProfiler, summarize, read_folded, IDLE
+
+
+class Busy(ez.Unit):
+    @ez.task
+    async def spin(self) -> None:
+        end = time.perf_counter() + 0.3
+        while time.perf_counter() < end:
+            sum(range(100))
+
+
+def test_sampling_profiler(tmp_path):
+    unit = Busy()
+    unit._set_name('BUSY')
+    unit._set_location(['SYSTEM'])
+
+    idle = threading.Event()
+    waiter = threading.Thread(target = idle.wait, name = 'Waiter', daemon = True)
+    waiter.start()
+
+    profiler = SamplingProfiler([unit], interval = 0.005)
+    profiler.start()
+    worker = threading.Thread(target = asyncio.run, args = (unit.spin(),))
+    worker.start()
+    worker.join()
+    profiler.stop()
+    profiler.join()
+    idle.set()
+
+    # Busy samples of the worker are attributed to the task, waiting threads are idle
+    counts = profiler.by_attribution()
+    assert counts['SYSTEM/BUSY:spin'] > 10
+    assert profiler.idle > 0
+
+    path = tmp_path / 'process-1.folded'
+    profiler.write(path)
+    stacks = read_folded(path)
+    assert stacks[(IDLE,)] == profiler.idle
+    spin = [stack for stack in stacks if stack[0] == 'SYSTEM/BUSY:spin']
+    assert any(frame.startswith('Busy.spin') for stack in spin for frame in stack[1:])
+
+    summary = summarize(tmp_path)
+    assert any('SYSTEM/BUSY:spin' in line for line in summary)
+
+
+if __name__ == '__main__':
+    import tempfile
+    from pathlib import Path
+    with tempfile.TemporaryDirectory() as tmp:
+        test_sampling_profiler(Path(tmp))
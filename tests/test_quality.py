@@ -0,0 +1,56 @@
+import numpy as np
+
+from ezmsg.util.messages.axisarray import AxisArray
+
+from bcpi.quality import QualityMonitorSettings, quality_monitor, exclude_channels
+
+FS = 250.0
+
+
+def test_quality_monitor():
+    t = np.arange(int(10 * FS)) / FS
+    rng = np.random.default_rng(0)
+    data = np.stack([
+        1000.0 + rng.normal(0.0, 5.0, len(t)), # good
+        1000.0 + rng.normal(0.0, 5.0, len(t)) + 40.0 * np.sin(2.0 * np.pi * 50.0 * t + 0.3), # mains
+        np.full(len(t), -1000.0), # flatline
+        rng.normal(0.0, 500.0, len(t)), # loose
+    ], axis = 1)
+
+    gen = quality_monitor(QualityMonitorSettings(window_dur = 1.0))
+    qualities = []
+    for idx in range(0, len(t), 37): # chunks don't line up with windows
+        msg = AxisArray(
+            data[idx:idx + 37],
+            dims = ['time', 'ch'],
+            axes = {'time': AxisArray.Axis.TimeAxis(fs = FS, offset = idx / FS)}
+        )
+        qualities.extend(gen.send(msg))
+
+    assert len(qualities) == 10
+    assert np.isclose(qualities[-1].timestamp, 10.0)
+    for quality in qualities:
+        assert quality.bad.tolist() == [False, True, True, True]
+        assert quality.flat.tolist() == [False, False, True, False]
+
+        # 40 uV sinusoid at 50 Hz has a power of 800 uV^2; measured by the Goertzel bin
+        assert np.isclose(quality.line_power[0, 1], 800.0, rtol = 0.1)
+        assert np.isclose(quality.variance[0], 25.0, rtol = 0.3)
+
+
+def test_exclude_channels():
+    msg = AxisArray(np.ones((2, 5, 3)), dims = ['ch', 'time', 'band'])
+    bad = np.zeros(6, dtype = bool)
+    assert exclude_channels(msg, bad) is msg
+
+    bad[4] = True # ch 1, band 1
+    out = exclude_channels(msg, bad)
+    assert out.data.shape == msg.data.shape
+    assert np.all(out.data[1, :, 1] == 0.0)
+    assert out.data.sum() == msg.data.sum() - 5
+    assert np.all(msg.data == 1.0)
+
+
+if __name__ == '__main__':
+    test_quality_monitor()
+    test_exclude_channels()
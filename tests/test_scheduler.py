@@ -0,0 +1,47 @@
+import numpy as np
+
+from ezmsg.util.messages.axisarray import AxisArray
+
+from bcpi.scheduler import DecodeSchedulerSettings, DecodeWindows, stack_windows
+
+
+def chunk(fs: float, start: int, n_samp: int) -> AxisArray:
+    data = np.arange(start, start + n_samp, dtype = float)[:, None] * np.ones((1, 2))
+    return AxisArray(
+        data,
+        dims = ['time', 'ch'],
+        axes = {'time': AxisArray.Axis.TimeAxis(fs = fs, offset = start / fs)}
+    )
+
+
+def test_decode_windows():
+    fs = 100.0
+    windows = DecodeWindows(DecodeSchedulerSettings(window_dur = 1.0, stride = 0.1, max_batch = 4))
+
+    # Windows come due at the stride, independent of chunking
+    due = [windows.write(chunk(fs, start, 7)) for start in range(0, 140, 7)]
+    assert sum(due) == 5 # complete at 100, 110, 120, 130, 140
+
+    # Only the most recent max_batch are kept when the consumer falls behind
+    assert windows.dropped == 1
+    pending = windows.take()
+    assert np.allclose([w.axes['time'].offset for w in pending], [0.1, 0.2, 0.3, 0.4])
+    for w in pending:
+        assert w.data.shape == (100, 2)
+        assert w.data[0, 0] == round(w.axes['time'].offset * fs)
+
+    batch = stack_windows(pending, 'win')
+    assert batch.dims == ['win', 'time', 'ch']
+    assert batch.data.shape == (4, 100, 2)
+    assert np.isclose(batch.axes['win'].gain, 0.1)
+    assert np.isclose(batch.axes['win'].offset, 0.1)
+    assert windows.take() == []
+
+    # A gap in the signal needs a full window before the next decode
+    assert windows.write(chunk(fs, 200, 50)) == 0
+    assert windows.write(chunk(fs, 250, 50)) == 1
+    assert windows.take()[0].data[0, 0] == 200
+
+
+if __name__ == '__main__':
+    test_decode_windows()
@@ -0,0 +1,117 @@
+import asyncio
+
+import numpy as np
+
+from dataclasses import replace
+
+from ezmsg.util.messages.axisarray import AxisArray
+from ezmsg.sigproc.butterworthfilter import ButterworthFilterSettings
+from ezmsg.sigproc.decimate import DownsampleSettings
+
+from bcpi.snapshot import save_snapshot, load_snapshot, snapshot_path
+from bcpi.temporalpreproc import (
+    TemporalPreproc,
+    TemporalPreprocSettings,
+    PreprocState,
+    temporal_preproc,
+    snapshot_preproc,
+    restore_preproc,
+)
+
+
+def test_snapshot_file(tmp_path):
+    path = snapshot_path(tmp_path / 'snapshots', 'SYSTEM/CORE/PREPROC')
+    assert path.name == 'SYSTEM_CORE_PREPROC.npz'
+    assert load_snapshot(path, {}) is None
+
+    meta = {'address': 'SYSTEM/CORE/PREPROC', 'shape': (2, 3)}
+    save_snapshot(path, {'x': np.arange(6.0).reshape(2, 3)}, meta)
+    save_snapshot(path, {'x': np.ones((2, 3))}, meta) # Replaces the previous one
+    assert [p.name for p in path.parent.iterdir()] == [path.name]
+
+    arrays = load_snapshot(path, meta)
+    assert arrays is not None and np.array_equal(arrays['x'], np.ones((2, 3)))
+    assert load_snapshot(path, {**meta, 'address': 'HEADSET_alice/PREPROC'}) is None
+    assert load_snapshot(path, meta, max_age = -1.0) is None
+
+
+def test_preproc_restore(tmp_path):
+    fs = 250.0
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal((int(4 * fs), 4)).astype(np.float32)
+    settings = TemporalPreprocSettings(
+        filt_settings = ButterworthFilterSettings(axis = 'time', order = 3, cuton = 5.0, cutoff = 40.0),
+        decimate_settings = DownsampleSettings(axis = 'time', factor = 2),
+        dtype = 'float32'
+    )
+
+    def msg(start: int, stop: int) -> AxisArray:
+        return AxisArray(
+            data[start:stop],
+            dims = ['time', 'ch'],
+            axes = {'time': AxisArray.Axis.TimeAxis(fs = fs, offset = start / fs)}
+        )
+
+    half = data.shape[0] // 2 + 1 # odd, so the decimation phase matters
+    state = PreprocState()
+    gen = temporal_preproc(settings = settings, state = state)
+    gen.send(msg(0, half))
+    expected = gen.send(msg(half, data.shape[0]))
+
+    # Through a file and back, as on restart
+    resumed = PreprocState()
+    gen = temporal_preproc(settings = settings, state = resumed)
+    gen.send(msg(0, half))
+    path = tmp_path / 'preproc.npz'
+    save_snapshot(path, snapshot_preproc(resumed), {})
+    arrays = load_snapshot(path, {})
+    assert arrays is not None
+    restored = restore_preproc(arrays)
+    result = temporal_preproc(settings = settings, state = restored).send(msg(half, data.shape[0]))
+
+    assert np.allclose(result.data, expected.data)
+    assert result.axes['time'].offset == expected.axes['time'].offset
+
+
+def test_preproc_device(tmp_path):
+    fs = 250.0
+    settings = TemporalPreprocSettings(
+        filt_settings = ButterworthFilterSettings(axis = 'time', order = 3, cuton = 5.0, cutoff = 40.0),
+        decimate_settings = DownsampleSettings(axis = 'time', factor = 2),
+        snapshot_dir = tmp_path,
+        device = '60:B6:47:E1:26:9E'
+    )
+    msg = AxisArray(
+        np.zeros((250, 4)),
+        dims = ['time', 'ch'],
+        axes = {'time': AxisArray.Axis.TimeAxis(fs = fs, offset = 0.0)}
+    )
+
+    async def start(settings: TemporalPreprocSettings) -> TemporalPreproc:
+        unit = TemporalPreproc(settings)
+        unit._set_name('PREPROC')
+        unit._set_location(['SYSTEM', 'CORE'])
+        await unit.setup()
+        return unit
+
+    async def run() -> None:
+        unit = await start(settings)
+        unit.STATE.gen.send(msg)
+        unit.save()
+
+        # Restored for the same headset, but not for another one at the same address
+        assert (await start(settings)).STATE.preproc.fs == fs
+        other = await start(replace(settings, device = '60:B6:47:E1:27:00'))
+        assert other.STATE.preproc.fs is None
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    import tempfile
+    from pathlib import Path
+    with tempfile.TemporaryDirectory() as tmp:
+        test_snapshot_file(Path(tmp))
+        test_preproc_restore(Path(tmp))
+    with tempfile.TemporaryDirectory() as tmp:
+        test_preproc_device(Path(tmp))
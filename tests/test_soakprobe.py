@@ -0,0 +1,68 @@
+import asyncio
+
+import numpy as np
+
+from ezmsg.util.messages.axisarray import AxisArray
+
+from bcpi.scheduler import stack_windows
+from bcpi.soakprobe import PendingWindows, SoakProbe, SoakProbeSettings, newest_sample, n_windows
+
+
+def window(start: float, n_samp: int = 100, fs: float = 100.0) -> AxisArray:
+    return AxisArray(
+        np.zeros((n_samp, 2)),
+        dims = ['time', 'ch'],
+        axes = {'time': AxisArray.Axis.TimeAxis(fs = fs, offset = start)}
+    )
+
+
+def test_newest_sample():
+    assert np.isclose(newest_sample(window(1.0)), 1.99)
+
+    # A batch ends with its last window
+    batch = stack_windows([window(1.0), window(1.1), window(1.2)], 'win')
+    assert n_windows(batch, 'win') == 3 and n_windows(batch) == 1
+    assert np.isclose(newest_sample(batch, batch_axis = 'win'), 2.19)
+
+
+def test_pending_windows():
+    pending = PendingWindows()
+    for start in (1.0, 1.1, 1.2, 1.3):
+        assert pending.sent(window(start)) == 1
+
+    # The decoder skipped the first two windows
+    newest, n = pending.decoded(window(1.2))
+    assert np.isclose(newest, 2.19) and n == 1
+    assert pending.dropped == 2
+
+    # Decodes of windows that aren't pending (anymore) are ignored
+    assert pending.decoded(window(1.0)) is None
+    assert len(pending.pending) == 1
+
+    # Without a time axis, decodes are paired in order
+    decode = AxisArray(np.zeros((1, 2)), dims = ['win', 'class'])
+    newest, n = pending.decoded(decode)
+    assert np.isclose(newest, 2.29)
+    assert pending.decoded(decode) is None
+
+
+def test_soak_probe():
+    async def run() -> SoakProbe:
+        probe = SoakProbe(SoakProbeSettings(headset = 3, batch_axis = 'win'))
+        await probe.setup()
+        await probe.on_window(window(1.0))
+        await probe.on_window(stack_windows([window(1.1), window(1.2)], 'win'))
+        await probe.on_decode(stack_windows([window(1.1), window(1.2)], 'win'))
+        return probe
+
+    report = asyncio.run(run()).STATE.report
+    assert report.headset == 3
+    assert report.windows == 3
+    assert report.decodes == 2
+    assert len(report.latencies) == 1 and report.latencies[0] > 0.0
+
+
+if __name__ == '__main__':
+    test_newest_sample()
+    test_pending_windows()
+    test_soak_probe()
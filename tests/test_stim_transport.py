@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import pytest
+
+from bcpi.messages import (
+    StimMessage,
+    BLE_MIN_MTU,
+    ATT_HEADER_SIZE,
+    pack_frames,
+    unpack_frame,
+    pack_sync_request,
+    pack_sync_response,
+    unpack_sync_request,
+    unpack_sync_response,
+)
+from bcpi.stim_transport import (
+    LoopbackLink,
+    LoopbackServerTransport,
+    LoopbackClientTransport,
+    BlessServerTransport,
+)
+from bcpi.stim_server import StimServerSettings
+
+STIM_CHAR = 'STIM'
+TRIG_CHAR = 'TRIG'
+
+
+def test_sync_frames():
+    # Clock sync has to work at the minimum MTU too
+    assert len(pack_sync_request(3)) <= BLE_MIN_MTU - ATT_HEADER_SIZE
+    assert len(pack_sync_response(3, 1, 2)) <= BLE_MIN_MTU - ATT_HEADER_SIZE
+    assert unpack_sync_request(pack_sync_request(259)) == 3
+    assert unpack_sync_response(pack_sync_response(3, -5, 7)) == (3, -5, 7)
+
+    with pytest.raises(ValueError):
+        unpack_sync_response(pack_sync_request(3))
+
+
+def test_server_mtu():
+    # bless can't report the negotiated MTU; the server then packs for the minimum
+    assert BlessServerTransport('test', 'SERVICE', STIM_CHAR, TRIG_CHAR).mtu is None
+    assert StimServerSettings().mtu == BLE_MIN_MTU
+
+
+@pytest.mark.asyncio
+async def test_loopback():
+    LoopbackLink.remove('test')
+    link = LoopbackLink.get('test')
+    assert LoopbackLink.get('test') is link
+
+    latency = 0.02
+    server = LoopbackServerTransport(link, latency = latency, mtu = BLE_MIN_MTU)
+    client = LoopbackClientTransport(link)
+
+    written = []
+    await server.start(lambda uuid, data: written.append((time.time(), uuid, data)))
+
+    notified: asyncio.Queue = asyncio.Queue()
+    async def on_notify(data: bytes) -> None:
+        await notified.put((time.time(), data))
+    await client.connect(STIM_CHAR, on_notify)
+    assert client.mtu == BLE_MIN_MTU
+    assert server.mtu == BLE_MIN_MTU # both ends see the same (simulated) negotiated MTU
+
+    # Notifications arrive in order after the configured latency
+    msgs = [StimMessage(value = idx, seq = idx) for idx in range(5)]
+    frames = pack_frames(msgs, client.mtu)
+    sent = time.time()
+    for frame in frames:
+        server.notify(STIM_CHAR, frame)
+
+    received = []
+    for _ in frames:
+        arrival, data = await asyncio.wait_for(notified.get(), 1.0)
+        assert arrival - sent >= latency * 0.9
+        received.extend(unpack_frame(data))
+    assert [msg.seq for msg in received] == [msg.seq for msg in msgs]
+
+    # Writes reach the server; payloads beyond the MTU are rejected
+    await client.write(TRIG_CHAR, pack_sync_request(1))
+    await asyncio.sleep(latency * 2)
+    assert [(uuid, data) for _, uuid, data in written] == [(TRIG_CHAR, pack_sync_request(1))]
+
+    with pytest.raises(ValueError):
+        await client.write(TRIG_CHAR, bytes(BLE_MIN_MTU))
+
+    # Notifications on other characteristics, or after disconnect, are dropped
+    server.notify(TRIG_CHAR, frames[0])
+    await client.disconnect()
+    server.notify(STIM_CHAR, frames[0])
+    await asyncio.sleep(latency * 2)
+    assert notified.empty()
+
+    await server.stop()
+    LoopbackLink.remove('test')
+
+
+if __name__ == '__main__':
+    test_sync_frames()
+    test_server_mtu()
+    asyncio.run(test_loopback())
@@ -0,0 +1,71 @@
+import asyncio
+
+from pathlib import Path
+
+import pytest
+
+from bcpi.strategy import (
+    load_strategy,
+    LatencyStats,
+    EVENT_START,
+    EVENT_CLASS,
+    EVENT_DECODE,
+)
+
+MAIN = '''
+import asyncio
+
+from bcpi.strategy import on_start, on_class, on_decode
+from helper import CLASSES
+
+received = []
+
+@on_start
+def start():
+    received.append('start')
+
+@on_class
+def react(cls):
+    received.append(CLASSES[cls])
+
+@on_class
+async def react_async(cls):
+    await asyncio.sleep(0)
+    received.append(cls)
+
+@on_decode
+def broken(msg):
+    raise RuntimeError('strategy bug')
+'''
+
+
+@pytest.mark.asyncio
+async def test_strategy(tmp_path: Path):
+    (tmp_path / 'helper.py').write_text("CLASSES = {'left': 'LEFT'}\n")
+    (tmp_path / 'main.py').write_text(MAIN)
+
+    strategy = load_strategy(tmp_path / 'main.py')
+    assert not strategy.empty
+    assert len(strategy.callbacks[EVENT_CLASS]) == 2
+
+    # Registrations are collected per load
+    assert load_strategy(tmp_path / 'main.py').callbacks[EVENT_CLASS] != strategy.callbacks[EVENT_CLASS]
+
+    received = strategy.callbacks[EVENT_START][0].__globals__['received']
+    await strategy.dispatch(EVENT_START)
+    stats = LatencyStats()
+    stats.add(await strategy.dispatch(EVENT_CLASS, 'left'))
+    assert received == ['start', 'LEFT', 'left']
+
+    # A failing callback is logged, not raised
+    await strategy.dispatch(EVENT_DECODE, None)
+
+    summary = stats.summary()
+    assert stats.count == 1
+    assert 0.0 <= summary['p50'] <= summary['max']
+
+
+if __name__ == '__main__':
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(test_strategy(Path(tmp)))
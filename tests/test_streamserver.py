@@ -0,0 +1,88 @@
+import json
+
+import numpy as np
+import pytest
+
+from ezmsg.util.messages.axisarray import AxisArray
+
+from bcpi.streamserver import StreamHub, decode_raw_frame, encode_frame
+
+
+def chunk(start: int, n_samp: int, fs: float = 100.0) -> AxisArray:
+    data = np.arange(start, start + n_samp, dtype = np.float32)[:, None] * np.ones((1, 3), dtype = np.float32)
+    return AxisArray(data, dims = ['time', 'ch'], axes = {'time': AxisArray.Axis.TimeAxis(fs = fs, offset = start / fs)})
+
+
+def test_frames():
+    msg = chunk(0, 10)
+    header, data = decode_raw_frame(encode_frame('EPHYS', msg))
+    assert header['topic'] == 'EPHYS'
+    assert header['dims'] == ['time', 'ch']
+    assert header['axes']['time']['gain'] == 0.01
+    assert data is not None and np.array_equal(data, msg.data)
+
+    header, data = decode_raw_frame(encode_frame('CLASS', 'left'))
+    assert header == {'topic': 'CLASS', 'value': 'left'} and data is None
+
+
+def test_hub():
+    hub = StreamHub(['EPHYS', 'CLASS'], queue_size = 2, max_drops = 3)
+    assert json.loads(hub.hello())['topics'] == ['EPHYS', 'CLASS']
+
+    full = hub.connect()
+    half = hub.connect()
+    other = hub.connect()
+    hub.control(full, json.dumps({'subscribe': ['EPHYS']}))
+    hub.control(half, json.dumps({'subscribe': {'EPHYS': {'decimate': 2}}}))
+    hub.control(other, json.dumps({'subscribe': ['CLASS']}))
+    with pytest.raises(ValueError):
+        hub.control(other, json.dumps({'subscribe': ['DECODE']}))
+
+    # Decimation continues across messages of odd length; one frame per (format, factor)
+    for start in (0, 5):
+        assert hub.publish('EPHYS', chunk(start, 5)) == []
+    offsets, n_samp = [], 0
+    for _ in range(2):
+        header, data = decode_raw_frame(half.queue.get_nowait())
+        assert header['axes']['time']['gain'] == 0.02
+        offsets.append(header['axes']['time']['offset'])
+        n_samp += data.shape[0]
+    assert np.allclose(offsets, [0.0, 0.06]) and n_samp == 5
+    assert full.queue.qsize() == 2
+    assert other.queue.empty()
+
+    # A client that doesn't keep up drops frames, then is reported as stalled
+    stalled = []
+    for start in range(10, 25, 5):
+        stalled = hub.publish('EPHYS', chunk(start, 5))
+    assert full.dropped == 3
+    assert full in stalled
+    assert half not in stalled
+
+    hub.control(full, json.dumps({'unsubscribe': ['EPHYS']}))
+    assert not full.subscriptions
+
+
+def tone(freq: float, n_samp: int, fs: float = 100.0) -> AxisArray:
+    data = np.sin(2.0 * np.pi * freq * np.arange(n_samp) / fs)[:, None] * np.ones((1, 3))
+    return AxisArray(data, dims = ['time', 'ch'], axes = {'time': AxisArray.Axis.TimeAxis(fs = fs, offset = 0.0)})
+
+
+def test_decimate_antialias():
+    hub = StreamHub(['EPHYS'])
+    client = hub.connect()
+    hub.control(client, json.dumps({'subscribe': {'EPHYS': {'decimate': 4}}}))
+
+    # 40 Hz aliases to 10 Hz at 25 Hz; it is filtered out, 5 Hz passes
+    for freq, passes in ((40.0, False), (5.0, True)):
+        hub.publish('EPHYS', tone(freq, 400))
+        _, data = decode_raw_frame(client.queue.get_nowait())
+        assert data.shape == (100, 3)
+        rms = np.sqrt(np.mean(data[50:] ** 2))
+        assert rms > 0.6 if passes else rms < 0.01
+
+
+if __name__ == '__main__':
+    test_frames()
+    test_hub()
+    test_decimate_antialias()
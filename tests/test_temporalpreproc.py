@@ -0,0 +1,132 @@
+import asyncio
+
+import numpy as np
+
+from dataclasses import replace
+
+from ezmsg.util.messages.axisarray import AxisArray
+from ezmsg.sigproc.butterworthfilter import ButterworthFilterSettings
+from ezmsg.sigproc.decimate import DownsampleSettings
+from ezmsg.sigproc.ewmfilter import EWM, EWMSettings
+from ezmsg.sigproc.window import windowing
+
+from bcpi.temporalpreproc import (
+    TemporalPreprocSettings,
+    PreprocState,
+    temporal_preproc,
+    design_preproc,
+)
+
+
+def preproc_settings(cutoff: float) -> TemporalPreprocSettings:
+    return TemporalPreprocSettings(
+        filt_settings = ButterworthFilterSettings(axis = 'time', order = 3, cuton = 5.0, cutoff = cutoff),
+        decimate_settings = DownsampleSettings(axis = 'time', factor = 2),
+        ewm_history_dur = 2.0
+    )
+
+
+def chunks(data: np.ndarray, fs: float, n_samp: int):
+    for idx in range(0, data.shape[0], n_samp):
+        yield AxisArray(
+            data[idx:idx + n_samp],
+            dims = ['time', 'ch'],
+            axes = {'time': AxisArray.Axis.TimeAxis(fs = fs, offset = idx / fs)}
+        )
+
+
+def test_temporal_preproc():
+    fs = 250.0
+    t = np.arange(int(20 * fs)) / fs
+    rng = np.random.default_rng(0)
+    data = np.sin(2.0 * np.pi * 10.0 * t)[:, None] + 0.1 * rng.standard_normal((len(t), 4))
+
+    settings = preproc_settings(cutoff = 40.0)
+    state = PreprocState()
+    gen = temporal_preproc(settings = settings, state = state)
+
+    out = []
+    swap_at = len(t) // 2
+    for idx, msg in enumerate(chunks(data, fs, 50)):
+        if idx * 50 == swap_at:
+            assert gen.send(design_preproc(preproc_settings(cutoff = 30.0), fs)) is None
+        res = gen.send(msg)
+        if res is not None:
+            out.append(res)
+
+    # Decimated by 2 with contiguous timestamps
+    assert sum(msg.data.shape[0] for msg in out) == len(t) // 2
+    gain = out[0].axes['time'].gain
+    assert gain == 2.0 / fs
+    for prev, nxt in zip(out[:-1], out[1:]):
+        assert np.isclose(nxt.axes['time'].offset, prev.axes['time'].offset + prev.data.shape[0] * gain)
+
+    # Changing the cutoff mid-stream doesn't produce a transient
+    y = np.concatenate([msg.data for msg in out])
+    swap = swap_at // 2
+    steady = y[swap - 500:swap]
+    after = y[swap:swap + 500]
+    assert np.abs(after).max() < 1.5 * np.abs(steady).max()
+    assert state.fade is None # cross-fade completed
+
+
+def test_notch():
+    fs = 250.0
+    t = np.arange(int(10 * fs)) / fs
+    signal = np.sin(2.0 * np.pi * 10.0 * t)[:, None]
+    mixed = signal + np.sin(2.0 * np.pi * 50.0 * t)[:, None]
+
+    def run(settings: TemporalPreprocSettings, data: np.ndarray) -> np.ndarray:
+        gen = temporal_preproc(settings = settings)
+        out = [gen.send(msg) for msg in chunks(data, fs, 50)]
+        y = np.concatenate([msg.data for msg in out if msg is not None])
+        return y[len(y) // 2:, 0]
+
+    plain = preproc_settings(cutoff = 55.0)
+    notched = replace(plain, notch_freqs = [50.0])
+
+    # Notch sections are appended to the bandpass cascade
+    n_bp = design_preproc(plain, fs).bp_sos.shape[0]
+    assert design_preproc(notched, fs).bp_sos.shape[0] == n_bp + 1
+
+    # Mains passes the bandpass, but not the notch
+    assert np.corrcoef(run(plain, signal), run(plain, mixed))[0, 1] < 0.9
+    assert np.corrcoef(run(notched, signal), run(notched, mixed))[0, 1] > 0.99
+
+
+def test_ewm_matches_sigproc():
+    fs = 100.0
+    rng = np.random.default_rng(1)
+    data = 3.0 + rng.standard_normal((int(10 * fs), 3))
+    msgs = list(chunks(data, fs, 20))
+
+    # Without filtering or decimation, only the standardization is left
+    settings = TemporalPreprocSettings(
+        filt_settings = ButterworthFilterSettings(axis = 'time', order = 0),
+        decimate_settings = DownsampleSettings(axis = 'time', factor = 1),
+        ewm_history_dur = 1.5
+    )
+    gen = temporal_preproc(settings = settings)
+    ours = np.concatenate([gen.send(msg).data for msg in msgs])
+
+    # ezmsg.sigproc's EWMFilter: a 1:1 Window feeding EWM
+    async def reference() -> np.ndarray:
+        window = windowing(axis = 'time', window_dur = settings.ewm_history_dur, window_shift = None)
+        ewm = EWM(EWMSettings(axis = 'time'))
+        await ewm.setup()
+        out = ewm.sync_output()
+        result = []
+        for msg in msgs:
+            ewm.STATE.buffer_queue.put_nowait(window.send(msg)[0])
+            ewm.STATE.signal_queue.put_nowait(msg)
+            _, res = await out.__anext__()
+            result.append(res.data)
+        return np.concatenate(result)
+
+    assert np.allclose(ours, asyncio.run(reference()))
+
+
+if __name__ == '__main__':
+    test_temporal_preproc()
+    test_notch()
+    test_ewm_matches_sigproc()
@@ -0,0 +1,118 @@
+import asyncio
+
+from collections import deque
+
+import numpy as np
+import pytest
+
+import ezmsg.core as ez
+from ezmsg.util.messages.axisarray import AxisArray
+from ezmsg.sigproc.sampler import SampleTriggerMessage, Sampler, SamplerSettings
+
+from bcpi.ringbuffer import RingBuffer, AxisArrayBuffer
+from bcpi.trialbuffer import extract_trials, SamplerPort
+
+
+def test_ringbuffer_wrap():
+    buf = RingBuffer(10, (2,), dtype = int)
+    data = np.arange(24).reshape(12, 2)
+
+    buf.write(data[:7])
+    view = buf.read(2, 7)
+    assert np.shares_memory(view, buf.data)
+    assert np.array_equal(view, data[2:7])
+
+    buf.write(data[7:])
+    assert buf.oldest == 2
+    wrapped = buf.read(5, 12)
+    assert np.array_equal(wrapped, data[5:12])
+
+    with pytest.raises(IndexError):
+        buf.read(0, 4)
+
+
+def test_extract_trials():
+    fs = 100.0
+    n_ch = 4
+    buffer = AxisArrayBuffer(2.0, 'time')
+    triggers = deque()
+
+    signal = np.random.randn(500, n_ch)
+    chunk = 20
+
+    # Trigger is 3.0 sec into the stream with a 0.5 sec period after it
+    trig = SampleTriggerMessage(timestamp = 3.0, period = (0.0, 0.5))
+    stale = SampleTriggerMessage(timestamp = 0.1, period = (0.0, 0.5))
+
+    samples = []
+    for idx in range(0, signal.shape[0], chunk):
+        msg = AxisArray(
+            signal[idx:idx + chunk],
+            dims = ['time', 'ch'],
+            axes = {'time': AxisArray.Axis.TimeAxis(fs, offset = idx / fs)}
+        )
+        buffer.write(msg)
+
+        if idx == 300:
+            triggers.extend([trig, stale])
+
+        samples.extend(extract_trials(buffer, triggers))
+
+    assert len(triggers) == 0
+    assert buffer.nbytes == int(2.0 * fs) * n_ch * signal.itemsize
+    assert len(samples) == 1
+    sample = samples[0]
+    assert sample.trigger is trig
+    assert sample.sample.shape == (50, n_ch)
+    assert np.array_equal(sample.sample.data, signal[300:350])
+    assert np.isclose(sample.sample.get_axis('time').offset, 3.0)
+
+    # Trials are copies; they stay intact once the buffer wraps
+    assert buffer.buffer is not None
+    assert not np.shares_memory(sample.sample.data, buffer.buffer.data)
+
+
+class Task(ez.Collection):
+    OUTPUT_SAMPLE = ez.OutputStream(object)
+
+    SAMPLER = Sampler()
+
+    def configure(self) -> None:
+        self.SAMPLER.apply_settings(SamplerSettings(buffer_dur = 10.0, period = (-0.5, 1.0), value = 'default'))
+
+    def network(self) -> ez.NetworkDefinition:
+        return ((self.SAMPLER.OUTPUT_SAMPLE, self.OUTPUT_SAMPLE),)
+
+
+class BufferedTask(Task):
+    SAMPLER = SamplerPort(SamplerSettings(buffer_dur = 0.0))
+
+
+def test_sampler_port():
+    task = BufferedTask()
+    assert isinstance(task.SAMPLER, SamplerPort)
+
+    # The task's own configuration and wiring now reach the port
+    task.configure()
+    port = task.SAMPLER
+    assert port.SETTINGS.period == (-0.5, 1.0)
+    assert task.network()[0][0] is port.OUTPUT_SAMPLE
+
+    async def run() -> list:
+        await port.setup()
+        triggers = []
+        for trig in (SampleTriggerMessage(timestamp = 1.0), SampleTriggerMessage(timestamp = 2.0, period = (0.0, 1.0), value = 'own')):
+            async for _, msg in port.on_trigger(trig):
+                triggers.append(msg)
+        return triggers
+
+    # The sampler's settings fill in what triggers don't specify, as its Sampler did
+    default, own = asyncio.run(run())
+    assert default.timestamp == 1.0 and default.period == (-0.5, 1.0) and default.value == 'default'
+    assert own.period == (0.0, 1.0) and own.value == 'own'
+
+
+if __name__ == '__main__':
+    test_ringbuffer_wrap()
+    test_extract_trials()
+    test_sampler_port()
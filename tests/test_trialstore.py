@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from ezmsg.util.messages.axisarray import AxisArray
+from ezmsg.sigproc.sampler import SampleMessage, SampleTriggerMessage
+
+from bcpi.trialstore import TrialStore, INDEX_FILE, load_dataset
+
+
+def trial(data: np.ndarray, fs: float, timestamp: float, label: str) -> SampleMessage:
+    return SampleMessage(
+        trigger = SampleTriggerMessage(timestamp = timestamp, period = (0.0, data.shape[0] / fs), value = label),
+        sample = AxisArray(
+            data,
+            dims = ['time', 'ch'],
+            axes = {'time': AxisArray.Axis.TimeAxis(fs = fs, offset = timestamp)}
+        )
+    )
+
+
+def test_trial_store(tmp_path):
+    fs = 100.0
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal((6, 50, 4)).astype(np.float32)
+
+    # Small chunks, so trials span several chunk files
+    store = TrialStore(tmp_path / 'CAT_TRIAL', chunk_dur = 2.0)
+    for idx, x in enumerate(data):
+        session = 'a' if idx < 4 else 'b'
+        assert store.append(trial(x, fs, float(idx), 'left' if idx % 2 else 'right'), session = session) == idx
+    store.close()
+
+    reader = TrialStore(tmp_path / 'CAT_TRIAL', readonly = True)
+    assert len(reader) == 6
+    assert reader.select(label = 'left').tolist() == [1, 3, 5]
+    assert reader.select(label = 'left', session = 'a').tolist() == [1, 3]
+    assert reader.select(since = 2.0, until = 4.0).tolist() == [2, 3]
+
+    msg = reader.read(3)
+    assert msg.trigger.value == 'left' and msg.trigger.timestamp == 3.0
+    assert msg.sample.dims == ['time', 'ch']
+    assert np.array_equal(msg.sample.data, data[3])
+    assert msg.sample.get_axis('time').gain == pytest.approx(1.0 / fs)
+
+    # Back-to-back trials in one chunk are read without copying
+    batch = reader.batch([0, 1, 2])
+    assert np.shares_memory(batch, reader.view(0))
+    assert np.array_equal(batch, data[:3])
+    assert np.array_equal(reader.batch([5, 0], n_samp = 20), data[[5, 0], :20])
+
+    # A record cut short by a crash is dropped
+    with open(tmp_path / 'CAT_TRIAL' / INDEX_FILE, 'ab') as f:
+        f.write(b'partial')
+    writer = TrialStore(tmp_path / 'CAT_TRIAL')
+    assert len(writer) == 6
+
+    # Mismatched trials are refused
+    with pytest.raises(ValueError):
+        writer.append(trial(np.zeros((50, 3), dtype = np.float32), fs, 6.0, 'left'))
+
+    # Readers pick up appends from another writer
+    writer.append(trial(data[0], fs, 6.0, 'left'), session = 'c')
+    reader.refresh()
+    assert reader.select(session = 'c').tolist() == [6]
+    assert np.array_equal(reader.view(6), data[0])
+
+
+def test_load_dataset(tmp_path):
+    fs = 100.0
+    data = np.arange(4 * 50 * 2, dtype = np.float32).reshape((4, 50, 2))
+
+    store = TrialStore(tmp_path / 'CAT_TRIAL')
+    for idx, x in enumerate(data):
+        store.append(trial(x, fs, float(idx), 'left' if idx % 2 else 'right'), session = 'a', settings = 'abc')
+    store.close()
+
+    X, labels = load_dataset(tmp_path / 'CAT_TRIAL', session = 'a', settings = 'abc')
+    assert X.dims == ['trial', 'time', 'ch']
+    assert X.get_axis('time').gain == pytest.approx(1.0 / fs)
+    assert labels == ['right', 'left', 'right', 'left']
+    assert np.array_equal(X.data, data)
+    assert not X.data.flags.writeable # a view of the store
+
+    X, labels = load_dataset(tmp_path / 'CAT_TRIAL', label = 'left', n_samp = 10)
+    assert labels == ['left', 'left']
+    assert np.array_equal(X.data, data[[1, 3], :10])
+
+    X, labels = load_dataset(tmp_path / 'CAT_TRIAL', settings = 'other')
+    assert X.data.shape[0] == 0 and labels == []
+
+    with pytest.raises(ValueError):
+        load_dataset(tmp_path / 'SSVEP_TRIAL')
+
+
+if __name__ == '__main__':
+    import tempfile
+    from pathlib import Path
+    with tempfile.TemporaryDirectory() as tmp:
+        test_trial_store(Path(tmp) / 'store')
+        test_load_dataset(Path(tmp) / 'dataset')
@@ -0,0 +1,79 @@
+import asyncio
+
+import numpy as np
+
+from ezmsg.util.messages.axisarray import AxisArray
+
+from bcpi.virtualheadset import (
+    VirtualHeadsetSettings,
+    SelectHeadset,
+    SelectHeadsetSettings,
+    virtual_eeg,
+    active_headsets,
+)
+
+
+def test_virtual_eeg():
+    fs, n_samp = 250.0, 50
+    settings = VirtualHeadsetSettings(
+        n_headsets = 3,
+        fs = fs,
+        n_samp = n_samp,
+        noise_uv = 1.0,
+        mi_uv = 0.0,
+        artifact_rate = 0.0,
+        ssvep_freqs = [12.0, 15.0]
+    )
+    gen = virtual_eeg(settings)
+
+    chunk = gen.send(2)
+    assert chunk.shape == (2, n_samp, 8)
+    assert chunk.dtype == np.float32
+
+    # One class_dur worth of signal: headsets attend alternating SSVEP targets
+    n_chunks = int(settings.class_dur * fs / n_samp)
+    x = np.concatenate([chunk] + [gen.send(2) for _ in range(n_chunks - 1)], axis = 1)
+    freqs = np.fft.rfftfreq(x.shape[1], 1.0 / fs)
+    peaks = freqs[np.abs(np.fft.rfft(x[:, :, 0], axis = 1)).argmax(axis = 1)]
+    assert np.allclose(peaks, [12.0, 15.0])
+
+    # Same seed, same signal
+    again = virtual_eeg(settings)
+    assert np.array_equal(again.send(2), chunk)
+
+    # Never more headsets than configured
+    assert gen.send(10).shape[0] == 3
+
+
+def test_ramp():
+    settings = VirtualHeadsetSettings(n_headsets = 5, ramp_step = 2, ramp_interval = 10.0)
+    assert [active_headsets(settings, t) for t in (0.0, 9.9, 10.0, 25.0, 100.0)] == [2, 2, 4, 5, 5]
+    assert active_headsets(VirtualHeadsetSettings(n_headsets = 5), 0.0) == 5
+
+
+def test_select_headset():
+    chunk = AxisArray(
+        np.arange(2 * 5 * 3, dtype = np.float32).reshape(2, 5, 3),
+        dims = ['headset', 'time', 'ch'],
+        axes = {'time': AxisArray.Axis.TimeAxis(fs = 250.0, offset = 1.0)}
+    )
+
+    async def select(index: int):
+        unit = SelectHeadset(SelectHeadsetSettings(index = index))
+        await unit.setup()
+        return [msg async for _, msg in unit.on_signal(chunk)]
+
+    out = asyncio.run(select(1))
+    assert len(out) == 1
+    assert out[0].dims == ['time', 'ch'] and out[0].axes['time'].offset == 1.0
+    assert np.array_equal(out[0].data, chunk.data[1])
+    assert np.shares_memory(out[0].data, chunk.data)
+
+    # Headsets that aren't active yet produce nothing
+    assert asyncio.run(select(2)) == []
+
+
+if __name__ == '__main__':
+    test_virtual_eeg()
+    test_ramp()
+    test_select_headset()